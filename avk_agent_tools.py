@@ -0,0 +1,146 @@
+# Módulo de Ferramentas dos Agentes de IA
+# YFinanceTools servido pela camada de dados local (cache e armazenamento em disco) em vez de chamadas diretas ao Yahoo
+
+# Imports
+import os
+import threading
+from typing import Callable, List, Tuple
+import pandas as pd
+from cachetools import TTLCache
+from phi.tools.yfinance import YFinanceTools
+from avk_data_provider import _avk_extrai_dados_impl, _LIMITADORES, avk_coleta_avisos
+
+########## Configuração ##########
+
+# Tempo de validade (segundos) de cada tipo de dado consultado pelas ferramentas
+TTL_FUNDAMENTOS = float(os.getenv("AVK_TTL_FUNDAMENTOS", "3600"))
+TTL_RECOMENDACOES = float(os.getenv("AVK_TTL_RECOMENDACOES", "3600"))
+TTL_NOTICIAS = float(os.getenv("AVK_TTL_NOTICIAS", "600"))
+TTL_HISTORICO = float(os.getenv("AVK_TTL_HISTORICO", "300"))
+
+# Período e intervalo usados para o preço atual: os mesmos da análise padrão da app,
+# para que a consulta reutilize o histórico que a página acabou de gravar em disco
+PERIODO_PRECO = "6mo"
+INTERVALO_PRECO = "1d"
+
+########## Caches ##########
+
+# Caches compartilhados por todas as sessões: (método, argumentos) -> resposta
+_CACHE_FUNDAMENTOS = TTLCache(maxsize=256, ttl=TTL_FUNDAMENTOS)
+_CACHE_RECOMENDACOES = TTLCache(maxsize=256, ttl=TTL_RECOMENDACOES)
+_CACHE_NOTICIAS = TTLCache(maxsize=256, ttl=TTL_NOTICIAS)
+# (ticker, período, intervalo) -> (histórico, avisos do provedor)
+_CACHE_HISTORICO = TTLCache(maxsize=256, ttl=TTL_HISTORICO)
+_lock_caches = threading.Lock()
+
+def _com_cache(cache: TTLCache, chave: tuple, consulta: Callable[[], str]) -> str:
+    """
+    Retorna a resposta em cache ou executa a consulta ao Yahoo (respeitando o limite de requisições).
+
+    As ferramentas do phidata retornam mensagens de erro em vez de lançar exceções;
+    essas mensagens não são guardadas, para que a próxima chamada tente novamente.
+    """
+    with _lock_caches:
+        resposta = cache.get(chave)
+    if resposta is not None:
+        return resposta
+
+    _LIMITADORES["yfinance"].adquire()
+    resposta = consulta()
+    if not resposta.startswith(("Error", "Could not")):
+        with _lock_caches:
+            cache[chave] = resposta
+    return resposta
+
+def _historico(symbol: str, period: str, interval: str) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Histórico do ticker pela camada de dados, com os avisos do provedor (ex: fallback).
+
+    As ferramentas rodam na thread da análise de IA, fora do script do Streamlit: por isso
+    usam _avk_extrai_dados_impl (sem st.cache_data) com um cache próprio, e os avisos são
+    coletados para a resposta da ferramenta em vez de exibidos na página.
+    """
+    chave = (symbol.upper(), period, interval)
+    with _lock_caches:
+        resultado = _CACHE_HISTORICO.get(chave)
+    if resultado is not None:
+        return resultado
+
+    with avk_coleta_avisos() as avisos:
+        hist = _avk_extrai_dados_impl(chave[0], period, interval=interval)
+    resultado = (hist, list(dict.fromkeys(avisos)))
+    if not hist.empty:
+        with _lock_caches:
+            _CACHE_HISTORICO[chave] = resultado
+    return resultado
+
+def _com_avisos(resposta: str, avisos: List[str]) -> str:
+    """Acrescenta à resposta da ferramenta os avisos do provedor, para que o agente saiba a origem dos dados"""
+    if not avisos:
+        return resposta
+    return resposta + "\n\nData provider notes:\n" + "\n".join(f"- {aviso}" for aviso in avisos)
+
+########## Ferramentas ##########
+
+class AVKFinanceTools(YFinanceTools):
+    """
+    YFinanceTools com consultas locais sempre que possível.
+
+    - Preço atual, histórico e indicadores técnicos vêm da camada de dados (armazenamento
+      em disco e registro de provedores), que a página já consultou, com cache próprio;
+      avisos do provedor (ex: fonte alternativa) são incluídos na resposta
+    - Fundamentos, recomendações de analistas e notícias são consultados no Yahoo e
+      guardados em caches com TTL próprio
+
+    Os métodos sobrescritos não têm docstring própria: o phidata usa inspect.getdoc,
+    que herda a descrição da ferramenta definida em YFinanceTools.
+    """
+
+    # Preço atual: fechamento da última barra diária
+    def get_current_stock_price(self, symbol: str) -> str:
+        try:
+            hist, avisos = _historico(symbol, PERIODO_PRECO, INTERVALO_PRECO)
+            preco = float(hist['Close'].iloc[-1]) if not hist.empty else None
+            return _com_avisos(f"{preco:.4f}", avisos) if preco else f"Could not fetch current price for {symbol}"
+        except Exception as e:
+            return f"Error fetching current price for {symbol}: {e}"
+
+    # Histórico de preços no formato do YFinanceTools (JSON indexado pela data)
+    def get_historical_stock_prices(self, symbol: str, period: str = "1mo", interval: str = "1d") -> str:
+        try:
+            hist, avisos = _historico(symbol, period, interval)
+            return _com_avisos(hist.set_index('Date').to_json(orient="index", date_format="iso"), avisos)
+        except Exception as e:
+            return f"Error fetching historical prices for {symbol}: {e}"
+
+    def get_technical_indicators(self, symbol: str, period: str = "3mo") -> str:
+        try:
+            hist, avisos = _historico(symbol, period, "1d")
+            return _com_avisos(hist.set_index('Date').to_json(orient="index", date_format="iso"), avisos)
+        except Exception as e:
+            return f"Error fetching technical indicators for {symbol}: {e}"
+
+    # Dados cadastrais e fundamentalistas (mudam pouco ao longo do dia)
+    def get_company_info(self, symbol: str) -> str:
+        return _com_cache(_CACHE_FUNDAMENTOS, ("info", symbol.upper()),
+                          lambda: super(AVKFinanceTools, self).get_company_info(symbol))
+
+    def get_stock_fundamentals(self, symbol: str) -> str:
+        return _com_cache(_CACHE_FUNDAMENTOS, ("fundamentos", symbol.upper()),
+                          lambda: super(AVKFinanceTools, self).get_stock_fundamentals(symbol))
+
+    def get_income_statements(self, symbol: str) -> str:
+        return _com_cache(_CACHE_FUNDAMENTOS, ("resultados", symbol.upper()),
+                          lambda: super(AVKFinanceTools, self).get_income_statements(symbol))
+
+    def get_key_financial_ratios(self, symbol: str) -> str:
+        return _com_cache(_CACHE_FUNDAMENTOS, ("indices", symbol.upper()),
+                          lambda: super(AVKFinanceTools, self).get_key_financial_ratios(symbol))
+
+    def get_analyst_recommendations(self, symbol: str) -> str:
+        return _com_cache(_CACHE_RECOMENDACOES, ("recomendacoes", symbol.upper()),
+                          lambda: super(AVKFinanceTools, self).get_analyst_recommendations(symbol))
+
+    def get_company_news(self, symbol: str, num_stories: int = 3) -> str:
+        return _com_cache(_CACHE_NOTICIAS, ("noticias", symbol.upper(), num_stories),
+                          lambda: super(AVKFinanceTools, self).get_company_news(symbol, num_stories))
@@ -2,75 +2,300 @@
 # Configuração e gerenciamento dos agentes de IA
 
 # Imports
-import re
-from dotenv import load_dotenv
-from phi.agent import Agent
-from phi.model.groq import Groq
-from phi.tools.yfinance import YFinanceTools
-
-# Carrega o arquivo de variáveis de ambiente
-load_dotenv()
+# phidata, Groq e as ferramentas só são importados na construção dos agentes (ver avk_obtem_multi_agente),
+# para que importar este módulo (e iniciar a app) não pague esse custo
+import time
+import queue
+import threading
+from functools import lru_cache
+from avk_ai_cache import avk_chave_analise, avk_fingerprint_dados, avk_obtem_ou_executa_stream
+from avk_telemetria import avk_span, avk_contexto_atual
 
 ########## Agentes de IA ##########
 
+# Modelo dos agentes (também faz parte da chave do cache de análises)
+MODELO_GROQ = "llama-3.3-70b-versatile"
+
 # Agentes de IA 
-# Agente financeiro: análise de dados financeiros e notícias via YFinanceTools
-avk_agente_financeiro = Agent(name="AVK Agente Financeiro",
-                              model=Groq(id="llama-3.3-70b-versatile"),
-                              description="Fazer análise financeira de ações e buscar notícias relevantes",
-                              tools=[YFinanceTools(stock_price=True,
-                                                   analyst_recommendations=True,
-                                                   stock_fundamentals=True,
-                                                   company_news=True)],
-                              instructions=[
-                                  "Use tabelas para mostrar os dados",
-                                  "Sempre inclua as fontes das notícias",
-                                  "Busque notícias recentes sobre a empresa para complementar a análise",
-                                  "Foque em usar stock_price, stock_fundamentals e company_news para análise",
-                                  "Se uma ferramenta falhar, continue com as outras disponíveis"
-                              ],
-                              show_tool_calls=True, markdown=True)
-
-# Multi-agente: usa apenas o agente financeiro (que já tem acesso a notícias via YFinanceTools)
-# Nota: Removemos o agente de busca web devido a problemas com tipos de parâmetros no phidata
-multi_ai_agent = Agent(team=[avk_agente_financeiro],
-                       model=Groq(id="llama-3.3-70b-versatile"),
-                       instructions=[
-                           "Sempre inclua as fontes",
-                           "Use tabelas para mostrar os dados",
-                           "Combine dados financeiros com notícias recentes para uma análise completa",
-                           "Se uma ferramenta não estiver disponível ou falhar, continue com outras ferramentas",
-                           "Foque em fornecer análise útil mesmo se algumas ferramentas não funcionarem"
-                       ],
-                       show_tool_calls=True, markdown=True)
+# Construídos no primeiro uso e reutilizados por todo o processo
+@lru_cache(maxsize=1)
+def avk_obtem_agente_financeiro():
+    """
+    Retorna o agente financeiro: análise de dados financeiros e notícias via AVKFinanceTools
+    (YFinanceTools servido pela camada de dados local e por caches com TTL).
+    """
+    from dotenv import load_dotenv
+    from phi.agent import Agent
+    from phi.model.groq import Groq
+    from avk_agent_tools import AVKFinanceTools
 
-def limpar_resposta_ia(ai_response_content):
+    # Carrega o arquivo de variáveis de ambiente (GROQ_API_KEY)
+    load_dotenv()
+
+    return Agent(name="AVK Agente Financeiro",
+                 model=Groq(id=MODELO_GROQ),
+                 description="Fazer análise financeira de ações e buscar notícias relevantes",
+                 tools=[AVKFinanceTools(stock_price=True,
+                                        analyst_recommendations=True,
+                                        stock_fundamentals=True,
+                                        company_news=True)],
+                 instructions=[
+                     "Use tabelas para mostrar os dados",
+                     "Sempre inclua as fontes das notícias",
+                     "Busque notícias recentes sobre a empresa para complementar a análise",
+                     "Foque em usar stock_price, stock_fundamentals e company_news para análise",
+                     "Se uma ferramenta falhar, continue com as outras disponíveis"
+                 ],
+                 show_tool_calls=True, markdown=True)
+
+@lru_cache(maxsize=1)
+def avk_obtem_multi_agente():
     """
-    Remove linhas indesejadas da resposta do agente de IA.
+    Retorna o multi-agente: usa apenas o agente financeiro (que já tem acesso a notícias via YFinanceTools).
+    Nota: Removemos o agente de busca web devido a problemas com tipos de parâmetros no phidata
+    """
+    from phi.agent import Agent
+    from phi.model.groq import Groq
+
+    return Agent(team=[avk_obtem_agente_financeiro()],
+                 model=Groq(id=MODELO_GROQ),
+                 instructions=[
+                     "Sempre inclua as fontes",
+                     "Use tabelas para mostrar os dados",
+                     "Combine dados financeiros com notícias recentes para uma análise completa",
+                     "Se uma ferramenta não estiver disponível ou falhar, continue com outras ferramentas",
+                     "Foque em fornecer análise útil mesmo se algumas ferramentas não funcionarem"
+                 ],
+                 show_tool_calls=True, markdown=True)
+
+def __getattr__(nome):
+    """Mantém avk_agente_financeiro e multi_ai_agent acessíveis como atributos do módulo, construídos no primeiro acesso"""
+    if nome == "avk_agente_financeiro":
+        return avk_obtem_agente_financeiro()
+    if nome == "multi_ai_agent":
+        return avk_obtem_multi_agente()
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+
+# Prompt da análise de uma ação
+# Ajustado para não solicitar especificamente recomendações de analistas, que podem não estar disponíveis
+PROMPT_ANALISE = (
+    "Analise a ação {ticker}. Forneça informações sobre preço atual, "
+    "fundamentais da empresa e as últimas notícias relevantes. "
+    "Use os dados disponíveis para fazer uma análise completa."
+)
+
+def avk_executa_analise_stream(ticker, hist=None, fingerprint=None):
+    """
+    Executa a análise de IA de uma ação em streaming, reutilizando respostas recentes.
+
+    O agente roda com stream=True e cada trecho passa pelo FiltroRespostaIA, então o
+    texto pode ser exibido enquanto é gerado. A resposta completa fica em cache por
+    ticker, prompt, modelo e fingerprint dos dados; pedidos simultâneos para a mesma
+    chave executam o agente uma única vez.
     
     Args:
-        ai_response_content: Conteúdo da resposta do agente de IA
+        ticker: Símbolo da ação
+        hist: DataFrame com o histórico usado na sessão (define o fingerprint dos dados)
+        fingerprint: Fingerprint dos dados já calculado (tem precedência sobre hist)
+    
+    Yields:
+        Trechos da análise já filtrados
+    """
+    # A chave não depende do agente construído: respostas em cache não constroem o agente
+    modelo_prompt = f"{MODELO_GROQ}|{PROMPT_ANALISE}"
+    if fingerprint is None:
+        fingerprint = avk_fingerprint_dados(hist)
+    chave = avk_chave_analise(ticker, modelo_prompt, fingerprint)
+    
+    def executa():
+        with avk_span("ia.agente", ticker=ticker) as span:
+            with avk_span("ia.construcao_agente"):
+                agente = avk_obtem_multi_agente()
+            respostas = agente.run(PROMPT_ANALISE.format(ticker=ticker), stream=True)
+            for posicao, parte in enumerate(avk_filtra_stream(r.content for r in respostas if isinstance(r.content, str))):
+                if posicao == 0:
+                    span.anota(primeiro_trecho_ms=round((time.perf_counter() - span.inicio) * 1000, 1))
+                yield parte
+    
+    return avk_obtem_ou_executa_stream(chave, executa)
+
+def avk_executa_analise(ticker, hist=None):
+    """
+    Executa a análise de IA de uma ação e retorna o texto completo (ver avk_executa_analise_stream).
+    
+    Args:
+        ticker: Símbolo da ação
+        hist: DataFrame com o histórico usado na sessão (define o fingerprint dos dados)
     
     Returns:
-        String com a resposta limpa
+        String com a análise limpa
+    """
+    return "".join(avk_executa_analise_stream(ticker, hist)).strip()
+
+class AnaliseEmSegundoPlano:
+    """
+    Executa a análise de IA em uma thread, para que ela rode em paralelo com a extração dos dados.
+
+    Os trechos produzidos ficam em uma fila até serem consumidos por stream(), então a
+    análise avança mesmo enquanto a página ainda está buscando dados e montando gráficos.
+    """
+
+    _FIM = object()
+
+    def __init__(self, ticker, hist=None, fingerprint=None):
+        """
+        Inicia a análise imediatamente.
+        
+        Args:
+            ticker: Símbolo da ação
+            hist: DataFrame disponível no início (define o fingerprint dos dados)
+            fingerprint: Fingerprint dos dados já calculado (tem precedência sobre hist)
+        """
+        self._fila = queue.Queue()
+        # A thread roda no contexto atual, então seus spans entram na execução em andamento
+        self._thread = threading.Thread(target=avk_contexto_atual().run,
+                                        args=(self._executa, ticker, hist, fingerprint),
+                                        name=f"avk-analise-{ticker}", daemon=True)
+        self._thread.start()
+
+    def _executa(self, ticker, hist, fingerprint):
+        try:
+            with avk_span("ia.analise", ticker=ticker):
+                for parte in avk_executa_analise_stream(ticker, hist, fingerprint):
+                    self._fila.put(parte)
+        except Exception as e:
+            self._fila.put(e)
+        finally:
+            self._fila.put(self._FIM)
+
+    def stream(self):
+        """
+        Produz os trechos da análise à medida que ficam prontos (os já gerados saem de imediato).
+        
+        Yields:
+            Trechos da análise já filtrados
+        
+        Raises:
+            A exceção da análise, se ela falhar
+        """
+        while True:
+            item = self._fila.get()
+            if item is self._FIM:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+class FiltroRespostaIA:
+    """
+    Filtro incremental das linhas indesejadas da resposta do agente de IA.
+
+    Recebe o texto em partes (ex: durante o streaming) e devolve apenas as linhas
+    completas já filtradas; a linha ainda incompleta fica retida até chegar o fim dela.
+    Remove:
+    - blocos "Running:" (do "Running:" até a próxima linha em branco)
+    - linhas que começam com "Running" ou contêm "Running avk_extrai_dados"
+    - linhas "transfer_task_to_finance_ai_agent"
+    Linhas em branco no início e no fim da resposta também são descartadas.
     """
-    # Remove linhas que começam com "Running:" ou "Running "
-    # Remove o bloco "Running:" e também linhas "transfer_task_to_finance_ai_agent"
-    # Remove também linhas que contenham "Running avk_extrai_dados"
-    clean_response = ai_response_content
-    # Remove blocos "Running:" com múltiplas linhas
-    clean_response = re.sub(r"Running:[\s\S]*?\n\n", "", clean_response, flags=re.MULTILINE)
-    # Processa linha por linha para remover linhas indesejadas
-    lines = clean_response.split('\n')
-    filtered_lines = []
-    for line in lines:
+
+    def __init__(self):
+        self._pendente = ""         # Linha incompleta recebida até agora
+        self._bloco = None          # Linhas do bloco "Running:" em andamento (None fora de um bloco)
+        self._prefixo = ""          # Texto anterior a "Running:", a juntar com a linha seguinte ao bloco
+        self._brancos = []          # Linhas em branco retidas (só emitidas antes de uma linha com texto)
+        self._inicio = True         # Nenhuma linha com texto emitida ainda
+
+    def _filtra_linha(self, line):
+        """Processa uma linha completa e retorna o texto a emitir"""
+        if self._bloco is not None:
+            # Linha vazia encerra o bloco, que é descartado
+            if line:
+                self._bloco.append(line)
+            else:
+                self._bloco = None
+            return ""
+
+        # O texto anterior a "Running:" na linha que abriu o bloco se junta à linha seguinte ao bloco
+        line, self._prefixo = self._prefixo + line, ""
+        if "Running:" in line:
+            self._bloco = [line]
+            self._prefixo = line[:line.index("Running:")]
+            return ""
+        return self._emite(line)
+
+    def _emite(self, line):
+        """Aplica o filtro de linhas e retorna o texto a emitir"""
         # Remove linhas que começam com "Running" ou contêm "Running avk_extrai_dados"
         if line.strip().startswith('Running') or ('Running' in line and 'avk_extrai_dados' in line):
-            continue
+            return ""
         # Remove linhas "transfer_task_to_finance_ai_agent"
         if 'transfer_task_to_finance_ai_agent' in line:
-            continue
-        filtered_lines.append(line)
-    clean_response = '\n'.join(filtered_lines).strip()
-    return clean_response
+            return ""
+
+        if not line.strip():
+            if not self._inicio:
+                self._brancos.append(line)
+            return ""
+        saida = "".join("\n" + branco for branco in self._brancos) + ("" if self._inicio else "\n") + line
+        self._brancos, self._inicio = [], False
+        return saida
+
+    def alimenta(self, parte):
+        """
+        Recebe uma parte da resposta e retorna o texto filtrado que já pode ser exibido.
+        
+        Args:
+            parte: Trecho de texto recebido do agente
+        
+        Returns:
+            Texto filtrado (pode ser vazio)
+        """
+        self._pendente += parte
+        *linhas, self._pendente = self._pendente.split('\n')
+        return "".join(self._filtra_linha(line) for line in linhas)
+
+    def finaliza(self):
+        """Processa a última linha (sem quebra de linha final) e retorna o texto restante"""
+        pendente, self._pendente = self._pendente, ""
+        saida = self._filtra_linha(pendente) if pendente else ""
+        if self._bloco is not None:
+            # Bloco "Running:" sem linha vazia até o fim: não é um bloco, suas linhas passam só pelo filtro de linhas
+            linhas, self._bloco, self._prefixo = self._bloco, None, ""
+            saida += "".join(self._emite(line) for line in linhas)
+        elif self._prefixo:
+            saida += self._emite(self._prefixo)
+            self._prefixo = ""
+        return saida
+
+def limpar_resposta_ia(ai_response_content):
+    """
+    Remove linhas indesejadas da resposta do agente de IA.
+    
+    Args:
+        ai_response_content: Conteúdo da resposta do agente de IA
+    
+    Returns:
+        String com a resposta limpa
+    """
+    filtro = FiltroRespostaIA()
+    return (filtro.alimenta(ai_response_content) + filtro.finaliza()).strip()
 
+def avk_filtra_stream(partes):
+    """
+    Aplica o FiltroRespostaIA a um iterador de partes de texto.
+    
+    Args:
+        partes: Iterador com trechos de texto da resposta
+    
+    Yields:
+        Trechos filtrados, prontos para exibição
+    """
+    filtro = FiltroRespostaIA()
+    for parte in partes:
+        texto = filtro.alimenta(parte)
+        if texto:
+            yield texto
+    texto = filtro.finaliza()
+    if texto:
+        yield texto
@@ -0,0 +1,216 @@
+# Módulo de Cache das Análises de IA
+# Guarda em disco (SQLite) as respostas dos agentes, com expiração (TTL), descarte LRU
+# e execução única para requisições idênticas simultâneas
+
+# Imports
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterator, Optional
+import pandas as pd
+from avk_data_store import AVK_CACHE_DIR
+from avk_telemetria import avk_span, avk_incrementa, avk_registra_cache
+from avk_cache_compartilhado import avk_trava_compartilhada, avk_obtem_texto, avk_grava_texto
+
+########## Configuração do Cache ##########
+
+# Tempo de validade (segundos) de uma análise e número máximo de análises guardadas
+TTL_ANALISE_IA = float(os.getenv("AVK_TTL_ANALISE_IA", "900"))
+MAX_ANALISES_IA = int(os.getenv("AVK_MAX_ANALISES_IA", "200"))
+
+# Validade (segundos) da trava que impede workers diferentes de executar a mesma análise ao mesmo
+# tempo (com AVK_CACHE_COMPARTILHADO); uma análise costuma levar bem menos do que isso
+VALIDADE_TRAVA_IA = float(os.getenv("AVK_VALIDADE_TRAVA_IA", "180"))
+
+# Arquivo compartilhado por todas as sessões (e processos) que usam o mesmo AVK_CACHE_DIR
+_CAMINHO_BANCO = os.path.join(AVK_CACHE_DIR, "analises_ia.sqlite3")
+
+########## Chaves ##########
+
+def avk_fingerprint_dados(hist: Optional[pd.DataFrame]) -> str:
+    """
+    Resume o estado dos dados em que a análise se baseia.
+
+    Usa a data e o fechamento da última barra: enquanto não chega uma barra nova
+    (ou o fechamento não muda), a mesma análise é reutilizada.
+
+    Args:
+        hist: DataFrame com Date e Close (None quando não há dados locais)
+
+    Returns:
+        String que identifica o snapshot dos dados
+    """
+    if hist is None or hist.empty:
+        return "sem_dados"
+    ultima = hist.iloc[-1]
+    return f"{pd.Timestamp(ultima['Date']).isoformat()}|{float(ultima['Close']):.4f}"
+
+def avk_chave_analise(ticker: str, modelo_prompt: str, fingerprint: str) -> str:
+    """Chave do cache: hash do ticker, do modelo do prompt e do fingerprint dos dados"""
+    conteudo = "\0".join((ticker.upper(), modelo_prompt, fingerprint))
+    return hashlib.sha256(conteudo.encode()).hexdigest()
+
+########## Cache em Disco ##########
+
+class CacheAnalises:
+    """
+    Cache de respostas em SQLite, com TTL e descarte das entradas menos usadas (LRU).
+
+    Cada operação abre sua própria conexão, então a mesma instância pode ser
+    usada por várias threads.
+    """
+
+    def __init__(self, caminho: str = _CAMINHO_BANCO, ttl: float = TTL_ANALISE_IA,
+                 max_entradas: int = MAX_ANALISES_IA):
+        self.caminho = caminho
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._criado = False
+
+    def _conecta(self) -> sqlite3.Connection:
+        if not self._criado:
+            os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+        conexao = sqlite3.connect(self.caminho, timeout=10)
+        if not self._criado:
+            # WAL permite leituras concorrentes com uma escrita em andamento
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute(
+                "CREATE TABLE IF NOT EXISTS analises ("
+                "chave TEXT PRIMARY KEY, resposta TEXT NOT NULL, "
+                "criado_em REAL NOT NULL, acessado_em REAL NOT NULL)"
+            )
+            self._criado = True
+        return conexao
+
+    def obtem(self, chave: str) -> Optional[str]:
+        """Retorna a resposta guardada, ou None se ausente ou expirada"""
+        agora = time.time()
+        try:
+            with self._conecta() as conexao:
+                linha = conexao.execute(
+                    "SELECT resposta FROM analises WHERE chave = ? AND criado_em >= ?",
+                    (chave, agora - self.ttl)
+                ).fetchone()
+                if linha is not None:
+                    conexao.execute("UPDATE analises SET acessado_em = ? WHERE chave = ?", (agora, chave))
+            return linha[0] if linha else None
+        except sqlite3.Error:
+            # Falha no cache não impede a análise: segue como se não houvesse entrada
+            return None
+
+    def grava(self, chave: str, resposta: str) -> None:
+        """Guarda a resposta e descarta as entradas expiradas e as que excedem o limite"""
+        agora = time.time()
+        try:
+            with self._conecta() as conexao:
+                conexao.execute("INSERT OR REPLACE INTO analises VALUES (?, ?, ?, ?)",
+                                (chave, resposta, agora, agora))
+                conexao.execute("DELETE FROM analises WHERE criado_em < ?", (agora - self.ttl,))
+                conexao.execute(
+                    "DELETE FROM analises WHERE chave NOT IN "
+                    "(SELECT chave FROM analises ORDER BY acessado_em DESC LIMIT ?)",
+                    (self.max_entradas,)
+                )
+        except sqlite3.Error:
+            pass
+
+avk_cache_analises = CacheAnalises()
+
+########## Execução Única ##########
+
+def _obtem_local_ou_compartilhada(chave: str, cache: CacheAnalises) -> Optional[str]:
+    """Resposta do cache local ou, se ausente, do cache compartilhado (copiada para o local)"""
+    resposta = cache.obtem(chave)
+    if resposta is None:
+        resposta = avk_obtem_texto(f"ia|{chave}")
+        if resposta is not None:
+            cache.grava(chave, resposta)
+    return resposta
+
+# Execuções em andamento no processo: chave -> Future com a resposta
+_EM_ANDAMENTO: Dict[str, Future] = {}
+_lock_andamento = threading.Lock()
+
+def avk_obtem_ou_executa_stream(chave: str, executa: Callable[[], Iterator[str]],
+                                cache: Optional[CacheAnalises] = None) -> Iterator[str]:
+    """
+    Versão em streaming de avk_obtem_ou_executa: produz o texto da análise em partes.
+
+    Com a resposta em cache, produz o texto inteiro de uma vez. A chamada que executa
+    a análise repassa as partes à medida que chegam; chamadas simultâneas com a mesma
+    chave aguardam o fim dessa execução e recebem o texto completo.
+
+    Args:
+        chave: Chave da análise (ver avk_chave_analise)
+        executa: Função sem argumentos que retorna um iterador com as partes do texto
+        cache: Cache a usar (padrão: avk_cache_analises)
+
+    Yields:
+        Partes do texto da análise
+    """
+    cache = cache or avk_cache_analises
+
+    resposta = _obtem_local_ou_compartilhada(chave, cache)
+    avk_registra_cache("analises_ia", acerto=resposta is not None)
+    if resposta is not None:
+        yield resposta
+        return
+
+    with _lock_andamento:
+        futuro = _EM_ANDAMENTO.get(chave)
+        dono = futuro is None
+        if dono:
+            futuro = Future()
+            _EM_ANDAMENTO[chave] = futuro
+
+    if not dono:
+        avk_incrementa("avk_analises_compartilhadas_total")
+        with avk_span("ia.aguarda_execucao"):
+            resposta = futuro.result()
+        yield resposta
+        return
+
+    try:
+        # Com o cache compartilhado, workers diferentes também executam a análise uma única vez
+        with avk_trava_compartilhada(f"ia|{chave}", VALIDADE_TRAVA_IA):
+            # Outra execução pode ter terminado entre a consulta acima e o registro da chave
+            resposta = _obtem_local_ou_compartilhada(chave, cache)
+            if resposta is None:
+                partes = []
+                for parte in executa():
+                    partes.append(parte)
+                    yield parte
+                resposta = "".join(partes)
+                cache.grava(chave, resposta)
+                avk_grava_texto(f"ia|{chave}", resposta, cache.ttl)
+            else:
+                yield resposta
+        futuro.set_result(resposta)
+    except BaseException as e:
+        # Interrupção do consumidor (GeneratorExit) também libera quem está aguardando
+        futuro.set_exception(e if isinstance(e, Exception) else RuntimeError("Análise interrompida"))
+        raise
+    finally:
+        with _lock_andamento:
+            _EM_ANDAMENTO.pop(chave, None)
+
+def avk_obtem_ou_executa(chave: str, executa: Callable[[], str],
+                         cache: Optional[CacheAnalises] = None) -> str:
+    """
+    Retorna a resposta em cache ou executa a análise.
+
+    Chamadas simultâneas com a mesma chave (ex: sessões diferentes analisando o mesmo
+    ticker) aguardam uma única execução. Respostas com erro não são guardadas.
+
+    Args:
+        chave: Chave da análise (ver avk_chave_analise)
+        executa: Função sem argumentos que executa a análise e retorna o texto
+        cache: Cache a usar (padrão: avk_cache_analises)
+
+    Returns:
+        Texto da análise
+    """
+    return "".join(avk_obtem_ou_executa_stream(chave, lambda: iter([executa()]), cache))
@@ -2,27 +2,77 @@
 # Funções para extração de dados e visualização de ações
 
 # Imports
-import streamlit as st
-import plotly.graph_objects as go
-import plotly.express as px
+import os
+import hashlib
+import threading
+import pandas as pd
+from cachetools import LRUCache
+from avk_data_store import AVK_CACHE_DIR, avk_arquivo_temporario
+from avk_indicators import avk_calcula_indicadores, avk_ohlcv_array
+from avk_telemetria import avk_span, avk_registra_cache
+from avk_downsampling import (
+    avk_lttb,
+    avk_agrega_ohlc,
+    LARGURA_PADRAO_PX,
+    PX_POR_CANDLE,
+    PX_POR_BARRA
+)
+
+# Tente importar Streamlit (opcional: as figuras também são montadas fora da app, ex: avk_cli.py)
+try:
+    import streamlit as st
+    STREAMLIT_AVAILABLE = True
+except ImportError:
+    STREAMLIT_AVAILABLE = False
+    st = None
 
 ########## Analytics ##########
 
 # Nota: A função avk_extrai_dados está em avk_data_provider.py
 # e é importada diretamente em avk_app.py quando necessário
 
-# Define a função para plotar o preço das ações com base no histórico fornecido
-def avk_plot_stock_price(hist, ticker):
+# O parâmetro periodo de cada gráfico é o texto exibido no título (ex: "Últimos 6 Meses")
+# O parâmetro largura_px é a largura do gráfico em pixels: os dados são reduzidos no servidor
+# (LTTB ou agregação OHLC) antes de serem enviados ao navegador
+
+# O Plotly é importado dentro de cada função de gráfico: importar este módulo não carrega o Plotly,
+# que só é necessário quando o primeiro gráfico é montado
+
+# As funções avk_figura_* apenas montam e retornam a figura; as avk_plot_* também a exibem no Streamlit
+
+# Marcadores só são exibidos em séries curtas, onde cada ponto ainda é distinguível
+MAX_PONTOS_MARCADORES = 150
+
+def _exibe(fig, **opcoes):
+    """Exibe a figura no Streamlit (sem efeito fora da app) e a retorna"""
+    if STREAMLIT_AVAILABLE:
+        st.plotly_chart(fig, **opcoes)
+    return fig
+
+# Define a função para montar o gráfico do preço das ações com base no histórico fornecido
+def avk_figura_stock_price(hist, ticker, periodo="Últimos 6 Meses", largura_px=LARGURA_PADRAO_PX):
+    import plotly.express as px
+
+    # Reduz a série a cerca de um ponto por pixel, mantendo máximas e mínimas
+    hist = avk_lttb(hist[['Date', 'Close']], 'Close', largura_px)
+
     # Cria um gráfico de linha interativo usando Plotly Express
     # O eixo X representa a data e o eixo Y representa o preço de fechamento das ações
     # O título do gráfico inclui o ticker da ação e o período de análise
-    fig = px.line(hist, x="Date", y="Close", title=f"{ticker} Preços das Ações (Últimos 6 Meses)", markers=True)
-    
+    fig = px.line(hist, x="Date", y="Close", title=f"{ticker} Preços das Ações ({periodo})",
+                  markers=len(hist) <= MAX_PONTOS_MARCADORES)
+    return fig
+
+def avk_plot_stock_price(hist, ticker, periodo="Últimos 6 Meses", largura_px=LARGURA_PADRAO_PX):
     # Exibe o gráfico no Streamlit
-    st.plotly_chart(fig)
+    return _exibe(avk_figura_stock_price(hist, ticker, periodo, largura_px))
+
+# Define a função para montar um gráfico de candlestick com base no histórico fornecido
+def avk_figura_candlestick(hist, ticker, periodo="Últimos 6 Meses", largura_px=LARGURA_PADRAO_PX):
+    import plotly.graph_objects as go
 
-# Define a função para plotar um gráfico de candlestick com base no histórico fornecido
-def avk_plot_candlestick(hist, ticker):
+    # Agrega as barras em faixas de tempo, para que cada candle tenha ao menos PX_POR_CANDLE pixels
+    hist = avk_agrega_ohlc(hist, largura_px // PX_POR_CANDLE)
 
     # Cria um objeto Figure do Plotly para armazenar o gráfico
     fig = go.Figure(
@@ -36,41 +86,224 @@ def avk_plot_candlestick(hist, ticker):
     )
     
     # Atualiza o layout do gráfico, incluindo um título dinâmico com o ticker da ação
-    fig.update_layout(title=f"{ticker} Candlestick Chart (Últimos 6 Meses)")
-    
+    fig.update_layout(title=f"{ticker} Candlestick Chart ({periodo})")
+    return fig
+
+def avk_plot_candlestick(hist, ticker, periodo="Últimos 6 Meses", largura_px=LARGURA_PADRAO_PX):
     # Exibe o gráfico no Streamlit
-    st.plotly_chart(fig)
+    return _exibe(avk_figura_candlestick(hist, ticker, periodo, largura_px))
 
-# Define a função para plotar médias móveis com base no histórico fornecido
-def avk_plot_media_movel(hist, ticker):
+# Define a função para montar o gráfico de médias móveis com base no histórico fornecido
+# indicadores (opcional): DataFrame com Date, SMA_20 e EMA_20 já calculados (ex: pelos indicadores incrementais)
+def avk_figura_media_movel(hist, ticker, indicadores=None, periodo="Últimos 6 Meses", largura_px=LARGURA_PADRAO_PX):
+    import plotly.express as px
 
-    # Calcula a Média Móvel Simples (SMA) de 20 períodos e adiciona ao DataFrame
-    hist['SMA_20'] = hist['Close'].rolling(window=20).mean()
+    if indicadores is None:
+        # Calcula a Média Móvel Simples (SMA) e a Média Móvel Exponencial (EMA) de 20 períodos
+        # com o motor de indicadores, sem adicionar colunas ao DataFrame recebido
+        indicadores = avk_calcula_indicadores(avk_ohlcv_array(hist), {"sma": (20,), "ema": (20,)})
+        sma, ema = indicadores['SMA_20'], indicadores['EMA_20']
+    else:
+        # Alinha as séries recebidas às datas do histórico
+        alinhados = indicadores.set_index('Date').reindex(hist['Date'])
+        sma, ema = alinhados['SMA_20'].to_numpy(), alinhados['EMA_20'].to_numpy()
+    
+    medias = pd.DataFrame({'Date': hist['Date'],
+                           'Close': hist['Close'],
+                           'SMA_20': sma,
+                           'EMA_20': ema})
     
-    # Calcula a Média Móvel Exponencial (EMA) de 20 períodos e adiciona ao DataFrame
-    hist['EMA_20'] = hist['Close'].ewm(span=20, adjust=False).mean()
+    # As médias são calculadas sobre o histórico completo e reduzidas junto com o fechamento
+    medias = avk_lttb(medias, 'Close', largura_px)
     
     # Cria um gráfico de linha interativo usando Plotly Express
     # Plota os preços de fechamento, a SMA de 20 períodos e a EMA de 20 períodos
-    fig = px.line(hist, 
+    fig = px.line(medias, 
                   x='Date', 
                   y=['Close', 'SMA_20', 'EMA_20'],
-                  title=f"{ticker} Médias Móveis (Últimos 6 Meses)",  # Define o título do gráfico
+                  title=f"{ticker} Médias Móveis ({periodo})",  # Define o título do gráfico
                   labels={'value': 'Price (USD)', 'Date': 'Date'})    # Define os rótulos dos eixos
-    
+    return fig
+
+def avk_plot_media_movel(hist, ticker, indicadores=None, periodo="Últimos 6 Meses", largura_px=LARGURA_PADRAO_PX):
     # Exibe o gráfico no Streamlit
-    st.plotly_chart(fig)
+    return _exibe(avk_figura_media_movel(hist, ticker, indicadores, periodo, largura_px))
+
+# Define a função para montar o gráfico do volume de negociação da ação com base no histórico fornecido
+def avk_figura_volume(hist, ticker, periodo="Últimos 6 Meses", largura_px=LARGURA_PADRAO_PX):
+    import plotly.express as px
 
-# Define a função para plotar o volume de negociação da ação com base no histórico fornecido
-def avk_plot_volume(hist, ticker):
+    # Soma os volumes em faixas de tempo, para que cada barra tenha ao menos PX_POR_BARRA pixels
+    hist = avk_agrega_ohlc(hist[['Date', 'Volume']], largura_px // PX_POR_BARRA)
 
     # Cria um gráfico de barras interativo usando Plotly Express
     # O eixo X representa a data e o eixo Y representa o volume negociado
     fig = px.bar(hist, 
                  x='Date', 
                  y='Volume', 
-                 title=f"{ticker} Trading Volume (Últimos 6 Meses)")  # Define o título do gráfico
-    
+                 title=f"{ticker} Trading Volume ({periodo})")  # Define o título do gráfico
+    return fig
+
+def avk_plot_volume(hist, ticker, periodo="Últimos 6 Meses", largura_px=LARGURA_PADRAO_PX):
     # Exibe o gráfico no Streamlit
-    st.plotly_chart(fig)
+    return _exibe(avk_figura_volume(hist, ticker, periodo, largura_px))
+
+
+########## Dashboard ##########
+
+# Figuras já montadas, por (hash dos dados, ticker, período, largura)
+# Reexecuções do script (ex: interação com qualquer widget) reutilizam a figura em vez de remontá-la
+_CACHE_FIGURAS = LRUCache(maxsize=32)
+_lock_figuras = threading.Lock()
+
+# Figuras pré-calculadas fora da app (avk_cli.py prefetch), em JSON do Plotly
+# Carregar o JSON é cerca de 10x mais rápido do que montar a figura
+_CAMINHO_FIGURAS = os.path.join(AVK_CACHE_DIR, "figuras")
+
+def avk_hash_dados(*frames) -> str:
+    """
+    Calcula um hash do conteúdo dos DataFrames (colunas e valores).
 
+    Frames None são aceitos e entram no hash como ausentes.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for frame in frames:
+        if frame is None:
+            h.update(b"\0")
+            continue
+        h.update("|".join(map(str, frame.columns)).encode())
+        h.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+def _titulo_dashboard(ticker, periodo):
+    return f"{ticker} Painel ({periodo})"
+
+def _prepara_dashboard(hist, indicadores, largura_px):
+    """
+    Prepara, em uma única passada, os dados compartilhados pelos painéis do dashboard.
+
+    Returns:
+        Tupla (linhas reduzidas com Date, Close, SMA_20 e EMA_20; barras OHLCV agregadas)
+    """
+    if indicadores is None:
+        calculados = avk_calcula_indicadores(avk_ohlcv_array(hist), {"sma": (20,), "ema": (20,)})
+        sma, ema = calculados['SMA_20'], calculados['EMA_20']
+    else:
+        alinhados = indicadores.set_index('Date').reindex(hist['Date'])
+        sma, ema = alinhados['SMA_20'].to_numpy(), alinhados['EMA_20'].to_numpy()
+
+    linhas = avk_lttb(pd.DataFrame({'Date': hist['Date'].to_numpy(),
+                                    'Close': hist['Close'].to_numpy(),
+                                    'SMA_20': sma,
+                                    'EMA_20': ema}), 'Close', largura_px)
+
+    # Candles e volume compartilham o eixo X, então usam a mesma agregação
+    barras = avk_agrega_ohlc(hist[['Date', 'Open', 'High', 'Low', 'Close', 'Volume']],
+                             largura_px // PX_POR_CANDLE)
+    return linhas, barras
+
+def avk_monta_dashboard(hist, ticker, indicadores=None, periodo="Últimos 6 Meses", largura_px=LARGURA_PADRAO_PX):
+    """
+    Monta uma única figura com três painéis de eixo X compartilhado:
+    preço com médias móveis, candlestick e volume.
+
+    Args:
+        hist: DataFrame com Date, Open, High, Low, Close e Volume
+        ticker: Símbolo da ação (usado no título)
+        indicadores: DataFrame opcional com Date, SMA_20 e EMA_20 já calculados
+        periodo: Texto do período exibido no título
+        largura_px: Largura do gráfico em pixels (define a redução de pontos)
+
+    Returns:
+        Figura Plotly
+    """
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    linhas, barras = _prepara_dashboard(hist, indicadores, largura_px)
+
+    fig = make_subplots(rows=3, cols=1, shared_xaxes=True, vertical_spacing=0.04,
+                        row_heights=[0.4, 0.4, 0.2],
+                        subplot_titles=("Preço e Médias Móveis", "Candlestick", "Volume"))
+
+    for coluna in ('Close', 'SMA_20', 'EMA_20'):
+        fig.add_trace(go.Scatter(x=linhas['Date'], y=linhas[coluna], mode='lines', name=coluna), row=1, col=1)
+
+    fig.add_trace(go.Candlestick(x=barras['Date'],
+                                 open=barras['Open'],
+                                 high=barras['High'],
+                                 low=barras['Low'],
+                                 close=barras['Close'],
+                                 name='OHLC'), row=2, col=1)
+
+    fig.add_trace(go.Bar(x=barras['Date'], y=barras['Volume'], name='Volume'), row=3, col=1)
+
+    fig.update_layout(title=_titulo_dashboard(ticker, periodo), height=900,
+                      xaxis2_rangeslider_visible=False)
+    fig.update_yaxes(title_text="Price (USD)", row=1, col=1)
+    return fig
+
+def _arquivo_figura(hash_dados, ticker, largura_px):
+    """Caminho da figura pré-calculada (o período entra só no título, aplicado ao carregar)"""
+    nome = hashlib.blake2b(f"{hash_dados}|{ticker}|{largura_px}".encode(), digest_size=16).hexdigest()
+    return os.path.join(_CAMINHO_FIGURAS, f"{nome}.json")
+
+def _carrega_figura(caminho, ticker, periodo):
+    """Lê uma figura pré-calculada (None se não existir ou estiver corrompida)"""
+    if not os.path.exists(caminho):
+        return None
+    import plotly.io as pio
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            fig = pio.from_json(arquivo.read())
+    except (OSError, ValueError):
+        return None
+    fig.update_layout(title=_titulo_dashboard(ticker, periodo))
+    return fig
+
+def avk_figura_dashboard(hist, ticker, indicadores=None, periodo="Últimos 6 Meses", largura_px=LARGURA_PADRAO_PX):
+    """
+    Versão com cache de avk_monta_dashboard: a figura só é remontada quando os dados mudam.
+
+    Procura a figura na memória do processo e, em seguida, nas figuras pré-calculadas em disco.
+    """
+    hash_dados = avk_hash_dados(hist, indicadores)
+    chave = (hash_dados, ticker, periodo, largura_px)
+    with _lock_figuras:
+        fig = _CACHE_FIGURAS.get(chave)
+    avk_registra_cache("figuras", acerto=fig is not None)
+    if fig is None:
+        fig = _carrega_figura(_arquivo_figura(hash_dados, ticker, largura_px), ticker, periodo)
+        avk_registra_cache("figuras_disco", acerto=fig is not None)
+    if fig is None:
+        with avk_span("graficos.montagem", barras=len(hist)):
+            fig = avk_monta_dashboard(hist, ticker, indicadores, periodo, largura_px)
+    with _lock_figuras:
+        _CACHE_FIGURAS[chave] = fig
+    return fig
+
+def avk_salva_figura_dashboard(hist, ticker, indicadores=None, largura_px=LARGURA_PADRAO_PX):
+    """
+    Monta a figura do dashboard e a grava em disco, para que a app a carregue em vez de montá-la.
+
+    A app encontra a figura quando recebe os mesmos dados (histórico e indicadores) e a mesma largura.
+
+    Returns:
+        Caminho do arquivo gravado
+    """
+    caminho = _arquivo_figura(avk_hash_dados(hist, indicadores), ticker, largura_px)
+    fig = avk_monta_dashboard(hist, ticker, indicadores, largura_px=largura_px)
+    os.makedirs(_CAMINHO_FIGURAS, exist_ok=True)
+    # Grava em um arquivo temporário e renomeia: a app nunca lê uma figura pela metade
+    with avk_arquivo_temporario(caminho) as temporario, open(temporario, "w", encoding="utf-8") as arquivo:
+        arquivo.write(fig.to_json())
+    return caminho
+
+# Define a função para plotar o painel completo (preço, médias móveis, candlestick e volume)
+def avk_plot_dashboard(hist, ticker, indicadores=None, periodo="Últimos 6 Meses", largura_px=LARGURA_PADRAO_PX):
+    # A figura vem do cache enquanto os dados não mudam, então o gráfico enviado é idêntico entre reexecuções
+    fig = avk_figura_dashboard(hist, ticker, indicadores, periodo, largura_px)
+    
+    # Exibe o gráfico no Streamlit
+    with avk_span("graficos.envio"):
+        return _exibe(fig, key=f"avk_dashboard_{ticker}")
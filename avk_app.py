@@ -4,21 +4,11 @@
 
 # Import do Streamlit deve ser o primeiro
 import streamlit as st
+import uuid
 
 # Configuração da página do Streamlit DEVE ser a primeira chamada
 st.set_page_config(page_title="Aivoraq_Agência de IA", page_icon="assets/avk_icon_32x32.png", layout="wide")
 
-# Imports restantes após st.set_page_config
-from yfinance.exceptions import YFRateLimitError
-from avk_data_provider import avk_extrai_dados
-from avk_analytics import (
-    avk_plot_stock_price,
-    avk_plot_candlestick,
-    avk_plot_media_movel,
-    avk_plot_volume
-)
-from avk_agents import multi_ai_agent, limpar_resposta_ia
-
 ########## App Web ##########
 
 # Barra Lateral com instruções
@@ -27,6 +17,7 @@ st.sidebar.markdown("""
 ### Como Utilizar a App:
 
 - Insira o símbolo do ticker da ação desejada no campo central.
+- Escolha o intervalo das barras (diário ou intradiário, de 1 a 60 minutos).
 - Clique no botão **Analisar** para obter a análise em tempo real com visualizações e insights gerados por IA.
 
 ### Exemplos de tickers válidos:
@@ -48,92 +39,310 @@ O Yahoo Finance limita o número de requisições. Se você receber um erro de r
 if st.sidebar.button("Suporte"):
     st.sidebar.write("No caso de dúvidas envie e-mail para: suporte@aivoraq.com.br")
 
+# Modo da app: análise de uma ação, screener de uma lista de ações ou backtest de estratégias
+modo = st.sidebar.radio("Modo:", ["Análise de Ação", "Screener", "Backtest"])
+
 # Título principal
 st.title("Aivoraq - Agência de IA")
 
+########## Screener ##########
+
+if modo == "Screener":
+    from avk_screener import WATCHLIST_PADRAO, avk_executa_screener, avk_filtra_ranking
+
+    st.header("Screener de Ações")
+
+    watchlist = st.text_area("Lista de tickers (separados por vírgula ou espaço):", ", ".join(WATCHLIST_PADRAO))
+    periodo_screener = st.selectbox("Período do histórico:", ["3mo", "6mo", "1y", "2y"], index=2)
+
+    # O resultado fica na sessão: filtros e ordenação (que reexecutam o script) não extraem nem recalculam nada
+    # O cache de avk_executa_screener ainda compartilha a mesma execução entre sessões
+    if st.button("Executar Screener"):
+        tickers_screener = tuple(dict.fromkeys(t.strip().upper() for t in watchlist.replace(",", " ").split() if t.strip()))
+        with st.spinner(f"Calculando o ranking de {len(tickers_screener)} ações. Aguarde..."):
+            st.session_state["avk_screener"] = avk_executa_screener(tickers_screener, periodo_screener)
+
+    if "avk_screener" in st.session_state:
+        ranking, erros, excluidos = st.session_state["avk_screener"]
+
+        if ranking.empty:
+            st.warning("Nenhum ticker com histórico suficiente para o screener.")
+        else:
+            colunas_metricas = [c for c in ranking.columns if c not in ("Ticker", "Cruzamento", "Tendência")]
+            col1, col2, col3, col4 = st.columns(4)
+            ordenar_por = col1.selectbox("Ordenar por:", colunas_metricas,
+                                         index=colunas_metricas.index("Retorno 21b (%)"))
+            crescente = col2.checkbox("Ordem crescente")
+            pico_minimo = col3.number_input("Pico de volume mínimo (x):", min_value=0.0, value=0.0, step=0.5)
+            cruzamentos = col4.multiselect("Cruzamento de médias recente:", ["Alta", "Baixa"])
+
+            st.dataframe(avk_filtra_ranking(ranking, ordenar_por, crescente, pico_minimo, cruzamentos),
+                         hide_index=True, use_container_width=True)
+
+        if erros or excluidos:
+            with st.expander(f"Tickers fora do ranking ({len(erros) + len(excluidos)})"):
+                for t, erro in erros.items():
+                    st.write(f"**{t}**: {erro}")
+                for t in excluidos:
+                    st.write(f"**{t}**: histórico insuficiente")
+
+    st.stop()
+
+########## Backtest ##########
+
+if modo == "Backtest":
+    from avk_data_provider import avk_extrai_dados
+    from avk_backtest import ESTRATEGIAS, avk_backtest, avk_grade_parametros, avk_varredura
+
+    st.header("Backtest de Estratégias")
+
+    col1, col2, col3 = st.columns(3)
+    ticker_backtest = col1.text_input("Código (símbolo do ticker):", "MSFT").upper()
+    periodo_backtest = col2.selectbox("Período do histórico:", ["1y", "2y", "5y", "10y", "max"], index=2)
+    custo_backtest = col3.number_input("Custo por operação (%):", min_value=0.0, value=0.05, step=0.01) / 100
+
+    # Faixas de parâmetros da varredura (início, fim, passo)
+    estrategia = st.selectbox("Estratégia:", ["cruzamento_sma", "cruzamento_ema", "rsi"],
+                              format_func=lambda e: {"cruzamento_sma": "Cruzamento de médias simples",
+                                                     "cruzamento_ema": "Cruzamento de médias exponenciais",
+                                                     "rsi": "RSI (sobrevenda / sobrecompra)"}[e])
+    col1, col2, col3 = st.columns(3)
+    if estrategia == "rsi":
+        faixas = {
+            "periodo": col1.slider("Período do RSI:", 2, 50, (7, 21)),
+            "compra": col2.slider("Compra abaixo de:", 5, 50, (20, 40), step=5),
+            "venda": col3.slider("Venda acima de:", 50, 95, (60, 80), step=5),
+        }
+        grade = avk_grade_parametros(estrategia, periodo=range(faixas["periodo"][0], faixas["periodo"][1] + 1),
+                                     compra=range(faixas["compra"][0], faixas["compra"][1] + 1, 5),
+                                     venda=range(faixas["venda"][0], faixas["venda"][1] + 1, 5))
+    else:
+        faixas = {
+            "rapida": col1.slider("Média rápida:", 2, 100, (5, 50)),
+            "lenta": col2.slider("Média lenta:", 10, 300, (20, 200)),
+        }
+        passo = col3.number_input("Passo da média lenta:", min_value=1, value=5)
+        grade = avk_grade_parametros(estrategia, rapida=range(faixas["rapida"][0], faixas["rapida"][1] + 1),
+                                     lenta=range(faixas["lenta"][0], faixas["lenta"][1] + 1, passo))
+
+    # O resultado fica na sessão, como no screener: trocar a combinação exibida não refaz a varredura
+    if st.button(f"Executar Backtest ({len(grade)} combinações)"):
+        try:
+            with st.spinner("Testando as combinações de parâmetros. Aguarde..."):
+                hist_backtest = avk_extrai_dados(ticker_backtest, periodo_backtest, interval="1d")
+                st.session_state["avk_backtest"] = (
+                    ticker_backtest, estrategia, hist_backtest,
+                    avk_varredura(hist_backtest, estrategia, grade, custo=custo_backtest), custo_backtest
+                )
+        except Exception as e:
+            st.error(f"❌ Erro no backtest: {str(e)}")
+
+    if "avk_backtest" in st.session_state:
+        ticker_backtest, estrategia, hist_backtest, varredura, custo_backtest = st.session_state["avk_backtest"]
+
+        if varredura.empty:
+            st.warning("Nenhuma combinação válida de parâmetros.")
+        else:
+            st.subheader(f"Melhores combinações - {ticker_backtest}")
+            st.dataframe(varredura.head(50), hide_index=True, use_container_width=True)
+
+            # Curva de patrimônio da combinação escolhida contra comprar e manter
+            posicao = st.number_input("Exibir a combinação da posição:", min_value=1,
+                                      max_value=len(varredura), value=1)
+            parametros = varredura.iloc[posicao - 1][list(ESTRATEGIAS[estrategia])].to_dict()
+            metricas, curva = avk_backtest(hist_backtest, estrategia, parametros, custo=custo_backtest)
+            st.write(", ".join(f"**{nome}**: {valor:g}" for nome, valor in parametros.items())
+                     + f" | Retorno: {metricas['Retorno Total (%)']:.1f}%"
+                     + f" | Comprar e manter: {metricas['Comprar e Manter (%)']:.1f}%")
+            st.line_chart(curva.set_index("Date")[["Patrimônio", "Comprar e Manter"]])
+
+    st.stop()
+
+########## Análise de Ação ##########
+
 # Interface principal
 st.header("Day Trade Analytics em Tempo Real com Agentes de IA")
 
 # Caixa de texto para input do usuário
 ticker = st.text_input("Digite o Código (símbolo do ticker):").upper()
 
+# Intervalo das barras e período correspondente: (period, interval, texto do título)
+INTERVALOS = {
+    "Diário (6 meses)": ("6mo", "1d", "Últimos 6 Meses"),
+    "60 minutos (1 mês)": ("1mo", "60m", "Último Mês, 60 min"),
+    "15 minutos (1 mês)": ("1mo", "15m", "Último Mês, 15 min"),
+    "5 minutos (5 dias)": ("5d", "5m", "Últimos 5 Dias, 5 min"),
+    "1 minuto (1 mês)": ("1mo", "1m", "Último Mês, 1 min"),
+}
+opcao_intervalo = st.selectbox("Intervalo das barras:", list(INTERVALOS))
+period, interval, periodo_titulo = INTERVALOS[opcao_intervalo]
+
+# Atualização dos gráficos com as cotações mais recentes, sem reexecutar a página inteira
+tempo_real = st.sidebar.toggle("Atualização em tempo real",
+                               help="Acrescenta as barras novas aos gráficos a cada poucos segundos")
+
+# Divisão do tempo da última análise (extração, indicadores, gráficos, IA) e taxas de acerto dos caches
+painel_desempenho = st.sidebar.toggle("Painel de desempenho",
+                                      help="Exibe na barra lateral o tempo de cada etapa da última análise")
+
+# Imports restantes após os widgets: a página aparece antes de yfinance, pandas e NumPy serem carregados
+# (o Python guarda os módulos importados, então só a primeira execução do processo paga esse custo)
+from yfinance.exceptions import YFRateLimitError
+from avk_data_provider import avk_extrai_dados, avk_snapshot_local, avk_qualidade_dados
+from avk_validacao import avk_resumo_qualidade
+from avk_analytics import avk_plot_dashboard
+from avk_indicators_incremental import avk_atualiza_indicadores
+from avk_agents import AnaliseEmSegundoPlano
+from avk_realtime import INTERVALO_COTACOES, avk_servico_cotacoes
+from avk_telemetria import avk_execucao, avk_span, avk_painel_telemetria, avk_inicia_servidor_metricas
+
+# Endpoint local de métricas (Prometheus), se AVK_TELEMETRIA_PORTA estiver definida; iniciado uma vez por processo
+avk_inicia_servidor_metricas()
+
+# Identificador da sessão nas inscrições do serviço de cotações
+sessao = st.session_state.setdefault("avk_sessao", uuid.uuid4().hex)
+
+# Gráficos em um fragmento: com o tempo real ativo, só este trecho é reexecutado a cada ciclo
+# O serviço de cotações consulta cada ticker uma vez por ciclo para todas as sessões, e aqui
+# apenas as barras novas são aplicadas aos indicadores
+@st.fragment(run_every=INTERVALO_COTACOES if tempo_real else None)
+def avk_painel_graficos():
+    analise = st.session_state["avk_ultima_analise"]
+    if tempo_real:
+        versao, serie = avk_servico_cotacoes.acompanha(analise["ticker"], analise["interval"], sessao, analise["hist"])
+        if versao != analise.get("versao") and serie is not None:
+            analise["indicadores"] = avk_atualiza_indicadores(f"{analise['ticker']}_{analise['interval']}",
+                                                              serie, st.session_state)
+            analise["hist"], analise["versao"] = serie, versao
+        erro = avk_servico_cotacoes.erro(analise["ticker"], analise["interval"])
+        if erro:
+            st.caption(f"⚠️ Cotações em tempo real indisponíveis no momento: {erro}")
+    elif "versao" in analise:
+        # Tempo real desativado: cancela a inscrição da sessão
+        avk_servico_cotacoes.cancela(analise["ticker"], analise["interval"], sessao)
+        del analise["versao"]
+    
+    st.subheader("Visualização dos Dados")
+    if analise.get("qualidade"):
+        st.caption(f"🧹 Qualidade dos dados: {analise['qualidade']}")
+    avk_plot_dashboard(analise["hist"], analise["ticker"], analise["indicadores"], analise["periodo"])
+
 # Se o usuário pressionar o botão, entramos neste bloco
 if st.button("Analisar"):
 
     # Se temos o código da ação (ticker)
     if ticker:
 
-        # Inicia o processamento
-        try:
-            with st.spinner("Buscando os Dados em Tempo Real. Aguarde..."):
-                
-                # Obtém os dados com tratamento de erro
-                try:
-                    hist = avk_extrai_dados(ticker)
-                except YFRateLimitError as e:
-                    st.error("⚠️ **Rate Limit do Yahoo Finance**")
-                    st.warning(
-                        "Muitas requisições foram feitas ao Yahoo Finance. Por favor, aguarde alguns minutos antes de tentar novamente.\n\n"
-                        "**Dicas:**\n"
-                        "- O cache está ativo por 5 minutos, então dados recentes podem ser reutilizados\n"
-                        "- Tente novamente em 2-3 minutos\n"
-                        "- Evite fazer múltiplas requisições em sequência"
-                    )
-                    st.stop()
-                except ValueError as e:
-                    st.error(f"❌ Erro: {str(e)}")
-                    st.info("Verifique se o ticker está correto e tente novamente.")
-                    st.stop()
-                except Exception as e:
-                    st.error(f"❌ Erro ao buscar dados: {str(e)}")
-                    st.info("Por favor, tente novamente mais tarde.")
-                    st.stop()
-                
-                # Renderiza um subtítulo
-                st.subheader("Análise Gerada Por IA")
+        # Todas as etapas da análise (inclusive a thread da IA) são medidas como uma execução
+        with avk_execucao("analisar", ticker=ticker, interval=interval) as execucao:
+            st.session_state["avk_telemetria"] = execucao
+
+            # Inicia o processamento
+            try:
+                # A análise de IA começa antes da extração e roda em paralelo com ela
+                # O fingerprint do cache usa o histórico diário já armazenado em disco, disponível de imediato
+                analise = AnaliseEmSegundoPlano(ticker, avk_snapshot_local(ticker))
+            
+                # A análise de IA fica acima dos gráficos, mas é preenchida depois deles
+                area_ia = st.container()
+                area_graficos = st.container()
+            
+                with st.spinner("Buscando os Dados em Tempo Real. Aguarde..."):
                 
-                # Executa o time de Agentes de IA
-                try:
-                    # Ajusta o prompt para não solicitar especificamente recomendações de analistas
-                    # que podem não estar disponíveis
-                    ai_response = multi_ai_agent.run(
-                        f"Analise a ação {ticker}. Forneça informações sobre preço atual, "
-                        f"fundamentais da empresa e as últimas notícias relevantes. "
-                        f"Use os dados disponíveis para fazer uma análise completa."
-                    )
-
-                    # Limpa a resposta removendo linhas indesejadas
-                    clean_response = limpar_resposta_ia(ai_response.content)
-
-                    # Imprime a resposta
-                    st.markdown(clean_response)
-                except Exception as e:
-                    error_msg = str(e)
-                    # Tratamento mais específico para erros de ferramentas
-                    if "tool_use_failed" in error_msg or "Failed to call a function" in error_msg:
+                    # Obtém os dados com tratamento de erro
+                    try:
+                        hist = avk_extrai_dados(ticker, period, interval=interval)
+                    except YFRateLimitError as e:
+                        st.error("⚠️ **Rate Limit do Yahoo Finance**")
                         st.warning(
-                            f"⚠️ **Erro ao acessar algumas ferramentas de análise**\n\n"
-                            f"Detalhes: {error_msg}\n\n"
-                            f"**Solução:** Os gráficos abaixo ainda estão disponíveis. "
-                            f"Algumas funcionalidades de IA podem estar temporariamente indisponíveis."
+                            "Muitas requisições foram feitas ao Yahoo Finance. Por favor, aguarde alguns minutos antes de tentar novamente.\n\n"
+                            "**Dicas:**\n"
+                            "- O cache está ativo por 5 minutos, então dados recentes podem ser reutilizados\n"
+                            "- Tente novamente em 2-3 minutos\n"
+                            "- Evite fazer múltiplas requisições em sequência"
                         )
-                    else:
-                        st.warning(f"⚠️ Erro ao gerar análise por IA: {error_msg}")
-                    st.info("Os gráficos ainda estão disponíveis abaixo.")
-
-                # Renderiza os gráficos
-                st.subheader("Visualização dos Dados")
-                avk_plot_stock_price(hist, ticker)
-                avk_plot_candlestick(hist, ticker)
-                avk_plot_media_movel(hist, ticker)
-                avk_plot_volume(hist, ticker)
+                        st.stop()
+                    except ValueError as e:
+                        st.error(f"❌ Erro: {str(e)}")
+                        st.info("Verifique se o ticker está correto e tente novamente.")
+                        st.stop()
+                    except Exception as e:
+                        st.error(f"❌ Erro ao buscar dados: {str(e)}")
+                        st.info("Por favor, tente novamente mais tarde.")
+                        st.stop()
                 
-        except Exception as e:
-            st.error(f"❌ Erro inesperado: {str(e)}")
-            st.info("Por favor, tente novamente ou entre em contato com o suporte.")
+                    # Atualiza os indicadores da sessão apenas com as barras novas
+                    with avk_span("indicadores", barras=len(hist)):
+                        indicadores = avk_atualiza_indicadores(f"{ticker}_{interval}", hist, st.session_state)
+            
+                # Guarda a análise na sessão, para que reexecuções do script (e o fragmento dos gráficos) a usem
+                # A inscrição da análise anterior no serviço de cotações deixa de ser necessária
+                anterior = st.session_state.get("avk_ultima_analise")
+                if anterior and "versao" in anterior:
+                    avk_servico_cotacoes.cancela(anterior["ticker"], anterior["interval"], sessao)
+                st.session_state["avk_ultima_analise"] = {
+                    "ticker": ticker,
+                    "interval": interval,
+                    "hist": hist,
+                    "indicadores": indicadores,
+                    "periodo": periodo_titulo,
+                    # Correções da validação na última extração deste processo (vazio sem ocorrências)
+                    "qualidade": avk_resumo_qualidade(avk_qualidade_dados(ticker, interval)),
+                    "resposta": None,
+                }
+            
+                # Renderiza os gráficos assim que os dados chegam, sem esperar a análise de IA
+                with area_graficos:
+                    avk_painel_graficos()
+            
+                with area_ia:
+                    # Renderiza um subtítulo
+                    st.subheader("Análise Gerada Por IA")
+                
+                    # Exibe a análise do time de Agentes de IA
+                    try:
+                        # Análises recentes do mesmo ticker (e dos mesmos dados) vêm do cache em disco,
+                        # e pedidos simultâneos de sessões diferentes executam o agente uma única vez
+                        # A resposta é exibida à medida que é gerada, já sem as linhas indesejadas
+                        with st.spinner("Gerando a análise por IA..."):
+                            clean_response = st.write_stream(analise.stream())
+                    except Exception as e:
+                        clean_response = None
+                        error_msg = str(e)
+                        # Tratamento mais específico para erros de ferramentas
+                        if "tool_use_failed" in error_msg or "Failed to call a function" in error_msg:
+                            st.warning(
+                                f"⚠️ **Erro ao acessar algumas ferramentas de análise**\n\n"
+                                f"Detalhes: {error_msg}\n\n"
+                                f"**Solução:** Os gráficos abaixo ainda estão disponíveis. "
+                                f"Algumas funcionalidades de IA podem estar temporariamente indisponíveis."
+                            )
+                        else:
+                            st.warning(f"⚠️ Erro ao gerar análise por IA: {error_msg}")
+                        st.info("Os gráficos ainda estão disponíveis abaixo.")
+            
+                st.session_state["avk_ultima_analise"]["resposta"] = clean_response
+                
+            except Exception as e:
+                st.error(f"❌ Erro inesperado: {str(e)}")
+                st.info("Por favor, tente novamente ou entre em contato com o suporte.")
     else:
         st.error("Ticker inválido. Insira um símbolo de ação válido.")
 
+# Em reexecuções sem clique no botão (ex: interação com widgets), exibe a última análise da sessão
+# A figura vem do cache de avk_analytics, sem ser remontada
+elif "avk_ultima_analise" in st.session_state:
+    analise = st.session_state["avk_ultima_analise"]
+    if analise["resposta"]:
+        st.subheader("Análise Gerada Por IA")
+        st.markdown(analise["resposta"])
+    avk_painel_graficos()
+
+# Painel de desempenho: ao final do script, quando a execução atual já terminou
+if painel_desempenho:
+    execucao = st.session_state.get("avk_telemetria")
+    avk_painel_telemetria(execucao.resumo() if execucao is not None else None)
+
 
 # Fim
 # Obrigado Aivorak - Agência de IA!
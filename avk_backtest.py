@@ -0,0 +1,276 @@
+# Módulo de Backtest
+# Teste vetorizado de estratégias baseadas em indicadores (cruzamento de médias, RSI) sobre o histórico
+# normalizado de avk_extrai_dados, com varredura de parâmetros em paralelo (pool de processos)
+
+# Imports
+import os
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from avk_indicators import avk_ohlcv_array, avk_calcula_indicadores
+
+########## Configuração do Backtest ##########
+
+# Estratégias disponíveis e os parâmetros de cada uma (na ordem das combinações)
+# - cruzamento_sma / cruzamento_ema: comprado enquanto a média rápida está acima da lenta
+# - rsi: compra quando o RSI fica abaixo de 'compra' e vende quando passa de 'venda'
+ESTRATEGIAS = {
+    "cruzamento_sma": ("rapida", "lenta"),
+    "cruzamento_ema": ("rapida", "lenta"),
+    "rsi": ("periodo", "compra", "venda"),
+}
+
+# Custo por operação (fração do valor, aplicado em cada compra e em cada venda)
+CUSTO_PADRAO = float(os.getenv("AVK_CUSTO_BACKTEST", "0.0005"))
+
+# Fator de anualização (pregões por ano, barras diárias)
+BARRAS_POR_ANO = 252
+
+# Combinações avaliadas por bloco vetorizado (cada bloco usa alguns arrays (combinações, barras))
+COMBINACOES_POR_BLOCO = 256
+
+# Processos da varredura (padrão: número de CPUs). Varreduras pequenas rodam no próprio processo,
+# onde o custo de iniciar o pool seria maior que o ganho
+PROCESSOS_BACKTEST = int(os.getenv("AVK_PROCESSOS_BACKTEST", "0")) or os.cpu_count() or 1
+MIN_COMBINACOES_PROCESSOS = 2 * COMBINACOES_POR_BLOCO
+
+# Métricas retornadas para cada combinação
+METRICAS = [
+    "Retorno Total (%)", "Retorno Anual (%)", "Volatilidade (%)", "Sharpe",
+    "Drawdown Máximo (%)", "Operações", "Acerto (%)", "Retorno Médio por Operação (%)",
+    "Exposição (%)",
+]
+
+########## Posições ##########
+
+def _valida_combinacoes(estrategia: str, combinacoes: np.ndarray) -> None:
+    """Confere o nome da estratégia e a forma das combinações de parâmetros"""
+    if estrategia not in ESTRATEGIAS:
+        raise ValueError(f"Estratégia desconhecida: {estrategia}. Disponíveis: {sorted(ESTRATEGIAS)}")
+    if combinacoes.ndim != 2 or combinacoes.shape[1] != len(ESTRATEGIAS[estrategia]):
+        raise ValueError(f"A estratégia {estrategia} usa os parâmetros {ESTRATEGIAS[estrategia]}")
+
+def _posicoes(ohlcv: np.ndarray, estrategia: str, combinacoes: np.ndarray) -> np.ndarray:
+    """
+    Posição (1 = comprado, 0 = fora) ao fim de cada barra, para cada combinação de parâmetros.
+
+    Os indicadores de todas as janelas distintas do bloco saem de uma única chamada do motor
+    de indicadores; cada combinação apenas seleciona as linhas correspondentes.
+
+    Returns:
+        Array (n_combinacoes, n_barras)
+    """
+    if estrategia in ("cruzamento_sma", "cruzamento_ema"):
+        tipo = estrategia.split("_")[1]
+        janelas, indices = np.unique(combinacoes.astype(int), return_inverse=True)
+        indices = indices.reshape(combinacoes.shape)
+        indicadores = avk_calcula_indicadores(ohlcv, {tipo: tuple(int(j) for j in janelas)})
+        medias = np.stack([indicadores[f"{tipo.upper()}_{j}"] for j in janelas])
+        # Comparações com NaN (janela ainda incompleta) são falsas: fora do mercado
+        with np.errstate(invalid='ignore'):
+            return (medias[indices[:, 0]] > medias[indices[:, 1]]).astype(np.float64)
+
+    # RSI: estado comprado/fora que muda apenas nos eventos de compra e venda
+    periodos, indices = np.unique(combinacoes[:, 0].astype(int), return_inverse=True)
+    rsi = np.stack([avk_calcula_indicadores(ohlcv, {"rsi": int(p)})[f"RSI_{p}"] for p in periodos])[indices]
+    with np.errstate(invalid='ignore'):
+        compra = rsi < combinacoes[:, 1:2]
+        venda = rsi > combinacoes[:, 2:3]
+    evento = compra | venda
+    # Propaga o último evento para frente (índice da última barra com evento; -1 = nenhum ainda)
+    n = rsi.shape[1]
+    ultimo = np.maximum.accumulate(np.where(evento, np.arange(n), -1), axis=1)
+    linhas = np.arange(len(combinacoes))[:, None]
+    return np.where(ultimo >= 0, compra[linhas, np.clip(ultimo, 0, None)], False).astype(np.float64)
+
+########## Métricas ##########
+
+def _metricas(close: np.ndarray, posicoes: np.ndarray, custo: float,
+              barras_por_ano: float) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """
+    Retornos, drawdown e estatísticas das operações de cada combinação.
+
+    O sinal calculado no fechamento da barra t é executado nesse fechamento e vale para o
+    retorno de t para t + 1 (sem olhar para o futuro). O custo é descontado em cada mudança de posição.
+
+    Args:
+        close: Fechamentos (n_barras,)
+        posicoes: Posições (n_combinacoes, n_barras)
+        custo: Custo por operação (fração)
+        barras_por_ano: Fator de anualização
+
+    Returns:
+        Tupla (dicionário métrica -> array (n_combinacoes,), patrimônio (n_combinacoes, n_barras))
+    """
+    m, n = posicoes.shape
+    retornos = close[1:] / close[:-1] - 1.0
+    exposicao = posicoes[:, :-1]
+    trocas = np.abs(np.diff(exposicao, axis=1, prepend=0.0))
+    retornos_estrategia = exposicao * retornos - custo * trocas
+
+    # Patrimônio (começa em 1) e seu logaritmo acumulado, usado nos retornos de cada operação
+    log_patrimonio = np.zeros((m, n))
+    np.cumsum(np.log1p(retornos_estrategia), axis=1, out=log_patrimonio[:, 1:])
+    patrimonio = np.exp(log_patrimonio)
+
+    n_retornos = n - 1
+    total = patrimonio[:, -1] - 1.0
+    media = retornos_estrategia.mean(axis=1)
+    desvio = retornos_estrategia.std(axis=1, ddof=1) if n_retornos > 1 else np.zeros(m)
+    drawdown = (patrimonio / np.maximum.accumulate(patrimonio, axis=1) - 1.0).min(axis=1)
+
+    # Operações: entradas e saídas alternam em cada linha, e np.nonzero as lista na mesma ordem
+    bordas = np.diff(np.pad(exposicao, ((0, 0), (1, 1))), axis=1)
+    linhas, entradas = np.nonzero(bordas > 0)
+    _, saidas = np.nonzero(bordas < 0)
+    # O custo da venda é descontado na barra da saída, então a operação vai até saida + 1
+    retornos_operacoes = np.expm1(log_patrimonio[linhas, np.minimum(saidas + 1, n_retornos)]
+                                  - log_patrimonio[linhas, entradas])
+    operacoes = np.bincount(linhas, minlength=m)
+    ganhos = np.bincount(linhas, weights=retornos_operacoes > 0, minlength=m)
+    soma_operacoes = np.bincount(linhas, weights=retornos_operacoes, minlength=m)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        metricas = {
+            "Retorno Total (%)": total * 100,
+            "Retorno Anual (%)": (np.power(np.clip(patrimonio[:, -1], 0.0, None),
+                                           barras_por_ano / max(n_retornos, 1)) - 1.0) * 100,
+            "Volatilidade (%)": desvio * np.sqrt(barras_por_ano) * 100,
+            "Sharpe": np.where(desvio > 0, media / desvio * np.sqrt(barras_por_ano), np.nan),
+            "Drawdown Máximo (%)": drawdown * 100,
+            "Operações": operacoes,
+            "Acerto (%)": np.where(operacoes > 0, ganhos / operacoes * 100, np.nan),
+            "Retorno Médio por Operação (%)": np.where(operacoes > 0, soma_operacoes / operacoes * 100, np.nan),
+            "Exposição (%)": exposicao.mean(axis=1) * 100,
+        }
+    return metricas, patrimonio
+
+def _avalia_bloco(ohlcv: np.ndarray, estrategia: str, combinacoes: np.ndarray,
+                  custo: float, barras_por_ano: float) -> Dict[str, np.ndarray]:
+    """Avalia um bloco de combinações (função de nível de módulo, executada pelos processos do pool)"""
+    posicoes = _posicoes(ohlcv, estrategia, combinacoes)
+    metricas, _ = _metricas(ohlcv[:, 3], posicoes, custo, barras_por_ano)
+    return metricas
+
+########## Backtest ##########
+
+def avk_backtest(hist: pd.DataFrame, estrategia: str, parametros: dict, custo: float = CUSTO_PADRAO,
+                 barras_por_ano: float = BARRAS_POR_ANO) -> Tuple[dict, pd.DataFrame]:
+    """
+    Executa o backtest de uma estratégia com um conjunto de parâmetros.
+
+    Args:
+        hist: DataFrame no formato padrão (Date, Open, High, Low, Close, Volume)
+        estrategia: Nome da estratégia (ver ESTRATEGIAS)
+        parametros: Valores dos parâmetros da estratégia (ex: {"rapida": 20, "lenta": 50})
+        custo: Custo por operação (fração do valor)
+        barras_por_ano: Fator de anualização (252 para barras diárias)
+
+    Returns:
+        Tupla (dicionário de métricas, incluindo o retorno de comprar e manter,
+        DataFrame com Date, Posição, Patrimônio e Comprar e Manter)
+
+    Raises:
+        ValueError: Se a estratégia ou os parâmetros forem inválidos, ou o histórico tiver menos de 2 barras
+    """
+    if len(hist) < 2:
+        raise ValueError("Histórico insuficiente para o backtest")
+    if estrategia in ESTRATEGIAS and set(parametros) != set(ESTRATEGIAS[estrategia]):
+        raise ValueError(f"A estratégia {estrategia} usa os parâmetros {ESTRATEGIAS[estrategia]}")
+
+    combinacoes = np.array([[parametros[nome] for nome in ESTRATEGIAS.get(estrategia, ())]], dtype=np.float64)
+    _valida_combinacoes(estrategia, combinacoes)
+
+    ohlcv = avk_ohlcv_array(hist)
+    posicoes = _posicoes(ohlcv, estrategia, combinacoes)
+    metricas, patrimonio = _metricas(ohlcv[:, 3], posicoes, custo, barras_por_ano)
+
+    resultado = {nome: valores[0].item() for nome, valores in metricas.items()}
+    resultado["Comprar e Manter (%)"] = float(ohlcv[-1, 3] / ohlcv[0, 3] - 1.0) * 100
+    curva = pd.DataFrame({
+        "Date": hist["Date"].to_numpy(),
+        "Posição": posicoes[0],
+        "Patrimônio": patrimonio[0],
+        "Comprar e Manter": ohlcv[:, 3] / ohlcv[0, 3],
+    })
+    return resultado, curva
+
+def avk_grade_parametros(estrategia: str, **valores: List[float]) -> List[dict]:
+    """
+    Monta a grade (produto cartesiano) de parâmetros de uma estratégia.
+
+    Combinações sem sentido são descartadas: média rápida maior ou igual à lenta,
+    ou nível de compra do RSI maior ou igual ao de venda.
+
+    Args:
+        estrategia: Nome da estratégia (ver ESTRATEGIAS)
+        **valores: Lista de valores de cada parâmetro (ex: rapida=range(5, 50), lenta=range(20, 200, 5))
+
+    Returns:
+        Lista de dicionários de parâmetros
+
+    Raises:
+        ValueError: Se a estratégia for desconhecida ou faltar algum parâmetro
+    """
+    if estrategia not in ESTRATEGIAS:
+        raise ValueError(f"Estratégia desconhecida: {estrategia}. Disponíveis: {sorted(ESTRATEGIAS)}")
+    nomes = ESTRATEGIAS[estrategia]
+    if set(valores) != set(nomes):
+        raise ValueError(f"A estratégia {estrategia} usa os parâmetros {nomes}")
+
+    grade = [dict(zip(nomes, combinacao)) for combinacao in itertools.product(*(valores[n] for n in nomes))]
+    if estrategia == "rsi":
+        return [p for p in grade if p["compra"] < p["venda"]]
+    return [p for p in grade if p["rapida"] < p["lenta"]]
+
+def avk_varredura(hist: pd.DataFrame, estrategia: str, grade: List[dict], custo: float = CUSTO_PADRAO,
+                  barras_por_ano: float = BARRAS_POR_ANO, processos: Optional[int] = None) -> pd.DataFrame:
+    """
+    Avalia todas as combinações de parâmetros de uma grade.
+
+    As combinações são avaliadas em blocos vetorizados; com muitas combinações, os blocos
+    são distribuídos entre processos (cada um recebe só o array OHLCV e o seu bloco).
+
+    Args:
+        hist: DataFrame no formato padrão
+        estrategia: Nome da estratégia (ver ESTRATEGIAS)
+        grade: Lista de parâmetros (ver avk_grade_parametros)
+        custo: Custo por operação (fração do valor)
+        barras_por_ano: Fator de anualização (252 para barras diárias)
+        processos: Número de processos (padrão: PROCESSOS_BACKTEST; 1 = sem pool)
+
+    Returns:
+        DataFrame com uma linha por combinação (parâmetros + METRICAS), ordenado pelo Sharpe
+
+    Raises:
+        ValueError: Se a estratégia ou a grade forem inválidas, ou o histórico tiver menos de 2 barras
+    """
+    if len(hist) < 2:
+        raise ValueError("Histórico insuficiente para o backtest")
+    nomes = ESTRATEGIAS.get(estrategia, ())
+    combinacoes = np.array([[p[nome] for nome in nomes] for p in grade], dtype=np.float64).reshape(len(grade), len(nomes))
+    _valida_combinacoes(estrategia, combinacoes)
+    if not len(combinacoes):
+        return pd.DataFrame(columns=list(nomes) + METRICAS)
+
+    ohlcv = avk_ohlcv_array(hist)
+    blocos = [combinacoes[i:i + COMBINACOES_POR_BLOCO] for i in range(0, len(combinacoes), COMBINACOES_POR_BLOCO)]
+    processos = min(processos or PROCESSOS_BACKTEST, len(blocos))
+
+    argumentos = (itertools.repeat(ohlcv), itertools.repeat(estrategia), blocos,
+                  itertools.repeat(custo), itertools.repeat(barras_por_ano))
+    if processos > 1 and len(combinacoes) >= MIN_COMBINACOES_PROCESSOS:
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            resultados = list(executor.map(_avalia_bloco, *argumentos))
+    else:
+        resultados = list(map(_avalia_bloco, *argumentos))
+
+    tabela = pd.DataFrame(combinacoes, columns=list(nomes))
+    # Janelas e períodos são inteiros; os níveis do RSI podem ser fracionários
+    inteiros = [nome for nome in nomes if nome in ("rapida", "lenta", "periodo")]
+    tabela[inteiros] = tabela[inteiros].astype(int)
+    for nome in METRICAS:
+        tabela[nome] = np.concatenate([r[nome] for r in resultados])
+    return tabela.sort_values("Sharpe", ascending=False, na_position="last").reset_index(drop=True)
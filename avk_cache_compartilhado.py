@@ -0,0 +1,373 @@
+# Módulo de Cache Compartilhado
+# Cache entre processos (vários workers do Streamlit) e entre hosts para os dados extraídos e as
+# análises de IA: cada entrada é gravada uma vez (Arrow IPC), lida sem cópia e preenchida por um
+# único worker, sob uma trava compartilhada
+
+# Imports
+import os
+import time
+import uuid
+import struct
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+import pandas as pd
+from avk_data_store import AVK_CACHE_DIR
+from avk_telemetria import avk_span, avk_incrementa, avk_registra_cache
+
+# Tente importar PyArrow (necessário para o cache compartilhado; sem ele, cada processo usa o próprio cache)
+try:
+    import pyarrow as pa
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+########## Configuração do Cache Compartilhado ##########
+
+# Backend do cache:
+# - vazio (padrão): desativado, cada processo usa apenas o próprio cache (st.cache_data)
+# - "arquivos": arquivos Arrow mapeados em memória em AVK_CACHE_DIR (workers do mesmo host)
+# - "redis://host:porta/db": servidor compatível com Redis (workers em hosts diferentes)
+AVK_CACHE_COMPARTILHADO = os.getenv("AVK_CACHE_COMPARTILHADO", "")
+
+# Validade (segundos) dos dados extraídos: a mesma do st.cache_data de avk_extrai_dados
+TTL_CACHE_COMPARTILHADO = float(os.getenv("AVK_TTL_CACHE_COMPARTILHADO", "300"))
+
+# Validade (segundos) de uma trava de preenchimento: também é a espera máxima dos demais workers
+# Uma trava abandonada (ex: worker encerrado no meio do preenchimento) deixa de valer após esse tempo
+VALIDADE_TRAVA = float(os.getenv("AVK_VALIDADE_TRAVA", "60"))
+
+# Intervalo entre tentativas de obter uma trava ocupada
+_INTERVALO_TRAVA = 0.05
+
+########## Backends ##########
+
+class BackendCache:
+    """
+    Interface comum dos backends: bytes por chave, com validade, e uma trava por chave.
+
+    Subclasses definem obtem(), grava(), adquire() e libera(). Falhas do backend
+    (OSError, erros do Arrow ou do Redis) são tratadas pelas funções deste módulo
+    como cache ausente, sem interromper a extração ou a análise.
+    """
+
+    nome = ""
+
+    def obtem(self, chave: str) -> Optional["pa.Buffer"]:
+        """Retorna o conteúdo guardado (sem cópia, quando o backend permite), ou None se ausente ou expirado"""
+        raise NotImplementedError
+
+    def grava(self, chave: str, dados: "pa.Buffer", ttl: float) -> None:
+        """Guarda o conteúdo por ttl segundos"""
+        raise NotImplementedError
+
+    def adquire(self, chave: str, validade: float) -> Optional[str]:
+        """Tenta obter a trava da chave, sem esperar. Retorna um token, ou None se ela estiver ocupada"""
+        raise NotImplementedError
+
+    def libera(self, chave: str, token: str) -> None:
+        """Libera a trava, se ela ainda pertencer ao token"""
+        raise NotImplementedError
+
+class BackendArquivos(BackendCache):
+    """
+    Backend para workers do mesmo host: um arquivo Arrow IPC por entrada, lido com memory map.
+
+    A leitura não copia os dados: os DataFrames apontam para o cache de páginas do sistema,
+    compartilhado por todos os processos. As travas são arquivos criados de forma exclusiva.
+    """
+
+    nome = "arquivos"
+
+    # Cabeçalho de cada arquivo: instante de expiração (epoch, float64)
+    _CABECALHO = struct.Struct("<d")
+
+    # Arquivos sem gravação há mais de um dia são removidos na limpeza periódica
+    _IDADE_LIMPEZA = 86400
+
+    def __init__(self, diretorio: str):
+        self.diretorio = diretorio
+        self._ultima_limpeza = 0.0
+
+    def _caminho(self, chave: str, extensao: str) -> str:
+        return os.path.join(self.diretorio, hashlib.sha256(chave.encode()).hexdigest()[:32] + extensao)
+
+    def obtem(self, chave: str) -> Optional["pa.Buffer"]:
+        try:
+            mapa = pa.memory_map(self._caminho(chave, ".arrow"), "r")
+        except FileNotFoundError:
+            return None
+        conteudo = mapa.read_buffer()
+        if conteudo.size < self._CABECALHO.size:
+            return None
+        expira, = self._CABECALHO.unpack(conteudo.slice(0, self._CABECALHO.size).to_pybytes())
+        if expira < time.time():
+            return None
+        return conteudo.slice(self._CABECALHO.size)
+
+    def grava(self, chave: str, dados: "pa.Buffer", ttl: float) -> None:
+        os.makedirs(self.diretorio, exist_ok=True)
+        caminho = self._caminho(chave, ".arrow")
+        # Grava em um arquivo temporário e renomeia: leitores mapeiam sempre um arquivo completo
+        # (quem já mapeou a versão anterior continua lendo-a até descartar o DataFrame)
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporario, "wb") as arquivo:
+            arquivo.write(self._CABECALHO.pack(time.time() + ttl))
+            arquivo.write(dados)
+        os.replace(temporario, caminho)
+        self._limpa()
+
+    def adquire(self, chave: str, validade: float) -> Optional[str]:
+        os.makedirs(self.diretorio, exist_ok=True)
+        caminho = self._caminho(chave, ".lock")
+        token = uuid.uuid4().hex
+        try:
+            descritor = os.open(caminho, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            # Trava abandonada: removida após a validade, para que a próxima tentativa a obtenha
+            try:
+                if time.time() - os.path.getmtime(caminho) > validade:
+                    os.remove(caminho)
+            except OSError:
+                pass
+            return None
+        with os.fdopen(descritor, "w") as arquivo:
+            arquivo.write(token)
+        return token
+
+    def libera(self, chave: str, token: str) -> None:
+        caminho = self._caminho(chave, ".lock")
+        try:
+            with open(caminho) as arquivo:
+                dono = arquivo.read() == token
+            if dono:
+                os.remove(caminho)
+        except OSError:
+            pass
+
+    def _limpa(self) -> None:
+        """Remove os arquivos antigos (no máximo uma vez por hora em cada processo)"""
+        agora = time.time()
+        if agora - self._ultima_limpeza < 3600:
+            return
+        self._ultima_limpeza = agora
+        for nome in os.listdir(self.diretorio):
+            caminho = os.path.join(self.diretorio, nome)
+            try:
+                if agora - os.path.getmtime(caminho) > self._IDADE_LIMPEZA:
+                    os.remove(caminho)
+            except OSError:
+                pass
+
+class BackendRedis(BackendCache):
+    """
+    Backend para workers em hosts diferentes: servidor compatível com Redis (Redis, Valkey, KeyDB...).
+
+    A validade usa a expiração do próprio servidor e a trava é um SET NX com expiração,
+    liberada apenas pelo dono (comparação e remoção atômicas em um script Lua).
+    """
+
+    nome = "redis"
+
+    _SCRIPT_LIBERA = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url: str, prefixo: str = "avk:"):
+        # Importado só aqui: o cliente Redis (opcional) não pesa na inicialização da app sem este backend
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("AVK_CACHE_COMPARTILHADO aponta para um servidor Redis, mas o pacote redis "
+                              "não está instalado (pip install redis)")
+        # Falhas do servidor também passam a ser tratadas como cache ausente
+        global _ERROS_BACKEND
+        if redis.exceptions.RedisError not in _ERROS_BACKEND:
+            _ERROS_BACKEND += (redis.exceptions.RedisError,)
+        # A conexão só é aberta no primeiro comando
+        self._cliente = redis.Redis.from_url(url)
+        self._prefixo = prefixo
+
+    def obtem(self, chave: str) -> Optional["pa.Buffer"]:
+        conteudo = self._cliente.get(self._prefixo + chave)
+        # Os bytes recebidos são lidos pelo Arrow sem uma segunda cópia
+        return None if conteudo is None else pa.py_buffer(conteudo)
+
+    def grava(self, chave: str, dados: "pa.Buffer", ttl: float) -> None:
+        self._cliente.set(self._prefixo + chave, memoryview(dados), px=int(ttl * 1000))
+
+    def adquire(self, chave: str, validade: float) -> Optional[str]:
+        token = uuid.uuid4().hex
+        if self._cliente.set(f"{self._prefixo}trava:{chave}", token, nx=True, px=int(validade * 1000)):
+            return token
+        return None
+
+    def libera(self, chave: str, token: str) -> None:
+        self._cliente.eval(self._SCRIPT_LIBERA, 1, f"{self._prefixo}trava:{chave}", token)
+
+# Falhas do backend tratadas como cache ausente (ValueError inclui os erros de leitura do Arrow,
+# ex: entrada truncada ou corrompida); BackendRedis acrescenta os erros do cliente Redis
+_ERROS_BACKEND = (OSError, ValueError)
+
+def avk_cria_backend(configuracao: str) -> Optional[BackendCache]:
+    """
+    Cria o backend descrito por AVK_CACHE_COMPARTILHADO.
+
+    Args:
+        configuracao: "", "arquivos" ou URL do servidor ("redis://", "rediss://" ou "unix://")
+
+    Returns:
+        O backend, ou None se o cache compartilhado estiver desativado (ou sem PyArrow)
+
+    Raises:
+        ValueError: Se a configuração não for reconhecida
+    """
+    if not configuracao or not ARROW_AVAILABLE:
+        return None
+    if configuracao == "arquivos":
+        return BackendArquivos(os.path.join(AVK_CACHE_DIR, "compartilhado"))
+    if configuracao.startswith(("redis://", "rediss://", "unix://")):
+        return BackendRedis(configuracao)
+    raise ValueError(f"AVK_CACHE_COMPARTILHADO inválido: {configuracao!r} (use 'arquivos' ou uma URL redis://)")
+
+# Backend do processo, compartilhado por todas as sessões (None = desativado)
+avk_cache_compartilhado = avk_cria_backend(AVK_CACHE_COMPARTILHADO)
+
+########## Serialização ##########
+
+def avk_serializa_tabela(dados: pd.DataFrame) -> "pa.Buffer":
+    """DataFrame em Arrow IPC (o esquema compacto do OHLCV, inclusive o fuso das datas, é preservado)"""
+    tabela = pa.Table.from_pandas(dados, preserve_index=False)
+    destino = pa.BufferOutputStream()
+    with pa.ipc.new_stream(destino, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    return destino.getvalue()
+
+def avk_desserializa_tabela(conteudo: "pa.Buffer") -> pd.DataFrame:
+    """
+    DataFrame a partir de Arrow IPC, sem copiar as colunas numéricas.
+
+    As colunas apontam para o conteúdo lido (no backend de arquivos, o memory map) e são
+    somente leitura: quem precisar alterar valores deve trabalhar em uma cópia.
+    """
+    return pa.ipc.open_stream(conteudo).read_all().to_pandas(split_blocks=True)
+
+########## Operações ##########
+
+def _obtem(backend: BackendCache, chave: str) -> Optional["pa.Buffer"]:
+    try:
+        return backend.obtem(chave)
+    except _ERROS_BACKEND:
+        return None
+
+def _obtem_tabela(backend: BackendCache, chave: str) -> Optional[pd.DataFrame]:
+    """DataFrame guardado na chave (None se ausente ou ilegível, ex: gravado por uma versão anterior)"""
+    conteudo = _obtem(backend, chave)
+    if conteudo is None:
+        return None
+    try:
+        return avk_desserializa_tabela(conteudo)
+    except _ERROS_BACKEND:
+        return None
+
+def _grava(backend: BackendCache, chave: str, dados: "pa.Buffer", ttl: float) -> None:
+    try:
+        backend.grava(chave, dados, ttl)
+    except _ERROS_BACKEND:
+        pass
+
+@contextmanager
+def avk_trava_compartilhada(chave: str, validade: float = VALIDADE_TRAVA,
+                            backend: Optional[BackendCache] = None) -> Iterator[bool]:
+    """
+    Trava de preenchimento entre workers: apenas um executa o trecho por vez para a mesma chave.
+
+    Espera no máximo a validade da trava; depois disso (ou se o backend falhar), segue sem ela,
+    então uma trava abandonada atrasa os demais workers, mas não os bloqueia.
+
+    Args:
+        chave: Chave da entrada a preencher
+        validade: Validade da trava em segundos (e espera máxima)
+        backend: Backend a usar (padrão: avk_cache_compartilhado; sem backend, não trava)
+
+    Yields:
+        True se a trava foi obtida
+    """
+    backend = backend or avk_cache_compartilhado
+    token = None
+    if backend is not None:
+        limite = time.monotonic() + validade
+        with avk_span("cache_compartilhado.trava"):
+            while True:
+                try:
+                    token = backend.adquire(chave, validade)
+                except _ERROS_BACKEND:
+                    break
+                if token is not None or time.monotonic() >= limite:
+                    break
+                time.sleep(_INTERVALO_TRAVA)
+        if token is None:
+            avk_incrementa("avk_trava_expirada_total")
+    try:
+        yield token is not None
+    finally:
+        if token is not None:
+            try:
+                backend.libera(chave, token)
+            except _ERROS_BACKEND:
+                pass
+
+def avk_obtem_ou_preenche_tabela(chave: str, preenche: Callable[[], pd.DataFrame],
+                                 ttl: float = TTL_CACHE_COMPARTILHADO,
+                                 backend: Optional[BackendCache] = None) -> pd.DataFrame:
+    """
+    Retorna o DataFrame guardado no cache compartilhado ou o preenche.
+
+    Com a entrada ausente, apenas o worker que obtém a trava chama preenche(); os demais
+    aguardam a trava e leem a entrada que ele gravou. Sem backend, apenas chama preenche().
+
+    Args:
+        chave: Chave da entrada (ex: 'dados|MSFT|6mo|1d|yfinance')
+        preenche: Função sem argumentos que produz o DataFrame (ex: extração no provedor)
+        ttl: Validade da entrada em segundos
+        backend: Backend a usar (padrão: avk_cache_compartilhado)
+
+    Returns:
+        DataFrame (somente leitura quando vem do cache, ver avk_desserializa_tabela)
+    """
+    backend = backend or avk_cache_compartilhado
+    if backend is None:
+        return preenche()
+
+    dados = _obtem_tabela(backend, chave)
+    avk_registra_cache("compartilhado", acerto=dados is not None)
+    if dados is not None:
+        return dados
+
+    with avk_trava_compartilhada(chave, backend=backend):
+        # Outro worker pode ter preenchido a entrada enquanto esta aguardava a trava
+        # (uma entrada ilegível é tratada como ausente e sobrescrita)
+        dados = _obtem_tabela(backend, chave)
+        if dados is not None:
+            return dados
+        dados = preenche()
+        _grava(backend, chave, avk_serializa_tabela(dados), ttl)
+        return dados
+
+def avk_obtem_texto(chave: str, backend: Optional[BackendCache] = None) -> Optional[str]:
+    """Texto guardado no cache compartilhado (None se ausente, expirado ou sem backend)"""
+    backend = backend or avk_cache_compartilhado
+    if backend is None:
+        return None
+    conteudo = _obtem(backend, chave)
+    if conteudo is None:
+        return None
+    try:
+        return conteudo.to_pybytes().decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+def avk_grava_texto(chave: str, texto: str, ttl: float, backend: Optional[BackendCache] = None) -> None:
+    """Guarda um texto no cache compartilhado (sem efeito sem backend)"""
+    backend = backend or avk_cache_compartilhado
+    if backend is not None:
+        _grava(backend, chave, pa.py_buffer(texto.encode("utf-8")), ttl)
@@ -0,0 +1,208 @@
+# Módulo de Linha de Comando
+# Pré-processamento fora do Streamlit: extrai uma lista de ações, calcula os indicadores e grava
+# snapshots, estados dos indicadores e figuras no cache em disco, para que a app sirva resultados prontos
+#
+# Uso (a partir da raiz do projeto):
+#   python avk_cli.py prefetch                                  # WATCHLIST_PADRAO do screener, barras diárias
+#   python avk_cli.py prefetch MSFT AAPL NVDA --intervalos 1d 60m
+#   python avk_cli.py prefetch --arquivo watchlist.txt --ia --json prefetch.json
+#
+# Ex: no cron, antes da abertura do mercado (dias úteis, 9h):
+#   0 9 * * 1-5 cd /caminho/do/projeto && python avk_cli.py prefetch --arquivo watchlist.txt --ia
+
+# Imports
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+import pandas as pd
+from avk_data_provider import avk_extrai_dados_batch, avk_snapshot_local
+from avk_indicators_incremental import AcompanhadorIndicadores, avk_salva_indicadores
+from avk_analytics import avk_salva_figura_dashboard
+from avk_downsampling import LARGURA_PADRAO_PX
+from avk_telemetria import avk_execucao
+
+# Sem avisos de "missing ScriptRunContext" ao chamar funções do Streamlit fora da app
+# (o Streamlit redefine o nível dos seus loggers ao ler a configuração, então eles são desativados)
+for _nome in list(logging.root.manager.loggerDict):
+    if _nome.startswith("streamlit"):
+        logging.getLogger(_nome).disabled = True
+
+########## Configuração ##########
+
+# Período extraído para cada intervalo: os mesmos pares de INTERVALOS em avk_app.py, para que a app
+# receba exatamente os dados pré-processados (e encontre as figuras gravadas para eles)
+PERIODOS_INTERVALO = {
+    "1d": "6mo",
+    "60m": "1mo",
+    "15m": "1mo",
+    "5m": "5d",
+    "1m": "1mo",
+}
+
+# Processos que calculam os indicadores e montam as figuras (padrão: um por CPU)
+PROCESSOS_CLI = int(os.getenv("AVK_PROCESSOS_CLI", "0")) or os.cpu_count() or 1
+
+########## Pré-processamento ##########
+
+def avk_le_watchlist(caminho: str) -> List[str]:
+    """
+    Lê uma lista de tickers de um arquivo (separados por vírgula, espaço ou linha; '#' inicia um comentário).
+
+    Returns:
+        Tickers em maiúsculas, sem duplicatas e na ordem do arquivo
+    """
+    tickers = []
+    with open(caminho, encoding="utf-8") as arquivo:
+        for linha in arquivo:
+            tickers.extend(linha.split("#", 1)[0].replace(",", " ").split())
+    return list(dict.fromkeys(ticker.upper() for ticker in tickers))
+
+def _processa_serie(ticker: str, interval: str, hist: pd.DataFrame, largura_px: int) -> dict:
+    """
+    Calcula os indicadores de uma série e grava o estado deles e a figura do dashboard.
+
+    Executada nos processos do pool: recebe o histórico já extraído e não acessa a rede.
+
+    Returns:
+        Resumo da série (barras e tempos em milissegundos)
+    """
+    inicio = time.perf_counter()
+    # Estado novo a partir do histórico: é o mesmo que a app obtém ao atualizar os indicadores
+    acompanhador = AcompanhadorIndicadores()
+    acompanhador.atualiza_frame(hist)
+    avk_salva_indicadores(f"{ticker}_{interval}", acompanhador)
+    indicadores = acompanhador.frame()
+    meio = time.perf_counter()
+
+    avk_salva_figura_dashboard(hist, ticker, indicadores, largura_px)
+    fim = time.perf_counter()
+    return {
+        "barras": len(hist),
+        "indicadores_ms": round((meio - inicio) * 1000, 1),
+        "figura_ms": round((fim - meio) * 1000, 1),
+    }
+
+def avk_prefetch(tickers: Iterable[str], intervalos: Iterable[str] = ("1d",), processos: Optional[int] = None,
+                 max_workers: int = 8, ia: bool = False, largura_px: int = LARGURA_PADRAO_PX) -> Dict[str, dict]:
+    """
+    Pré-processa uma lista de ações: dados, indicadores, figuras e, opcionalmente, a análise de IA.
+
+    Os dados são extraídos em lote (o armazenamento em disco é atualizado incrementalmente) e
+    os indicadores e figuras são calculados em um pool de processos. A análise de IA usa o
+    histórico diário armazenado como fingerprint, como a app faz ao clicar em "Analisar".
+
+    Args:
+        tickers: Símbolos das ações
+        intervalos: Intervalos das barras (chaves de PERIODOS_INTERVALO)
+        processos: Número de processos (padrão: PROCESSOS_CLI; 1 = sem pool)
+        max_workers: Threads da extração individual (tickers que o download em lote não obteve)
+        ia: Se True, também executa a análise de IA de cada ticker (guardada no cache de análises)
+        largura_px: Largura dos gráficos em pixels (a mesma da app)
+
+    Returns:
+        Dicionário ticker -> {intervalo ou 'ia' -> resumo ou {'erro': mensagem}}
+    """
+    tickers = list(dict.fromkeys(ticker.strip().upper() for ticker in tickers if ticker and ticker.strip()))
+    for interval in intervalos:
+        if interval not in PERIODOS_INTERVALO:
+            raise ValueError(f"Intervalo não suportado: {interval} (use {', '.join(PERIODOS_INTERVALO)})")
+    resultado: Dict[str, dict] = {ticker: {} for ticker in tickers}
+    processos = processos or PROCESSOS_CLI
+
+    with avk_execucao("prefetch", tickers=len(tickers), intervalos=",".join(intervalos)):
+        for interval in intervalos:
+            dados, erros = avk_extrai_dados_batch(tickers, PERIODOS_INTERVALO[interval],
+                                                  max_workers=max_workers, interval=interval)
+            for ticker, erro in erros.items():
+                resultado[ticker][interval] = {"erro": erro}
+
+            series = [(ticker, hist) for ticker, hist in dados.items() if not hist.empty]
+            for ticker, hist in dados.items():
+                if hist.empty:
+                    resultado[ticker][interval] = {"erro": "Sem dados no período"}
+
+            if processos > 1 and len(series) > 1:
+                with ProcessPoolExecutor(max_workers=min(processos, len(series))) as executor:
+                    futuros = {ticker: executor.submit(_processa_serie, ticker, interval, hist, largura_px)
+                               for ticker, hist in series}
+                    for ticker, futuro in futuros.items():
+                        try:
+                            resultado[ticker][interval] = futuro.result()
+                        except Exception as e:
+                            resultado[ticker][interval] = {"erro": str(e)}
+            else:
+                for ticker, hist in series:
+                    try:
+                        resultado[ticker][interval] = _processa_serie(ticker, interval, hist, largura_px)
+                    except Exception as e:
+                        resultado[ticker][interval] = {"erro": str(e)}
+
+        if ia:
+            # Importado só aqui: o agente (phidata, Groq) não é necessário sem --ia
+            from avk_agents import avk_executa_analise
+            # Em sequência: as chamadas ao modelo têm limite de requisições
+            for ticker in tickers:
+                inicio = time.perf_counter()
+                try:
+                    avk_executa_analise(ticker, avk_snapshot_local(ticker))
+                    resultado[ticker]["ia"] = {"ia_ms": round((time.perf_counter() - inicio) * 1000, 1)}
+                except Exception as e:
+                    resultado[ticker]["ia"] = {"erro": str(e)}
+
+    return resultado
+
+########## Linha de Comando ##########
+
+def _imprime_resultado(resultado: Dict[str, dict]) -> None:
+    for ticker, etapas in resultado.items():
+        for etapa, resumo in etapas.items():
+            if "erro" in resumo:
+                print(f"{ticker:<10} {etapa:<4} ERRO: {resumo['erro']}")
+            elif etapa == "ia":
+                print(f"{ticker:<10} {etapa:<4} análise em cache ({resumo['ia_ms']:.0f} ms)")
+            else:
+                print(f"{ticker:<10} {etapa:<4} {resumo['barras']:>7} barras   "
+                      f"indicadores {resumo['indicadores_ms']:>8.1f} ms   figura {resumo['figura_ms']:>8.1f} ms")
+
+def main(argumentos: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Pré-processamento da app fora do Streamlit")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    prefetch = comandos.add_parser("prefetch", help="Extrai e pré-processa uma lista de ações")
+    prefetch.add_argument("tickers", nargs="*", help="Símbolos das ações (padrão: WATCHLIST_PADRAO do screener)")
+    prefetch.add_argument("--arquivo", help="Arquivo com a lista de tickers (acrescentada aos informados)")
+    prefetch.add_argument("--intervalos", nargs="+", default=["1d"], choices=list(PERIODOS_INTERVALO),
+                          help="Intervalos das barras (padrão: 1d)")
+    prefetch.add_argument("--processos", type=int, default=None,
+                          help=f"Processos para indicadores e figuras (padrão: {PROCESSOS_CLI})")
+    prefetch.add_argument("--threads", type=int, default=8, help="Threads da extração individual (padrão: 8)")
+    prefetch.add_argument("--ia", action="store_true", help="Também executa a análise de IA de cada ticker")
+    prefetch.add_argument("--json", help="Arquivo para gravar o resumo")
+    args = parser.parse_args(argumentos)
+
+    tickers = list(args.tickers)
+    if args.arquivo:
+        tickers += avk_le_watchlist(args.arquivo)
+    if not tickers:
+        from avk_screener import WATCHLIST_PADRAO
+        tickers = list(WATCHLIST_PADRAO)
+
+    inicio = time.perf_counter()
+    resultado = avk_prefetch(tickers, args.intervalos, args.processos, args.threads, args.ia)
+    _imprime_resultado(resultado)
+
+    falhas = sum("erro" in resumo for etapas in resultado.values() for resumo in etapas.values())
+    print(f"\n{len(resultado)} tickers pré-processados em {time.perf_counter() - inicio:.1f} s ({falhas} falhas)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+    return 1 if falhas else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,15 +4,33 @@
 # Imports
 import os
 import time
+import threading
+import contextvars
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# Carrega o arquivo de variáveis de ambiente antes de qualquer leitura da configuração
+# (DATA_PROVIDER, ALPHA_VANTAGE_API_KEY, limites de requisições e as variáveis AVK_* lidas
+# na importação dos módulos abaixo); a app e a linha de comando importam este módulo primeiro
+load_dotenv()
+
 import yfinance as yf
 from yfinance.exceptions import YFRateLimitError
+from avk_data_store import avk_store_carrega, avk_store_salva, avk_store_mescla, avk_compacta_ohlcv
+from avk_providers import ProvedorDados, RegistroProvedores
+from avk_telemetria import avk_span, avk_anota, avk_incrementa, avk_registra_cache
+from avk_cache_compartilhado import avk_cache_compartilhado, avk_obtem_ou_preenche_tabela
+from avk_validacao import avk_valida_ohlcv, avk_calendario_ticker, avk_houve_correcoes
 
 # Tente importar Streamlit (opcional, para uso em scripts não-Streamlit)
 try:
     import streamlit as st
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
     STREAMLIT_AVAILABLE = True
 except ImportError:
     STREAMLIT_AVAILABLE = False
@@ -38,8 +56,10 @@ def _get_config(key: str, default: str = "") -> str:
     # Depois tenta st.secrets (apenas se Streamlit estiver disponível e configurado)
     if STREAMLIT_AVAILABLE and st is not None:
         try:
-            # Verifica se st.secrets está disponível (após set_page_config)
-            if hasattr(st, 'secrets') and st.secrets is not None:
+            # Verifica se st.secrets está disponível (após set_page_config).
+            # load_if_toml_exists evita que o Streamlit chame st.error quando
+            # não há secrets.toml - o que falharia fora da thread da página
+            if hasattr(st, 'secrets') and st.secrets is not None and st.secrets.load_if_toml_exists():
                 secrets_value = st.secrets.get(key, "")
                 if secrets_value:
                     return secrets_value
@@ -52,42 +72,275 @@ def _get_config(key: str, default: str = "") -> str:
 DATA_PROVIDER = os.getenv("DATA_PROVIDER", "yfinance")
 ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY", "")
 
-########## Funções de Extração de Dados ##########
+# Duração aproximada de cada período, em dias
+_PERIOD_DAYS = {
+    '1d': 1, '5d': 5, '1mo': 30, '3mo': 90,
+    '6mo': 180, '1y': 365, '2y': 730, '5y': 1825, '10y': 3650, 'ytd': 365, 'max': 3650
+}
+
+# Limites do Yahoo Finance para barras intradiárias: (dias por requisição, dias disponíveis no histórico)
+_LIMITES_INTRADAY_YF = {
+    '1m': (7, 29),
+    '2m': (59, 59), '5m': (59, 59), '15m': (59, 59), '30m': (59, 59), '90m': (59, 59),
+    '60m': (729, 729), '1h': (729, 729),
+}
+
+# Intervalos aceitos pelo Alpha Vantage, no formato da API
+_INTERVALOS_ALPHA_VANTAGE = {
+    '1d': 'daily', '1m': '1min', '5m': '5min', '15m': '15min', '30m': '30min', '60m': '60min', '1h': '60min',
+}
+
+# Folga (em dias) ao comparar o início armazenado com o início pedido (fins de semana e feriados)
+_FOLGA_INICIO_DIAS = 5
+
+# Diferença relativa máxima entre a abertura armazenada e a baixada novamente de uma mesma barra.
+# A abertura não muda ao longo do pregão (ao contrário da máxima, mínima e fechamento da barra do dia);
+# uma diferença maior indica que o provedor reajustou o histórico (desdobramento ou dividendo)
+TOLERANCIA_REAJUSTE = 1e-4
 
-def _extrai_dados_yfinance(ticker: str, period: str = "6mo", max_retries: int = 3, retry_delay: int = 5) -> pd.DataFrame:
+class TickerNaoEncontradoError(ValueError):
+    """O provedor respondeu, mas não há dados para o ticker (não conta como falha do provedor)"""
+    pass
+
+########## Avisos ao Usuário ##########
+
+# Avisos da extração em andamento (ex: provedor alternativo), guardados para quem a chamou
+# None: sem coleta ativa, o aviso é exibido diretamente
+_AVISOS: contextvars.ContextVar[Optional[List[str]]] = contextvars.ContextVar("avk_avisos", default=None)
+
+def _avisa(mensagem: str) -> None:
     """
-    Extrai dados usando Yahoo Finance (método original).
+    Aviso ao usuário sobre a extração.
     
-    Args:
-        ticker: Símbolo da ação
-        period: Período dos dados
-        max_retries: Número máximo de tentativas
-        retry_delay: Tempo de espera entre tentativas
+    Com uma coleta ativa (avk_coleta_avisos), o aviso é guardado para quem chamou; sem ela, é
+    exibido pelo Streamlit apenas na thread do script. Em outras threads (pool da extração em
+    lote, asyncio.to_thread, análise de IA) não há página onde exibi-lo.
+    """
+    avisos = _AVISOS.get()
+    if avisos is not None:
+        avisos.append(mensagem)
+    elif STREAMLIT_AVAILABLE and get_script_run_ctx(suppress_warning=True) is not None:
+        st.info(mensagem)
+
+@contextmanager
+def avk_coleta_avisos() -> Iterator[List[str]]:
+    """
+    Coleta os avisos emitidos pela extração no contexto atual, em vez de exibi-los.
+    
+    Ex: with avk_coleta_avisos() as avisos: dados = _avk_extrai_dados_impl(...)
+    """
+    avisos: List[str] = []
+    token = _AVISOS.set(avisos)
+    try:
+        yield avisos
+    finally:
+        _AVISOS.reset(token)
+
+def avk_exibe_avisos(avisos: List[str]) -> None:
+    """Repassa avisos coletados em outra thread, na thread de quem chamou (sem repetições)"""
+    for mensagem in dict.fromkeys(avisos):
+        _avisa(mensagem)
+
+def _extrai_coletando(*args, **kwargs) -> Tuple[pd.DataFrame, List[str]]:
+    """_avk_extrai_dados_impl para threads de trabalho: retorna os dados e os avisos emitidos"""
+    with avk_coleta_avisos() as avisos:
+        return _avk_extrai_dados_impl(*args, **kwargs), avisos
+
+########## Controle de Taxa de Requisições ##########
+
+class _LimitadorTaxa:
+    """
+    Limitador de taxa do tipo token bucket, compartilhado entre threads.
+    
+    Cada requisição consome um token; os tokens são repostos continuamente
+    à taxa configurada, até o limite da capacidade (rajada máxima).
+    """
+    
+    def __init__(self, taxa: float, capacidade: int):
+        """
+        Args:
+            taxa: Tokens repostos por segundo
+            capacidade: Número máximo de tokens acumulados
+        """
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self._tokens = float(capacidade)
+        self._ultima_reposicao = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def adquire(self) -> None:
+        """Bloqueia até que um token esteja disponível e o consome"""
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._tokens = min(self.capacidade, self._tokens + (agora - self._ultima_reposicao) * self.taxa)
+                self._ultima_reposicao = agora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                espera = (1 - self._tokens) / self.taxa
+            time.sleep(espera)
+
+# Um limitador por provedor, compartilhado por todas as chamadas do processo
+# Alpha Vantage (plano gratuito): 5 requisições por minuto
+_LIMITADORES = {
+    "yfinance": _LimitadorTaxa(taxa=float(os.getenv("YFINANCE_REQ_POR_SEGUNDO", "2")), capacidade=5),
+    "alpha_vantage": _LimitadorTaxa(taxa=5 / 60, capacidade=5),
+}
+
+@lru_cache(maxsize=512)
+def _yf_ticker(ticker: str) -> yf.Ticker:
+    """Reutiliza o objeto yf.Ticker (e sua sessão HTTP) entre chamadas"""
+    return yf.Ticker(ticker)
+
+########## Funções de Extração de Dados ##########
+
+def _divide_intervalo(inicio: pd.Timestamp, fim: pd.Timestamp, dias_por_bloco: int) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+    """Divide [inicio, fim) em blocos consecutivos de até dias_por_bloco dias"""
+    blocos = []
+    while inicio < fim:
+        proximo = min(inicio + timedelta(days=dias_por_bloco), fim)
+        blocos.append((inicio, proximo))
+        inicio = proximo
+    return blocos
+
+def _junta_blocos(partes: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatena blocos baixados separadamente em um único histórico contínuo, sem barras duplicadas"""
+    partes = [parte for parte in partes if parte is not None and not parte.empty]
+    if not partes:
+        return pd.DataFrame()
+    eventos = [parte.attrs["ultimo_evento"] for parte in partes if "ultimo_evento" in parte.attrs]
+    hist = pd.concat(partes, ignore_index=True)
+    hist = hist.drop_duplicates(subset='Date', keep='last')
+    # Os blocos normalmente já chegam em ordem; ordena apenas se necessário
+    if not hist['Date'].is_monotonic_increasing:
+        hist = hist.sort_values('Date')
+    hist = hist.reset_index(drop=True)
+    if eventos:
+        hist.attrs["ultimo_evento"] = max(eventos)
+    return hist
+
+def _historico_yf(ticker: str, max_retries: int, retry_delay: int, **parametros) -> pd.DataFrame:
+    """
+    Chama yf.Ticker.history com novas tentativas em caso de rate limit.
     
     Returns:
-        DataFrame com dados históricos
+        DataFrame com a data como coluna 'Date' (vazio se não houver barras). Se o período tiver
+        desdobramentos ou dividendos, a data do último fica em attrs['ultimo_evento']
     """
     for tentativa in range(max_retries):
         try:
-            stock = yf.Ticker(ticker)
-            hist = stock.history(period=period)
-            
+            _LIMITADORES["yfinance"].adquire()
+            with avk_span("yfinance.history", tentativa=tentativa + 1):
+                hist = _yf_ticker(ticker).history(**parametros)
             if hist.empty:
-                raise ValueError(f"Nenhum dado encontrado para o ticker {ticker}")
+                return pd.DataFrame()
             
+            # Dados diários vêm com índice 'Date'; intradiários, com 'Datetime'
             hist.reset_index(inplace=True)
+            hist.rename(columns={hist.columns[0]: 'Date'}, inplace=True)
+            # Esquema compacto: descarta Dividends/Stock Splits e reduz os preços a float32
+            acoes = [coluna for coluna in ('Dividends', 'Stock Splits') if coluna in hist]
+            eventos = hist.loc[(hist[acoes] != 0).any(axis=1), 'Date'] if acoes else ()
+            hist = avk_compacta_ohlcv(hist)
+            if len(eventos):
+                hist.attrs["ultimo_evento"] = eventos.max()
             return hist
             
         except YFRateLimitError as e:
             if tentativa < max_retries - 1:
-                time.sleep(retry_delay * (tentativa + 1))
+                avk_incrementa("avk_retentativas_total", provedor="yfinance")
+                with avk_span("yfinance.espera"):
+                    time.sleep(retry_delay * (tentativa + 1))
                 continue
             else:
                 raise e
         except Exception as e:
             raise e
 
-def _extrai_dados_alpha_vantage(ticker: str, period: str = "6mo", api_key: Optional[str] = None) -> pd.DataFrame:
+def _extrai_dados_yfinance(ticker: str, period: str = "6mo", max_retries: int = 3, retry_delay: int = 5,
+                           start: Optional[datetime] = None, interval: str = "1d") -> pd.DataFrame:
+    """
+    Extrai dados usando Yahoo Finance (método original).
+    
+    Intervalos intradiários são baixados em blocos dentro do limite do Yahoo por requisição
+    (ex: 7 dias para 1m), em paralelo, e unidos em um único histórico.
+    
+    Args:
+        ticker: Símbolo da ação
+        period: Período dos dados
+        max_retries: Número máximo de tentativas
+        retry_delay: Tempo de espera entre tentativas
+        start: Se informado, busca apenas as barras a partir desta data (atualização incremental)
+        interval: Intervalo das barras ('1d', '60m', '15m', '5m', '1m', ...)
+    
+    Returns:
+        DataFrame com dados históricos (vazio se start for informado e não houver barras novas)
+    """
+    if interval in _LIMITES_INTRADAY_YF:
+        dias_por_bloco, dias_maximos = _LIMITES_INTRADAY_YF[interval]
+        agora = pd.Timestamp(datetime.now().date()) + timedelta(days=1)
+        inicio = _inicio_periodo(period) if start is None else pd.Timestamp(start.date())
+        # O Yahoo só fornece barras intradiárias dos últimos dias_maximos dias
+        inicio = max(inicio, agora - timedelta(days=dias_maximos))
+        
+        blocos = _divide_intervalo(inicio, agora, dias_por_bloco)
+        with ThreadPoolExecutor(max_workers=max(1, min(4, len(blocos)))) as executor:
+            partes = list(executor.map(
+                lambda bloco: _historico_yf(ticker, max_retries, retry_delay, interval=interval,
+                                            start=bloco[0].strftime('%Y-%m-%d'),
+                                            end=bloco[1].strftime('%Y-%m-%d')),
+                blocos
+            ))
+        hist = _junta_blocos(partes)
+    elif start is not None:
+        hist = _historico_yf(ticker, max_retries, retry_delay, start=start.strftime('%Y-%m-%d'), interval=interval)
+    else:
+        hist = _historico_yf(ticker, max_retries, retry_delay, period=period, interval=interval)
+    
+    if hist.empty:
+        if start is not None:
+            return pd.DataFrame()
+        raise TickerNaoEncontradoError(f"Nenhum dado encontrado para o ticker {ticker}")
+    
+    return hist
+
+def _verifica_erro_alpha_vantage(meta_data) -> None:
+    """Lança ValueError se os metadados da resposta do Alpha Vantage indicarem erro da API"""
+    if isinstance(meta_data, dict):
+        if 'Error Message' in meta_data:
+            error_msg = meta_data['Error Message']
+            if 'Invalid API call' in error_msg or 'API call frequency' in error_msg:
+                raise ValueError(f"Alpha Vantage API Error: {error_msg}")
+            if 'Thank you for using Alpha Vantage' in error_msg:
+                raise ValueError("Alpha Vantage: Limite de chamadas excedido ou chave API inválida")
+
+def _extrai_intraday_alpha_vantage(ts, ticker: str, interval_av: str, inicio: pd.Timestamp) -> Optional[pd.DataFrame]:
+    """
+    Baixa barras intradiárias do Alpha Vantage mês a mês (um mês por requisição), em paralelo.
+    
+    Returns:
+        DataFrame com índice de datas e colunas do Alpha Vantage, ou None se nenhum mês tiver dados
+    """
+    meses = pd.period_range(inicio, datetime.now(), freq='M')
+    
+    def extrai_mes(mes):
+        _LIMITADORES["alpha_vantage"].adquire()
+        data, meta_data = ts.get_intraday(symbol=ticker, interval=interval_av, outputsize='full',
+                                          month=mes.strftime('%Y-%m'))
+        _verifica_erro_alpha_vantage(meta_data)
+        return data
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(4, len(meses)))) as executor:
+        partes = [parte for parte in executor.map(extrai_mes, meses)
+                  if isinstance(parte, pd.DataFrame) and not parte.empty]
+    if not partes:
+        return None
+    data = pd.concat(partes)
+    return data[~data.index.duplicated(keep='last')]
+
+def _extrai_dados_alpha_vantage(ticker: str, period: str = "6mo", api_key: Optional[str] = None,
+                                start: Optional[datetime] = None, interval: str = "1d") -> pd.DataFrame:
     """
     Extrai dados usando Alpha Vantage API.
     
@@ -95,9 +348,12 @@ def _extrai_dados_alpha_vantage(ticker: str, period: str = "6mo", api_key: Optio
         ticker: Símbolo da ação
         period: Período dos dados (convertido para intervalo da API)
         api_key: Chave da API Alpha Vantage
+        start: Se informado, retorna apenas as barras a partir desta data (atualização incremental)
+        interval: Intervalo das barras ('1d', '60m', '30m', '15m', '5m' ou '1m')
     
     Returns:
         DataFrame com dados históricos no mesmo formato do yfinance
+        (vazio se start for informado e não houver barras novas)
     """
     if not ALPHA_VANTAGE_AVAILABLE:
         raise ImportError("Biblioteca alpha_vantage não está instalada. Instale com: pip install alpha-vantage")
@@ -107,38 +363,36 @@ def _extrai_dados_alpha_vantage(ticker: str, period: str = "6mo", api_key: Optio
         if not api_key:
             raise ValueError("Chave da API Alpha Vantage não fornecida. Configure ALPHA_VANTAGE_API_KEY")
     
-    ts = TimeSeries(key=api_key, output_format='pandas')
-    
-    # Mapeia period para intervalo da API
+    # Mapeia o intervalo para o formato da API
     # Alpha Vantage suporta: '1min', '5min', '15min', '30min', '60min', 'daily', 'weekly', 'monthly'
-    interval = 'daily'
+    if interval not in _INTERVALOS_ALPHA_VANTAGE:
+        raise ValueError(f"Intervalo {interval} não suportado pelo Alpha Vantage")
+    interval_av = _INTERVALOS_ALPHA_VANTAGE[interval]
+    
+    ts = TimeSeries(key=api_key, output_format='pandas')
     
     # Calcula a data de início baseado no período
-    period_days = {
-        '1d': 1, '5d': 5, '1mo': 30, '3mo': 90, 
-        '6mo': 180, '1y': 365, '2y': 730, '5y': 1825, '10y': 3650, 'ytd': 365, 'max': 3650
-    }
-    days = period_days.get(period, 180)
+    days = _PERIOD_DAYS.get(period, 180)
     
     try:
-        # Obtém dados diários usando endpoint gratuito (get_daily)
-        # get_daily_adjusted é premium, então usamos get_daily
-        # outputsize='full' também é premium, então usamos apenas 'compact' (gratuito)
-        # 'compact' retorna os últimos 100 pontos de dados, que é suficiente para análise de 6 meses
-        data, meta_data = ts.get_daily(symbol=ticker, outputsize='compact')
-        
-        # Verifica se a resposta contém erro da API
-        if isinstance(meta_data, dict):
-            if 'Error Message' in meta_data:
-                error_msg = meta_data['Error Message']
-                if 'Invalid API call' in error_msg or 'API call frequency' in error_msg:
-                    raise ValueError(f"Alpha Vantage API Error: {error_msg}")
-                if 'Thank you for using Alpha Vantage' in error_msg:
-                    raise ValueError("Alpha Vantage: Limite de chamadas excedido ou chave API inválida")
+        if interval_av == 'daily':
+            # Obtém dados diários usando endpoint gratuito (get_daily)
+            # get_daily_adjusted é premium, então usamos get_daily
+            # outputsize='full' também é premium, então usamos apenas 'compact' (gratuito)
+            # 'compact' retorna os últimos 100 pontos de dados, que é suficiente para análise de 6 meses
+            _LIMITADORES["alpha_vantage"].adquire()
+            data, meta_data = ts.get_daily(symbol=ticker, outputsize='compact')
+            
+            # Verifica se a resposta contém erro da API
+            _verifica_erro_alpha_vantage(meta_data)
+        else:
+            # Intradiário: um mês completo por requisição, do mês de início até o atual
+            inicio = pd.Timestamp(start).tz_localize(None) if start is not None else _inicio_periodo(period)
+            data = _extrai_intraday_alpha_vantage(ts, ticker, interval_av, inicio)
         
         # Verifica se data está vazio ou None
         if data is None or (isinstance(data, pd.DataFrame) and data.empty):
-            raise ValueError(f"Nenhum dado encontrado para o ticker {ticker} no Alpha Vantage")
+            raise TickerNaoEncontradoError(f"Nenhum dado encontrado para o ticker {ticker} no Alpha Vantage")
         
         # Verifica se data é um DataFrame válido
         if not isinstance(data, pd.DataFrame):
@@ -161,11 +415,17 @@ def _extrai_dados_alpha_vantage(ticker: str, period: str = "6mo", api_key: Optio
         # Converte Date para datetime
         data['Date'] = pd.to_datetime(data['Date'])
         
-        # Filtra pelos últimos N dias
-        cutoff_date = datetime.now() - timedelta(days=days)
-        data = data[data['Date'] >= cutoff_date].copy()
+        # Filtra pelos últimos N dias (ou a partir de start, na atualização incremental)
+        if start is not None:
+            cutoff_date = pd.Timestamp(start).normalize()
+        else:
+            cutoff_date = datetime.now() - timedelta(days=days)
+        # Sem .copy(): a seleção já cria um DataFrame novo, e a compactação no final faz a única conversão
+        data = data[data['Date'] >= cutoff_date]
         
         if data.empty:
+            if start is not None:
+                return pd.DataFrame()
             raise ValueError(f"Nenhum dado encontrado para o período solicitado ({period})")
         
         # Mapeia colunas do Alpha Vantage para o formato esperado
@@ -179,24 +439,20 @@ def _extrai_dados_alpha_vantage(ticker: str, period: str = "6mo", api_key: Optio
             '5. volume': 'Volume'
         }
         
-        # Renomeia colunas
-        for old_name, new_name in column_mapping.items():
-            if old_name in data.columns:
-                data.rename(columns={old_name: new_name}, inplace=True)
+        # Renomeia colunas (rename ignora as ausentes)
+        data = data.rename(columns=column_mapping)
         
-        # Seleciona apenas as colunas necessárias
+        # Verifica as colunas necessárias
         required_cols = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
         available_cols = [col for col in required_cols if col in data.columns]
         
         if len(available_cols) < 2:  # Precisa pelo menos Date e uma coluna de preço
             raise ValueError(f"Colunas insuficientes na resposta do Alpha Vantage. Colunas encontradas: {list(data.columns)}")
         
-        data = data[available_cols].copy()
-        
-        # Ordena por data (mais antiga primeiro)
-        data = data.sort_values('Date').reset_index(drop=True)
-        
-        return data
+        # Esquema compacto: seleciona as colunas e converte os tipos em uma única passagem
+        # (o Alpha Vantage envia da data mais recente para a mais antiga; a ordenação, a remoção de
+        # duplicatas e as demais correções ficam com a validação ao gravar o histórico)
+        return avk_compacta_ohlcv(data)
         
     except ValueError as e:
         # Re-lança ValueError sem modificar
@@ -214,73 +470,534 @@ def _extrai_dados_alpha_vantage(ticker: str, period: str = "6mo", api_key: Optio
             )
         raise Exception(f"Erro ao obter dados do Alpha Vantage: {error_msg}")
 
+def _inicio_periodo(period: str) -> pd.Timestamp:
+    """Calcula a data de início de um período (ex: '6mo' -> hoje menos 180 dias)"""
+    if period == 'ytd':
+        return pd.Timestamp(datetime.now().year, 1, 1)
+    return pd.Timestamp((datetime.now() - timedelta(days=_PERIOD_DAYS.get(period, 180))).date())
+
+def _alinha_tz(data: pd.Timestamp, datas: pd.Series) -> pd.Timestamp:
+    """Ajusta o fuso horário de uma data para comparação com a coluna Date (yfinance usa datas com fuso)"""
+    tz = getattr(datas.dt, 'tz', None)
+    if tz is not None and data.tzinfo is None:
+        return data.tz_localize(tz)
+    if tz is None and data.tzinfo is not None:
+        return data.tz_localize(None)
+    return data
+
+def _chave_store(provider: str, interval: str) -> str:
+    """Chave do armazenamento: o provedor, mais o intervalo quando não for diário"""
+    return provider if interval == "1d" else f"{provider}_{interval}"
+
+def _estado_store(ticker: str, provider: str, period: str) -> Tuple[Optional[pd.DataFrame], Optional[pd.Timestamp], bool]:
+    """
+    Consulta o armazenamento persistente de um ticker.
+    
+    Returns:
+        Tupla (histórico armazenado, início coberto, se o histórico já cobre o período pedido)
+    """
+    armazenado, inicio_armazenado = avk_store_carrega(ticker, provider)
+    cobre_periodo = (
+        armazenado is not None and inicio_armazenado is not None
+        and inicio_armazenado <= _inicio_periodo(period) + timedelta(days=_FOLGA_INICIO_DIAS)
+    )
+    return armazenado, inicio_armazenado, cobre_periodo
+
+def _reajustado(armazenado: pd.DataFrame, novos: Optional[pd.DataFrame]) -> bool:
+    """
+    Se o provedor reajustou as barras anteriores às novas (desdobramento ou dividendo desde a última
+    barra armazenada), caso em que acrescentar as barras novas deixaria um salto no histórico.
+    
+    Compara a abertura das barras baixadas novamente (a partir da última data armazenada) com a
+    armazenada, e considera os eventos informados pelo provedor (attrs['ultimo_evento']).
+    """
+    if novos is None or novos.empty:
+        return False
+    ultima = armazenado['Date'].iloc[-1]
+    evento = novos.attrs.get("ultimo_evento")
+    if evento is not None and _alinha_tz(pd.Timestamp(evento), armazenado['Date']) > ultima:
+        return True
+    if 'Open' not in novos or 'Open' not in armazenado:
+        return False
+    sobrepostas = novos[['Date', 'Open']].merge(armazenado[['Date', 'Open']], on='Date', suffixes=('', '_armazenado'))
+    if sobrepostas.empty:
+        return False
+    diferenca = (sobrepostas['Open'].astype(float) / sobrepostas['Open_armazenado'].astype(float) - 1).abs()
+    return bool((diferenca > TOLERANCIA_REAJUSTE).any())
+
+# Resumo de qualidade da última extração de cada ticker e intervalo, neste processo
+_QUALIDADE: Dict[Tuple[str, str], dict] = {}
+
+def avk_qualidade_dados(ticker: str, interval: str = "1d") -> Optional[dict]:
+    """
+    Resumo de qualidade (ver avk_valida_ohlcv) da última extração de um ticker feita neste processo.
+    
+    Returns:
+        Dicionário com os contadores da validação, ou None se o ticker ainda não foi extraído aqui
+        (ex: dados servidos pelo cache do Streamlit ou pelo cache compartilhado de outro worker)
+    """
+    return _QUALIDADE.get((ticker, interval))
+
+# Chaves do armazenamento com preços não ajustados por desdobramentos, os únicos em que a validação
+# procura desdobramentos. O Yahoo Finance (auto_adjust=True) ajusta cada download, mas um evento após a
+# última barra gravada deixa o histórico armazenado desatualizado: _reajustado detecta isso na junção
+# (evento informado ou barra sobreposta diferente) e o histórico é baixado de novo inteiro, ajustado
+_CHAVES_NAO_AJUSTADAS = frozenset({"alpha_vantage"})  # get_daily (o endpoint ajustado é premium)
+
+def _valida_historico(ticker: str, interval: str, dados: Optional[pd.DataFrame],
+                      ajusta_desdobramentos: bool = False) -> Tuple[Optional[pd.DataFrame], dict]:
+    """Valida o histórico mesclado, registra o resumo de qualidade e conta as correções na telemetria"""
+    with avk_span("validacao"):
+        dados, qualidade = avk_valida_ohlcv(dados, interval, avk_calendario_ticker(ticker), ajusta_desdobramentos)
+        avk_anota(barras=qualidade["barras"], tempo_ms=qualidade.get("tempo_ms", 0))
+    _QUALIDADE[(ticker, interval)] = qualidade
+    for tipo in ("invalidas", "duplicadas", "maxima_minima", "outliers", "lacunas"):
+        if qualidade[tipo]:
+            avk_incrementa("avk_correcoes_dados_total", qualidade[tipo], tipo=tipo)
+    if qualidade["desdobramentos"]:
+        avk_incrementa("avk_correcoes_dados_total", len(qualidade["desdobramentos"]), tipo="desdobramentos")
+    return dados, qualidade
+
+def _grava_store(ticker: str, provider: str, period: str, armazenado: Optional[pd.DataFrame],
+                 inicio_armazenado: Optional[pd.Timestamp], cobre_periodo: bool,
+                 novos: Optional[pd.DataFrame], interval: str = "1d") -> pd.DataFrame:
+    """
+    Mescla as barras obtidas com o histórico armazenado, valida, persiste e recorta o período pedido.
+    
+    A validação (avk_valida_ohlcv) roda sobre o histórico mesclado, para que desdobramentos entre as
+    barras armazenadas e as novas ajustem também o histórico gravado (apenas nas fontes sem ajuste,
+    ver _CHAVES_NAO_AJUSTADAS; nas ajustadas, um evento novo leva a um download completo). Ela é idempotente: barras já validadas passam sem alterações.
+    
+    Args:
+        novos: Barras obtidas (incrementais se cobre_periodo, completas caso contrário; None se a atualização falhou)
+        interval: Intervalo das barras (define o preenchimento de lacunas)
+    
+    Returns:
+        DataFrame com os dados do período pedido
+    """
+    inicio = _inicio_periodo(period)
+    dados, qualidade = _valida_historico(ticker, interval, avk_store_mescla(armazenado, novos, deduplica=False),
+                                         provider in _CHAVES_NAO_AJUSTADAS)
+    
+    if cobre_periodo:
+        # Grava se houver barras novas ou se a validação corrigiu o histórico armazenado
+        if (novos is not None and not novos.empty) or avk_houve_correcoes(qualidade):
+            avk_store_salva(ticker, provider, dados, inicio_armazenado)
+    else:
+        # Download completo: o período coberto passa a incluir o início pedido
+        inicio_coberto = min(inicio, inicio_armazenado) if inicio_armazenado is not None else inicio
+        avk_store_salva(ticker, provider, dados, inicio_coberto)
+    
+    # Retorna apenas o período pedido
+    dados = dados[dados['Date'] >= _alinha_tz(inicio, dados['Date'])]
+    return dados.reset_index(drop=True)
+
+def _extrai_com_store(provider: str, extrator: Callable[[Optional[datetime]], pd.DataFrame],
+                      ticker: str, period: str, interval: str = "1d") -> pd.DataFrame:
+    """
+    Extrai dados usando o armazenamento persistente com atualização incremental.
+    
+    Se o histórico armazenado já cobre o período pedido, busca apenas as barras a partir
+    da última data armazenada e as acrescenta. Caso contrário, ou se o provedor reajustou as
+    barras já armazenadas (ver _reajustado), faz o download completo.
+    
+    Args:
+        provider: Nome do provedor (chave do armazenamento)
+        extrator: Função que recebe start (None para download completo) e retorna o DataFrame
+        ticker: Símbolo da ação
+        period: Período dos dados
+        interval: Intervalo das barras
+    
+    Returns:
+        DataFrame com os dados do período pedido
+    """
+    armazenado, inicio_armazenado, cobre_periodo = _estado_store(ticker, provider, period)
+    avk_registra_cache("store", acerto=cobre_periodo)
+    
+    if cobre_periodo:
+        # Atualização incremental: a última barra é buscada novamente, pois pode ter mudado
+        try:
+            novos = extrator(armazenado['Date'].iloc[-1])
+        except YFRateLimitError:
+            # Com rate limit, o histórico armazenado ainda é melhor do que nenhum dado
+            _avisa("ℹ️ Limite de requisições atingido. Exibindo os últimos dados armazenados.")
+            novos = None
+        if _reajustado(armazenado, novos):
+            # O histórico armazenado não foi ajustado pelo evento: é substituído pelo download completo
+            avk_incrementa("avk_reajustes_total", provedor=provider)
+            armazenado, inicio_armazenado, cobre_periodo = None, None, False
+            novos = extrator(None)
+    else:
+        novos = extrator(None)
+    
+    return _grava_store(ticker, provider, period, armazenado, inicio_armazenado, cobre_periodo, novos, interval)
+
+def avk_snapshot_local(ticker: str, interval: str = "1d", provider: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """
+    Retorna o histórico já armazenado em disco, sem acessar a rede.
+    
+    Útil para identificar a versão dos dados disponível antes de a extração terminar.
+    
+    Args:
+        ticker: Símbolo da ação
+        interval: Intervalo das barras (padrão: '1d')
+        provider: Provedor dos dados. Se None, usa DATA_PROVIDER
+    
+    Returns:
+        DataFrame armazenado, ou None se não houver
+    """
+    if provider is None:
+        provider = _get_config("DATA_PROVIDER", DATA_PROVIDER)
+    armazenado, _ = avk_store_carrega(ticker.upper(), _chave_store(provider, interval))
+    return armazenado
+
+########## Registro de Provedores ##########
+
+class ProvedorYFinance(ProvedorDados):
+    """Provedor Yahoo Finance (padrão, não exige chave)"""
+    
+    nome = "yfinance"
+    descricao = "Yahoo Finance"
+    
+    def extrai(self, ticker: str, period: str, start: Optional[datetime] = None, max_retries: int = 3,
+               retry_delay: int = 5, api_key: Optional[str] = None, interval: str = "1d") -> pd.DataFrame:
+        return _extrai_dados_yfinance(ticker, period, max_retries, retry_delay, start, interval)
+
+class ProvedorAlphaVantage(ProvedorDados):
+    """Provedor Alpha Vantage (exige a biblioteca alpha_vantage e uma chave de API)"""
+    
+    nome = "alpha_vantage"
+    descricao = "Alpha Vantage"
+    
+    def disponivel(self, api_key: Optional[str] = None) -> bool:
+        return ALPHA_VANTAGE_AVAILABLE and bool(api_key and api_key.strip())
+    
+    def extrai(self, ticker: str, period: str, start: Optional[datetime] = None, max_retries: int = 3,
+               retry_delay: int = 5, api_key: Optional[str] = None, interval: str = "1d") -> pd.DataFrame:
+        return _extrai_dados_alpha_vantage(ticker, period, api_key, start, interval)
+
+# Registro compartilhado pelo processo: a saúde de cada provedor vale para todas as sessões
+# Novos provedores podem ser adicionados com avk_registro_provedores.registra(...)
+avk_registro_provedores = RegistroProvedores()
+avk_registro_provedores.registra(ProvedorYFinance())
+avk_registro_provedores.registra(ProvedorAlphaVantage())
+
 def _avk_extrai_dados_impl(ticker: str, period: str = "6mo", max_retries: int = 3, retry_delay: int = 5, 
-                           provider: Optional[str] = None, api_key: Optional[str] = None) -> pd.DataFrame:
+                           provider: Optional[str] = None, api_key: Optional[str] = None,
+                           interval: str = "1d") -> pd.DataFrame:
     """
-    Extrai dados históricos de uma ação usando o provedor configurado.
+    Extrai dados históricos de uma ação usando o provedor mais saudável.
+    
+    Os provedores são tentados na ordem do registro (saúde recente, com o provedor configurado
+    como desempate). Provedores com circuito aberto são ignorados até o fim do tempo de espera,
+    evitando pagar uma chamada com falha a cada requisição.
     
     Args:
         ticker: Símbolo da ação
         period: Período dos dados (padrão: 6 meses)
         max_retries: Número máximo de tentativas (apenas para yfinance)
         retry_delay: Tempo de espera entre tentativas (apenas para yfinance)
-        provider: Provedor a usar ('yfinance' ou 'alpha_vantage'). Se None, usa DATA_PROVIDER
+        provider: Provedor preferido ('yfinance' ou 'alpha_vantage'). Se None, usa DATA_PROVIDER
         api_key: Chave da API (necessária para Alpha Vantage)
+        interval: Intervalo das barras (padrão: '1d'; intradiários: '60m', '30m', '15m', '5m', '1m')
     
     Returns:
         DataFrame com dados históricos no formato padrão (Date, Open, High, Low, Close, Volume)
     
     Raises:
-        Exception: Se não conseguir obter os dados
+        Exception: Se nenhum provedor conseguir obter os dados (o erro do primeiro provedor tentado)
     """
     if provider is None:
         # Tenta obter do config (pode usar st.secrets se disponível)
         provider = _get_config("DATA_PROVIDER", DATA_PROVIDER)
     
-    if api_key is None and provider == "alpha_vantage":
+    if api_key is None:
         # Tenta obter do config (pode usar st.secrets se disponível)
         api_key = _get_config("ALPHA_VANTAGE_API_KEY", ALPHA_VANTAGE_API_KEY)
     
-    # Tenta usar o provedor especificado, com fallback para yfinance
-    if provider == "alpha_vantage":
-        # Verifica se a chave API está configurada
-        if not api_key or api_key.strip() == "":
-            # Se não tem chave, usa yfinance diretamente sem tentar Alpha Vantage
-            if STREAMLIT_AVAILABLE:
-                st.info("ℹ️ Alpha Vantage não configurado. Usando Yahoo Finance.")
-            return _extrai_dados_yfinance(ticker, period, max_retries, retry_delay)
-        
+    preferido = avk_registro_provedores.obtem(provider)
+    if preferido is not None and not preferido.disponivel(api_key):
+        _avisa(f"ℹ️ {preferido.descricao} não configurado. Usando Yahoo Finance.")
+    
+    candidatos = avk_registro_provedores.candidatos(provider, api_key)
+    if not candidatos:
+        raise Exception("Nenhum provedor de dados disponível")
+    
+    primeiro_erro = None
+    for posicao, provedor in enumerate(candidatos):
+        # No semiaberto, outra requisição pode ter reservado a única chamada de teste
+        if not provedor.circuito.reserva():
+            continue
+        inicio = time.monotonic()
         try:
-            return _extrai_dados_alpha_vantage(ticker, period, api_key)
-        except (ValueError, ImportError) as e:
-            # Para erros conhecidos (chave inválida, limite excedido, etc), usa fallback silenciosamente
-            if STREAMLIT_AVAILABLE:
-                # Só mostra warning se for um erro inesperado
-                if "chave API inválida" in str(e).lower() or "limite excedido" in str(e).lower():
-                    st.info(f"ℹ️ Alpha Vantage indisponível. Usando Yahoo Finance como alternativa.")
-                else:
-                    st.warning(f"⚠️ Alpha Vantage: {str(e)}. Usando Yahoo Finance como alternativa.")
-            return _extrai_dados_yfinance(ticker, period, max_retries, retry_delay)
+            with avk_span(f"provedor.{provedor.nome}"):
+                dados = _extrai_com_store(
+                    _chave_store(provedor.nome, interval),
+                    lambda start: provedor.extrai(ticker, period, start, max_retries, retry_delay, api_key, interval),
+                    ticker, period, interval
+                )
         except Exception as e:
-            # Para outros erros, tenta fallback
-            if STREAMLIT_AVAILABLE:
-                st.warning(f"⚠️ Erro com Alpha Vantage. Usando Yahoo Finance como alternativa.")
-            return _extrai_dados_yfinance(ticker, period, max_retries, retry_delay)
+            avk_incrementa("avk_provedor_falhas_total", provedor=provedor.nome)
+            if isinstance(e, TickerNaoEncontradoError):
+                # O provedor respondeu normalmente; o problema é o ticker
+                provedor.registra_sucesso(time.monotonic() - inicio)
+            else:
+                provedor.registra_falha(time.monotonic() - inicio)
+            if primeiro_erro is None:
+                primeiro_erro = e
+            
+            if posicao + 1 < len(candidatos):
+                avk_incrementa("avk_fallback_total", de=provedor.nome, para=candidatos[posicao + 1].nome)
+                _avisa(f"ℹ️ {provedor.descricao} indisponível. Usando {candidatos[posicao + 1].descricao} como alternativa.")
+            continue
+        
+        provedor.registra_sucesso(time.monotonic() - inicio)
+        avk_anota(provedor=provedor.nome, barras=len(dados))
+        return dados
+    
+    if primeiro_erro is None:
+        raise Exception("Nenhum provedor de dados disponível")
+    raise primeiro_erro
+
+########## Extração em Lote ##########
+
+# Máximo de tickers por chamada de yf.download
+_TAMANHO_LOTE_YF = 100
+
+def _separa_download_yf(dados: Optional[pd.DataFrame], tickers: List[str]) -> Dict[str, pd.DataFrame]:
+    """Separa o resultado de yf.download (colunas ticker/campo) em um DataFrame por ticker"""
+    resultado = {}
+    if dados is None or dados.empty:
+        return resultado
+    
+    disponiveis = set(dados.columns.get_level_values(0))
+    for ticker in tickers:
+        if ticker not in disponiveis:
+            continue
+        # Tickers que falharam vêm com todas as linhas vazias
+        hist = dados[ticker].dropna(how='all')
+        if hist.empty:
+            continue
+        hist = hist.reset_index()
+        hist.rename(columns={hist.columns[0]: 'Date'}, inplace=True)
+        hist.columns.name = None
+        resultado[ticker] = avk_compacta_ohlcv(hist)
+    return resultado
+
+def _download_yf_lote(tickers: List[str], period: Optional[str] = None,
+                      start: Optional[datetime] = None, interval: str = "1d") -> Dict[str, pd.DataFrame]:
+    """Baixa vários tickers com yf.download, em lotes de até _TAMANHO_LOTE_YF símbolos"""
+    if start is not None:
+        intervalo = {"start": start.strftime('%Y-%m-%d')}
     else:
-        # Usa yfinance por padrão
-        return _extrai_dados_yfinance(ticker, period, max_retries, retry_delay)
+        intervalo = {"period": period}
+    
+    resultado = {}
+    for i in range(0, len(tickers), _TAMANHO_LOTE_YF):
+        lote = tickers[i:i + _TAMANHO_LOTE_YF]
+        _LIMITADORES["yfinance"].adquire()
+        dados = yf.download(lote, group_by='ticker', auto_adjust=True, ignore_tz=False, interval=interval,
+                            threads=True, progress=False, **intervalo)
+        resultado.update(_separa_download_yf(dados, lote))
+    return resultado
+
+def _extrai_lote_yfinance(tickers: List[str], period: str, interval: str = "1d") -> Dict[str, pd.DataFrame]:
+    """
+    Extrai vários tickers do Yahoo Finance com downloads em lote, usando o armazenamento persistente.
+    
+    Tickers sem histórico armazenado são baixados juntos com o período completo; os demais
+    são agrupados pela última data armazenada e recebem apenas as barras novas.
+    
+    Returns:
+        Dicionário ticker -> DataFrame, apenas com os tickers obtidos com sucesso
+    """
+    chave = _chave_store("yfinance", interval)
+    estados = {ticker: _estado_store(ticker, chave, period) for ticker in tickers}
+    resultado = {}
+    
+    # Download completo
+    completos = [ticker for ticker in tickers if not estados[ticker][2]]
+    if completos:
+        baixados = _download_yf_lote(completos, period=period, interval=interval)
+        for ticker, novos in baixados.items():
+            armazenado, inicio_armazenado, _ = estados[ticker]
+            resultado[ticker] = _grava_store(ticker, chave, period, armazenado, inicio_armazenado, False,
+                                             novos, interval)
+    
+    # Atualização incremental, um download por data de início
+    por_inicio = {}
+    for ticker in tickers:
+        if estados[ticker][2]:
+            ultima_data = estados[ticker][0]['Date'].iloc[-1]
+            por_inicio.setdefault(ultima_data.strftime('%Y-%m-%d'), []).append(ticker)
+    
+    reajustados = []
+    for inicio, grupo in por_inicio.items():
+        baixados = _download_yf_lote(grupo, start=pd.Timestamp(inicio), interval=interval)
+        for ticker in grupo:
+            armazenado, inicio_armazenado, _ = estados[ticker]
+            # Ticker ausente no download significa que não há barras novas (ex: fim de semana)
+            novos = baixados.get(ticker)
+            if novos is not None:
+                novos = novos[novos['Date'] >= armazenado['Date'].iloc[-1]]
+            if _reajustado(armazenado, novos):
+                reajustados.append(ticker)
+                continue
+            resultado[ticker] = _grava_store(ticker, chave, period, armazenado, inicio_armazenado, True,
+                                             novos, interval)
+    
+    # Históricos reajustados pelo provedor (desdobramento ou dividendo): download completo, sem as barras armazenadas
+    if reajustados:
+        avk_incrementa("avk_reajustes_total", len(reajustados), provedor=chave)
+        baixados = _download_yf_lote(reajustados, period=period, interval=interval)
+        for ticker, novos in baixados.items():
+            resultado[ticker] = _grava_store(ticker, chave, period, None, None, False, novos, interval)
+    
+    return resultado
 
-# Função pública com cache do Streamlit
+def _avk_extrai_dados_batch_impl(tickers: List[str], period: str = "6mo", provider: Optional[str] = None,
+                                 api_key: Optional[str] = None, max_workers: int = 8,
+                                 interval: str = "1d") -> Tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+    """
+    Extrai dados históricos de vários tickers.
+    
+    Se o Yahoo Finance é o provedor mais saudável, usa o download em lote (vários símbolos por
+    requisição). Tickers que o lote não conseguiu obter, ou todos os tickers quando outro provedor
+    está à frente, são extraídos individualmente
+    em um pool de threads limitado, respeitando o limitador de taxa de cada provedor.
+    A falha de um ticker não interrompe os demais.
+    
+    Args:
+        tickers: Lista de símbolos
+        period: Período dos dados (padrão: 6 meses)
+        provider: Provedor preferido ('yfinance' ou 'alpha_vantage'). Se None, usa DATA_PROVIDER
+        api_key: Chave da API (necessária para Alpha Vantage)
+        max_workers: Número máximo de threads no caminho individual
+        interval: Intervalo das barras (intradiários usam sempre o caminho individual, que baixa em blocos)
+    
+    Returns:
+        Tupla (dicionário ticker -> DataFrame no formato padrão, dicionário ticker -> mensagem de erro)
+    """
+    # Normaliza e remove duplicatas, preservando a ordem
+    tickers = list(dict.fromkeys(ticker.strip().upper() for ticker in tickers if ticker and ticker.strip()))
+    
+    if provider is None:
+        provider = _get_config("DATA_PROVIDER", DATA_PROVIDER)
+    if api_key is None:
+        api_key = _get_config("ALPHA_VANTAGE_API_KEY", ALPHA_VANTAGE_API_KEY)
+    
+    dados, erros = {}, {}
+    pendentes = tickers
+    
+    # Download em lote apenas quando o Yahoo Finance é o provedor mais saudável
+    # (intervalos intradiários excedem o limite por requisição e seguem o caminho individual)
+    candidatos = avk_registro_provedores.candidatos(provider, api_key)
+    if (tickers and candidatos and candidatos[0].nome == "yfinance" and interval not in _LIMITES_INTRADAY_YF
+            and candidatos[0].circuito.reserva()):
+        provedor = candidatos[0]
+        inicio = time.monotonic()
+        try:
+            with avk_span("yfinance.lote", tickers=len(tickers)):
+                dados = _extrai_lote_yfinance(tickers, period, interval)
+            provedor.registra_sucesso(time.monotonic() - inicio)
+        except Exception:
+            # Falha do download em lote (ex: rate limit): todos seguem para o caminho individual
+            provedor.registra_falha(time.monotonic() - inicio)
+            dados = {}
+        pendentes = [ticker for ticker in tickers if ticker not in dados]
+    
+    if pendentes:
+        # Os avisos de cada thread são repassados aqui, na thread de quem chamou
+        avisos = []
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pendentes)))) as executor:
+            futuros = {
+                ticker: executor.submit(_extrai_coletando, ticker, period, provider=provider, api_key=api_key,
+                                        interval=interval)
+                for ticker in pendentes
+            }
+            for ticker, futuro in futuros.items():
+                try:
+                    dados[ticker], avisos_ticker = futuro.result()
+                    avisos.extend(avisos_ticker)
+                except Exception as e:
+                    erros[ticker] = str(e)
+        avk_exibe_avisos(avisos)
+    
+    return {ticker: dados[ticker] for ticker in tickers if ticker in dados}, erros
+
+def _extrai_no_loop(ticker: str, period: str, max_retries: int, retry_delay: int, provider: Optional[str],
+                    api_key: Optional[str], interval: str) -> pd.DataFrame:
+    """
+    _avk_extrai_dados_impl pelo event loop compartilhado do processo (avk_data_provider_async).
+    
+    Pedidos iguais de sessões diferentes compartilham uma requisição, e as novas tentativas após
+    um rate limit esperam com asyncio.sleep em vez de time.sleep na thread do script.
+    """
+    # Importado aqui: avk_data_provider_async importa este módulo
+    from avk_data_provider_async import avk_extrai_dados_no_loop
+    return avk_extrai_dados_no_loop(ticker, period, max_retries, retry_delay, provider, api_key, interval)
+
+# Funções públicas com cache do Streamlit
 if STREAMLIT_AVAILABLE:
     @st.cache_data(ttl=300, show_spinner=False)
-    def avk_extrai_dados(ticker: str, period: str = "6mo", max_retries: int = 3, retry_delay: int = 5, 
-                         provider: Optional[str] = None, api_key: Optional[str] = None) -> pd.DataFrame:
+    def _avk_extrai_dados_cache(ticker: str, period: str = "6mo", max_retries: int = 3, retry_delay: int = 5, 
+                                provider: Optional[str] = None, api_key: Optional[str] = None,
+                                interval: str = "1d") -> pd.DataFrame:
         """Wrapper com cache para uso no Streamlit"""
-        return _avk_extrai_dados_impl(ticker, period, max_retries, retry_delay, provider, api_key)
+        return _extrai_no_loop(ticker, period, max_retries, retry_delay, provider, api_key, interval)
 else:
     # Sem cache se não estiver no Streamlit
-    def avk_extrai_dados(ticker: str, period: str = "6mo", max_retries: int = 3, retry_delay: int = 5, 
-                         provider: Optional[str] = None, api_key: Optional[str] = None) -> pd.DataFrame:
+    def _avk_extrai_dados_cache(ticker: str, period: str = "6mo", max_retries: int = 3, retry_delay: int = 5, 
+                                provider: Optional[str] = None, api_key: Optional[str] = None,
+                                interval: str = "1d") -> pd.DataFrame:
         """Wrapper sem cache para uso fora do Streamlit"""
-        return _avk_extrai_dados_impl(ticker, period, max_retries, retry_delay, provider, api_key)
+        return _extrai_no_loop(ticker, period, max_retries, retry_delay, provider, api_key, interval)
 
+def _avk_extrai_dados_compartilhado(ticker: str, period: str = "6mo", max_retries: int = 3, retry_delay: int = 5, 
+                                    provider: Optional[str] = None, api_key: Optional[str] = None,
+                                    interval: str = "1d") -> pd.DataFrame:
+    """
+    Extração pelo cache compartilhado entre workers (AVK_CACHE_COMPARTILHADO).
+    
+    Cada entrada é guardada uma única vez para todos os processos e, quando expira, apenas um
+    worker consulta o provedor; os demais aguardam a trava e leem o resultado dele.
+    """
+    if provider is None:
+        provider = _get_config("DATA_PROVIDER", DATA_PROVIDER)
+    chave = f"dados|{ticker.upper()}|{period}|{interval}|{provider}"
+    return avk_obtem_ou_preenche_tabela(
+        chave, lambda: _extrai_no_loop(ticker, period, max_retries, retry_delay, provider, api_key, interval),
+        backend=avk_cache_compartilhado
+    )
+
+def avk_extrai_dados(ticker: str, period: str = "6mo", max_retries: int = 3, retry_delay: int = 5, 
+                     provider: Optional[str] = None, api_key: Optional[str] = None,
+                     interval: str = "1d") -> pd.DataFrame:
+    """
+    Extrai dados históricos (com cache) dentro de um span de telemetria.
+    
+    Com o cache compartilhado configurado, ele substitui o st.cache_data: os dados ficam guardados
+    uma vez para todos os workers, em vez de uma cópia por processo. Em ambos, a extração roda no
+    event loop compartilhado do processo (_extrai_no_loop).
+    Acerto de cache quando a implementação não rodou, isto é, nenhum provedor anotou o span.
+    Os argumentos são os de _avk_extrai_dados_impl.
+    """
+    extrai = _avk_extrai_dados_compartilhado if avk_cache_compartilhado is not None else _avk_extrai_dados_cache
+    with avk_span("extracao", ticker=ticker, interval=interval) as span:
+        dados = extrai(ticker, period, max_retries, retry_delay, provider, api_key, interval)
+    avk_registra_cache("dados", acerto="provedor" not in span.atributos)
+    return dados
+
+if STREAMLIT_AVAILABLE:
+    @st.cache_data(ttl=300, show_spinner=False)
+    def avk_extrai_dados_batch(tickers: List[str], period: str = "6mo", provider: Optional[str] = None,
+                               api_key: Optional[str] = None, max_workers: int = 8,
+                               interval: str = "1d") -> Tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+        """Wrapper com cache para uso no Streamlit"""
+        return _avk_extrai_dados_batch_impl(tickers, period, provider, api_key, max_workers, interval)
+else:
+    def avk_extrai_dados_batch(tickers: List[str], period: str = "6mo", provider: Optional[str] = None,
+                               api_key: Optional[str] = None, max_workers: int = 8,
+                               interval: str = "1d") -> Tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+        """Wrapper sem cache para uso fora do Streamlit"""
+        return _avk_extrai_dados_batch_impl(tickers, period, provider, api_key, max_workers, interval)
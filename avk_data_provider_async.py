@@ -0,0 +1,164 @@
+# Módulo de Provedores de Dados Assíncrono
+# Interface asyncio sobre avk_data_provider, com coalescência de requisições e backoff não bloqueante
+
+# Imports
+import asyncio
+import random
+import contextvars
+import threading
+import weakref
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+from yfinance.exceptions import YFRateLimitError
+from avk_data_provider import _extrai_coletando, _get_config, avk_exibe_avisos, DATA_PROVIDER
+
+########## Coalescência de Requisições ##########
+
+# Requisições em andamento, por event loop: (ticker, period, provider, interval) -> Task
+# Tasks pertencem a um loop, então cada loop tem o seu próprio dicionário
+_EM_ANDAMENTO: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str, str, str], asyncio.Task]]" = \
+    weakref.WeakKeyDictionary()
+
+async def _extrai_com_backoff(ticker: str, period: str, max_retries: int, retry_delay: int,
+                              provider: str, api_key: Optional[str], interval: str) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Executa a extração síncrona em uma thread, com novas tentativas assíncronas em caso de rate limit.
+
+    A espera entre tentativas usa asyncio.sleep com jitter aleatório, para não bloquear
+    o event loop e para que requisições concorrentes não tentem novamente ao mesmo tempo.
+
+    Returns:
+        Tupla (DataFrame, avisos da extração), pois a thread não exibe nada no Streamlit
+    """
+    for tentativa in range(max_retries):
+        try:
+            # max_retries=1: as novas tentativas são feitas aqui, sem time.sleep na thread
+            return await asyncio.to_thread(
+                _extrai_coletando, ticker, period, 1, 0, provider, api_key, interval
+            )
+        except YFRateLimitError:
+            if tentativa < max_retries - 1:
+                await asyncio.sleep(retry_delay * (tentativa + 1) * random.uniform(0.5, 1.5))
+                continue
+            raise
+
+async def _extrai_coalescido(ticker: str, period: str, max_retries: int, retry_delay: int,
+                             provider: Optional[str], api_key: Optional[str], interval: str,
+                             contexto: Optional[contextvars.Context] = None) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Extração compartilhada entre as chamadas concorrentes iguais; retorna a cópia do chamador e os avisos.
+
+    A extração roda no contexto (contextvars) de quem a iniciou: spans de telemetria abertos pelo
+    chamador recebem os da extração. Sem contexto, usa o da tarefa atual.
+    """
+    if provider is None:
+        provider = _get_config("DATA_PROVIDER", DATA_PROVIDER)
+
+    chave = (ticker.upper(), period, provider, interval)
+    em_andamento = _EM_ANDAMENTO.setdefault(asyncio.get_running_loop(), {})
+
+    tarefa = em_andamento.get(chave)
+    if tarefa is None:
+        tarefa = asyncio.get_running_loop().create_task(
+            _extrai_com_backoff(ticker.upper(), period, max_retries, retry_delay, provider, api_key, interval),
+            context=contexto
+        )
+        em_andamento[chave] = tarefa
+        tarefa.add_done_callback(lambda _: em_andamento.pop(chave, None))
+
+    # shield: o cancelamento de um chamador não cancela a extração dos demais
+    resultado, avisos = await asyncio.shield(tarefa)
+    # Cada chamador recebe sua própria cópia, pois o DataFrame é compartilhado
+    return resultado.copy(), avisos
+
+async def avk_extrai_dados_async(ticker: str, period: str = "6mo", max_retries: int = 3, retry_delay: int = 5,
+                                 provider: Optional[str] = None, api_key: Optional[str] = None,
+                                 interval: str = "1d") -> pd.DataFrame:
+    """
+    Versão assíncrona de avk_extrai_dados.
+
+    Chamadas concorrentes com o mesmo (ticker, period, provider, interval) no mesmo event loop
+    compartilham uma única extração em andamento.
+
+    Args:
+        ticker: Símbolo da ação
+        period: Período dos dados (padrão: 6 meses)
+        max_retries: Número máximo de tentativas em caso de rate limit
+        retry_delay: Tempo base de espera entre tentativas (com jitter)
+        provider: Provedor a usar ('yfinance' ou 'alpha_vantage'). Se None, usa DATA_PROVIDER
+        api_key: Chave da API (necessária para Alpha Vantage)
+        interval: Intervalo das barras (padrão: '1d')
+
+    Returns:
+        DataFrame com dados históricos no formato padrão (Date, Open, High, Low, Close, Volume)
+    """
+    resultado, avisos = await _extrai_coalescido(ticker, period, max_retries, retry_delay, provider, api_key, interval)
+    # Os avisos da thread são exibidos (ou coletados) no contexto de quem aguarda
+    avk_exibe_avisos(avisos)
+    return resultado
+
+async def avk_extrai_dados_batch_async(tickers: List[str], period: str = "6mo",
+                                       provider: Optional[str] = None, api_key: Optional[str] = None,
+                                       interval: str = "1d") -> Tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+    """
+    Extrai vários tickers concorrentemente.
+
+    Returns:
+        Tupla (dicionário ticker -> DataFrame, dicionário ticker -> mensagem de erro)
+    """
+    tickers = list(dict.fromkeys(ticker.strip().upper() for ticker in tickers if ticker and ticker.strip()))
+    resultados = await asyncio.gather(
+        *(avk_extrai_dados_async(ticker, period, provider=provider, api_key=api_key, interval=interval)
+          for ticker in tickers),
+        return_exceptions=True
+    )
+
+    dados, erros = {}, {}
+    for ticker, resultado in zip(tickers, resultados):
+        if isinstance(resultado, BaseException):
+            erros[ticker] = str(resultado)
+        else:
+            dados[ticker] = resultado
+    return dados, erros
+
+########## Loop Compartilhado do Processo ##########
+
+# Event loop em thread de fundo, compartilhado por todas as sessões do Streamlit no processo
+_loop_compartilhado: Optional[asyncio.AbstractEventLoop] = None
+_lock_loop = threading.Lock()
+
+def _obtem_loop_compartilhado() -> asyncio.AbstractEventLoop:
+    """Cria (na primeira chamada) e retorna o event loop compartilhado"""
+    global _loop_compartilhado
+    with _lock_loop:
+        if _loop_compartilhado is None:
+            _loop_compartilhado = asyncio.new_event_loop()
+            threading.Thread(target=_loop_compartilhado.run_forever,
+                             name="avk-data-provider-loop", daemon=True).start()
+        return _loop_compartilhado
+
+def avk_extrai_dados_no_loop(ticker: str, period: str = "6mo", max_retries: int = 3, retry_delay: int = 5,
+                             provider: Optional[str] = None, api_key: Optional[str] = None,
+                             interval: str = "1d", timeout: Optional[float] = None) -> pd.DataFrame:
+    """
+    Interface síncrona que executa avk_extrai_dados_async no loop compartilhado do processo.
+
+    Sessões diferentes que pedem o mesmo ticker ao mesmo tempo compartilham uma única
+    requisição, e as esperas de backoff não ocupam threads. É a extração usada pelos caches
+    de avk_extrai_dados (avk_data_provider).
+
+    Args:
+        timeout: Tempo máximo de espera em segundos (None = sem limite)
+
+    Returns:
+        DataFrame com dados históricos no formato padrão (Date, Open, High, Low, Close, Volume)
+    """
+    futuro = asyncio.run_coroutine_threadsafe(
+        _extrai_coalescido(ticker, period, max_retries, retry_delay, provider, api_key, interval,
+                           contextvars.copy_context()),
+        _obtem_loop_compartilhado()
+    )
+    resultado, avisos = futuro.result(timeout)
+    # O loop roda em uma thread de fundo; os avisos são exibidos aqui, na thread de quem chamou
+    avk_exibe_avisos(avisos)
+    return resultado
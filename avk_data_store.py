@@ -0,0 +1,196 @@
+# Módulo de Armazenamento Persistente de Dados
+# Guarda o histórico OHLCV em disco (Parquet) para evitar downloads completos a cada reinício
+
+# Imports
+import os
+import re
+import tempfile
+import numpy as np
+import pandas as pd
+from contextlib import contextmanager, suppress
+from typing import Iterator, Optional, Tuple
+
+# Tente importar PyArrow (opcional, sem ele o armazenamento em disco fica desativado)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+########## Configuração do Armazenamento ##########
+
+# Diretório dos arquivos - pode ser alterado via variável de ambiente
+AVK_CACHE_DIR = os.getenv("AVK_CACHE_DIR", ".avk_cache")
+
+# Chave usada nos metadados do Parquet para registrar o início do período coberto
+_META_INICIO = b"avk_inicio"
+
+########## Esquema Compacto ##########
+
+# Esquema padrão do histórico OHLCV, usado por provedores, armazenamento, cache e indicadores:
+# - Date: datetime64 (com ou sem fuso), armazenado internamente como int64 desde a época
+# - Open, High, Low, Close: float32 (cerca de 7 dígitos significativos, suficiente para preços)
+# - Volume: int64
+# Colunas extras dos provedores (ex: Dividends e Stock Splits do yfinance) são descartadas
+COLUNAS_PRECO = ['Open', 'High', 'Low', 'Close']
+
+# Meta de memória: 4 preços x 4 bytes + volume 8 bytes + data 8 bytes = 32 bytes por barra
+# (1 ano diário ≈ 8 KB; 1 mês de barras de 1 minuto ≈ 260 KB; 500 tickers com 1 ano diário ≈ 4 MB)
+BYTES_POR_BARRA = 32
+
+def avk_compacta_ohlcv(dados: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converte um histórico para o esquema compacto.
+
+    Colunas que já estão no tipo do esquema são reaproveitadas sem cópia; as demais
+    são convertidas uma única vez.
+
+    Args:
+        dados: DataFrame com Date e colunas OHLCV (outras colunas são ignoradas)
+
+    Returns:
+        DataFrame com Date, Open, High, Low, Close e Volume (as presentes na entrada)
+    """
+    if dados is None or dados.empty:
+        return dados
+
+    datas = dados['Date']
+    if not pd.api.types.is_datetime64_any_dtype(datas):
+        datas = pd.to_datetime(datas)
+    colunas = {'Date': datas}
+
+    for coluna in COLUNAS_PRECO:
+        if coluna in dados:
+            serie = dados[coluna]
+            colunas[coluna] = serie if serie.dtype == np.float32 else serie.astype(np.float32)
+    if 'Volume' in dados:
+        serie = dados['Volume']
+        colunas['Volume'] = serie if serie.dtype == np.int64 else serie.fillna(0).astype(np.int64)
+
+    return pd.DataFrame(colunas, copy=False).reset_index(drop=True)
+
+def avk_memoria_ohlcv(dados: pd.DataFrame) -> int:
+    """Memória (bytes) ocupada pelas colunas de um histórico, para comparar com BYTES_POR_BARRA"""
+    return int(dados.memory_usage(index=False, deep=True).sum())
+
+def avk_datas_epoch(dados: pd.DataFrame) -> np.ndarray:
+    """Datas como int64 de nanossegundos desde a época (UTC), sem cópia"""
+    return pd.DatetimeIndex(dados['Date']).as_unit('ns').asi8
+
+########## Funções do Armazenamento ##########
+
+@contextmanager
+def avk_arquivo_temporario(caminho: str) -> Iterator[str]:
+    """
+    Arquivo temporário único no diretório de destino que, ao final do bloco, substitui o destino.
+
+    A renomeação é atômica: leitores nunca veem um arquivo parcial, e gravações simultâneas do mesmo
+    destino (threads ou processos) não disputam o mesmo temporário. Em caso de erro, ele é removido.
+
+    Ex: with avk_arquivo_temporario(caminho) as temporario: pq.write_table(tabela, temporario)
+    """
+    descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho),
+                                             prefix=os.path.basename(caminho) + ".", suffix=".tmp")
+    os.close(descritor)
+    try:
+        yield temporario
+        os.replace(temporario, caminho)
+    except BaseException:
+        with suppress(OSError):
+            os.remove(temporario)
+        raise
+
+def _caminho_store(ticker: str, provider: str) -> str:
+    """Monta o caminho do arquivo Parquet de um ticker/provedor"""
+    # Sanitiza o ticker para uso como nome de arquivo (ex: BRK.B, ^GSPC)
+    ticker_seguro = re.sub(r"[^A-Za-z0-9._-]", "_", ticker.upper())
+    return os.path.join(AVK_CACHE_DIR, "ohlcv", provider, f"{ticker_seguro}.parquet")
+
+def avk_store_carrega(ticker: str, provider: str) -> Tuple[Optional[pd.DataFrame], Optional[pd.Timestamp]]:
+    """
+    Carrega o histórico armazenado de um ticker.
+
+    Args:
+        ticker: Símbolo da ação
+        provider: Provedor que gerou os dados ('yfinance' ou 'alpha_vantage')
+
+    Returns:
+        Tupla (DataFrame armazenado, início do período coberto) ou (None, None) se não houver dados
+    """
+    caminho = _caminho_store(ticker, provider)
+    if not PARQUET_AVAILABLE or not os.path.exists(caminho):
+        return None, None
+
+    try:
+        tabela = pq.read_table(caminho)
+    except Exception:
+        # Arquivo corrompido (ex: escrita interrompida) é tratado como ausente
+        return None, None
+
+    metadados = tabela.schema.metadata or {}
+    inicio = metadados.get(_META_INICIO)
+    inicio = pd.Timestamp(inicio.decode()) if inicio else None
+
+    dados = tabela.to_pandas()
+    if dados.empty:
+        return None, None
+    # Arquivos gravados antes do esquema compacto são convertidos na leitura
+    return avk_compacta_ohlcv(dados), inicio
+
+def avk_store_salva(ticker: str, provider: str, dados: pd.DataFrame, inicio: Optional[pd.Timestamp] = None) -> None:
+    """
+    Salva o histórico de um ticker em disco, substituindo o arquivo anterior.
+
+    Args:
+        ticker: Símbolo da ação
+        provider: Provedor que gerou os dados
+        dados: DataFrame no formato padrão (Date, Open, High, Low, Close, Volume)
+        inicio: Início do período coberto pelos dados (usado para saber se um período maior exige novo download)
+    """
+    if not PARQUET_AVAILABLE or dados is None or dados.empty:
+        return
+
+    caminho = _caminho_store(ticker, provider)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+
+    tabela = pa.Table.from_pandas(dados, preserve_index=False)
+    if inicio is not None:
+        metadados = dict(tabela.schema.metadata or {})
+        metadados[_META_INICIO] = pd.Timestamp(inicio).isoformat().encode()
+        tabela = tabela.replace_schema_metadata(metadados)
+
+    # Escreve em arquivo temporário e renomeia, para que leitores nunca vejam um arquivo parcial
+    with avk_arquivo_temporario(caminho) as caminho_tmp:
+        pq.write_table(tabela, caminho_tmp)
+
+def avk_store_mescla(armazenado: Optional[pd.DataFrame], novos: Optional[pd.DataFrame],
+                     deduplica: bool = True) -> pd.DataFrame:
+    """
+    Acrescenta as barras novas ao histórico armazenado.
+
+    Barras com a mesma data são substituídas pela versão mais recente
+    (ex: a barra do dia atual, que muda até o fechamento do pregão).
+
+    Args:
+        armazenado: Histórico já existente (pode ser None)
+        novos: Barras obtidas na atualização incremental (pode ser None ou vazio)
+        deduplica: Se False, apenas concatena; para quem valida o resultado com avk_valida_ohlcv,
+                   que ordena e remove as duplicatas (mantendo a última) na mesma passagem
+
+    Returns:
+        DataFrame ordenado por data, sem datas duplicadas
+    """
+    if armazenado is None or armazenado.empty:
+        return novos
+    if novos is None or novos.empty:
+        return armazenado
+
+    # Descarta do histórico as barras que serão substituídas e concatena
+    # (min: as barras novas podem chegar fora de ordem; a validação do provedor as ordena)
+    primeira_nova = novos['Date'].min()
+    mantidos = armazenado[armazenado['Date'] < primeira_nova]
+    dados = pd.concat([mantidos, novos], ignore_index=True)
+    if not deduplica:
+        return dados
+    return dados.drop_duplicates(subset='Date', keep='last').reset_index(drop=True)
@@ -0,0 +1,124 @@
+# Módulo de Redução de Pontos para Gráficos
+# LTTB para séries de linha e agregação OHLC/volume por faixas de tempo, dimensionados pela largura do gráfico
+
+# Imports
+import os
+import numpy as np
+import pandas as pd
+
+########## Configuração ##########
+
+# Largura de referência (em pixels) dos gráficos
+LARGURA_PADRAO_PX = int(os.getenv("AVK_LARGURA_GRAFICO_PX", "1200"))
+
+# Pixels mínimos por candle e por barra de volume, para que continuem legíveis
+PX_POR_CANDLE = 4
+PX_POR_BARRA = 2
+
+########## Funções Auxiliares ##########
+
+def _segundos(datas: pd.Series) -> np.ndarray:
+    """Converte as datas em segundos desde a primeira barra (aceita datas com ou sem fuso horário)"""
+    datas = pd.to_datetime(datas)
+    return (datas - datas.iloc[0]).dt.total_seconds().to_numpy()
+
+def _lttb_indices(x: np.ndarray, y: np.ndarray, n_pontos: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: escolhe n_pontos índices que preservam a forma da série.
+
+    O primeiro e o último ponto são sempre mantidos; em cada faixa intermediária fica o ponto
+    que forma o maior triângulo com o ponto escolhido na faixa anterior e a média da próxima faixa.
+    """
+    n = len(x)
+    if n_pontos >= n or n_pontos < 3:
+        return np.arange(n)
+
+    # n_pontos - 2 faixas entre o primeiro e o último ponto
+    limites = np.linspace(1, n - 1, n_pontos - 1).astype(np.int64)
+    indices = np.empty(n_pontos, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+
+    anterior = 0
+    for i in range(n_pontos - 2):
+        inicio, fim = limites[i], limites[i + 1]
+        proximo_fim = limites[i + 2] if i + 2 < len(limites) else n
+        media_x = x[fim:proximo_fim].mean()
+        media_y = np.nanmean(y[fim:proximo_fim]) if not np.isnan(y[fim:proximo_fim]).all() else y[anterior]
+
+        area = np.abs((x[anterior] - media_x) * (y[inicio:fim] - y[anterior])
+                      - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior]))
+        anterior = inicio + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        indices[i + 1] = anterior
+
+    return indices
+
+########## Redução de Pontos ##########
+
+def avk_lttb(hist: pd.DataFrame, coluna: str = "Close", largura_px: int = LARGURA_PADRAO_PX) -> pd.DataFrame:
+    """
+    Reduz o histórico a cerca de um ponto por pixel com LTTB, aplicado à coluna informada.
+
+    As demais colunas acompanham as linhas escolhidas (ex: médias móveis junto com o fechamento).
+    O máximo e o mínimo da série são sempre mantidos, para que os extremos continuem visíveis.
+
+    Args:
+        hist: DataFrame com coluna Date e a coluna a reduzir
+        coluna: Coluna usada para escolher os pontos
+        largura_px: Largura do gráfico em pixels
+
+    Returns:
+        DataFrame com no máximo largura_px + 2 linhas (o próprio hist se já for menor)
+    """
+    if len(hist) <= largura_px:
+        return hist
+
+    y = hist[coluna].to_numpy(dtype=np.float64)
+    indices = _lttb_indices(_segundos(hist["Date"]), y, largura_px)
+    if not np.isnan(y).all():
+        indices = np.union1d(indices, [np.nanargmin(y), np.nanargmax(y)])
+    return hist.iloc[indices].reset_index(drop=True)
+
+def avk_agrega_ohlc(hist: pd.DataFrame, n_barras: int) -> pd.DataFrame:
+    """
+    Agrega o histórico em faixas de tempo de mesma duração, com no máximo n_barras faixas.
+
+    Cada faixa recebe a data e a abertura da primeira barra, a máxima das máximas,
+    a mínima das mínimas, o fechamento da última barra e a soma dos volumes; assim,
+    as máximas e mínimas do período continuam visíveis. Faixas sem barras (noites,
+    fins de semana) são descartadas. Apenas as colunas OHLCV presentes são agregadas.
+
+    Args:
+        hist: DataFrame com coluna Date e colunas Open, High, Low, Close e/ou Volume
+        n_barras: Número máximo de barras do resultado
+
+    Returns:
+        DataFrame agregado (o próprio hist se já tiver até n_barras linhas)
+    """
+    n = len(hist)
+    if n <= n_barras or n_barras < 1:
+        return hist
+
+    segundos = _segundos(hist["Date"])
+    duracao = segundos[-1] / n_barras
+    if duracao <= 0:
+        return hist
+    # Faixa de cada barra; o último instante cai na última faixa
+    faixas = np.minimum((segundos // duracao).astype(np.int64), n_barras - 1)
+    inicios = np.concatenate(([0], np.flatnonzero(np.diff(faixas)) + 1))
+    fins = np.append(inicios[1:], n) - 1
+
+    agregado = {"Date": hist["Date"].iloc[inicios].to_numpy()}
+    if "Open" in hist:
+        agregado["Open"] = hist["Open"].to_numpy()[inicios]
+    if "High" in hist:
+        agregado["High"] = np.fmax.reduceat(hist["High"].to_numpy(dtype=np.float64), inicios)
+    if "Low" in hist:
+        agregado["Low"] = np.fmin.reduceat(hist["Low"].to_numpy(dtype=np.float64), inicios)
+    if "Close" in hist:
+        agregado["Close"] = hist["Close"].to_numpy()[fins]
+    if "Volume" in hist:
+        agregado["Volume"] = np.add.reduceat(np.nan_to_num(hist["Volume"].to_numpy(dtype=np.float64)), inicios)
+
+    resultado = pd.DataFrame(agregado)
+    resultado["Date"] = resultado["Date"].astype(hist["Date"].dtype)
+    return resultado
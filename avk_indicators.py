@@ -0,0 +1,272 @@
+# Módulo de Indicadores Técnicos
+# Motor vetorizado (NumPy) que calcula vários indicadores em uma única passagem sobre o array OHLCV
+
+# Imports
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+########## Configuração ##########
+
+# Ordem das colunas no array OHLCV
+COLUNAS_OHLCV = ['Open', 'High', 'Low', 'Close', 'Volume']
+_O, _H, _L, _C, _V = range(5)
+
+# Conjunto padrão de indicadores e seus parâmetros
+INDICADORES_PADRAO = {
+    "sma": (20, 50),            # Médias móveis simples (janelas)
+    "ema": (20, 50),            # Médias móveis exponenciais (spans)
+    "rsi": 14,                  # Índice de força relativa (período)
+    "macd": (12, 26, 9),        # MACD (rápida, lenta, sinal)
+    "bollinger": (20, 2.0),     # Bandas de Bollinger (janela, desvios padrão)
+    "atr": 14,                  # Average True Range (período)
+    "vwap": True,               # Preço médio ponderado por volume (acumulado desde a primeira barra)
+}
+
+# Limite para os fatores de decaimento da EMA em blocos (evita overflow em decay ** -j)
+_LOG_LIMITE_EMA = np.log(1e100)
+
+########## Conversão de Dados ##########
+
+def avk_ohlcv_array(hist: pd.DataFrame) -> np.ndarray:
+    """
+    Extrai o array OHLCV (n_barras, 5) de um DataFrame no formato padrão.
+
+    As cinco colunas são lidas de uma vez, em float64; nenhuma coluna é adicionada ao DataFrame.
+    """
+    return hist[COLUNAS_OHLCV].to_numpy(dtype=np.float64)
+
+def avk_empilha_ohlcv(frames: Dict[str, pd.DataFrame], n_barras: Optional[int] = None) -> Tuple[List[str], np.ndarray]:
+    """
+    Empilha os históricos de vários tickers em um array (n_tickers, n_barras, 5).
+
+    Os históricos são alinhados pelas últimas n_barras de cada ticker, de modo que todos
+    os indicadores de um universo de ações saem de uma única chamada vetorizada.
+
+    Args:
+        frames: Dicionário ticker -> DataFrame no formato padrão
+        n_barras: Número de barras por ticker. Se None, usa o menor histórico disponível
+
+    Returns:
+        Tupla (lista de tickers incluídos, array empilhado). Tickers com menos de n_barras
+        barras ficam de fora.
+    """
+    frames = {ticker: hist for ticker, hist in frames.items() if hist is not None and not hist.empty}
+    if not frames:
+        return [], np.empty((0, 0, 5))
+
+    if n_barras is None:
+        n_barras = min(len(hist) for hist in frames.values())
+
+    tickers = [ticker for ticker, hist in frames.items() if len(hist) >= n_barras]
+    empilhado = np.empty((len(tickers), n_barras, 5), dtype=np.float64)
+    for i, ticker in enumerate(tickers):
+        empilhado[i] = frames[ticker][COLUNAS_OHLCV].to_numpy(dtype=np.float64)[-n_barras:]
+    return tickers, empilhado
+
+########## Primitivas Vetorizadas ##########
+
+def _sma(x: np.ndarray, janelas: Tuple[int, ...]) -> np.ndarray:
+    """
+    Médias móveis simples de várias janelas a partir de uma única soma acumulada.
+
+    Args:
+        x: Array (..., n)
+        janelas: Tamanhos das janelas
+
+    Returns:
+        Array (len(janelas), ..., n), com NaN nas primeiras janela - 1 posições
+    """
+    n = x.shape[-1]
+    # Centraliza no primeiro valor para reduzir erro numérico da soma acumulada
+    referencia = x[..., :1]
+    soma = np.concatenate([np.zeros_like(referencia), np.cumsum(x - referencia, axis=-1)], axis=-1)
+
+    saida = np.full((len(janelas),) + x.shape, np.nan)
+    for i, janela in enumerate(janelas):
+        if janela <= n:
+            saida[i, ..., janela - 1:] = (soma[..., janela:] - soma[..., :-janela]) / janela + referencia
+    return saida
+
+def _ema(x: np.ndarray, alphas: np.ndarray) -> np.ndarray:
+    """
+    Médias exponenciais (mesma definição de pandas ewm(adjust=False)) de várias séries e alphas de uma vez.
+
+    A recorrência y[t] = (1 - a) * y[t-1] + a * x[t] é resolvida em blocos: dentro de cada bloco,
+    y é uma soma acumulada ponderada, calculada de forma vetorizada para todas as séries.
+
+    Args:
+        x: Array (..., n), sem NaN
+        alphas: Fatores de suavização, com forma compatível (broadcast) com x[..., :1]
+
+    Returns:
+        Array com a forma do broadcast entre x e alphas
+    """
+    alphas = np.asarray(alphas, dtype=np.float64)
+    decaimento = 1.0 - alphas
+    n = x.shape[-1]
+    forma = np.broadcast_shapes(x.shape[:-1] + (1,), alphas.shape)[:-1] + (n,)
+    saida = np.empty(forma)
+    if n == 0:
+        return saida
+
+    # Tamanho do bloco limitado pelo alpha de decaimento mais rápido
+    taxa = (-np.log(np.clip(decaimento, 1e-300, None))).max()
+    bloco = max(1, int(_LOG_LIMITE_EMA / taxa)) if taxa > 0 else n
+
+    # y[-1] = x[0] faz com que y[0] = x[0]
+    anterior = np.broadcast_to(x[..., :1], forma[:-1] + (1,))
+    for inicio in range(0, n, bloco):
+        trecho = x[..., inicio:inicio + bloco]
+        fim = inicio + trecho.shape[-1]
+        potencias = decaimento ** np.arange(trecho.shape[-1])
+        acumulado = np.cumsum(trecho / potencias, axis=-1)
+        saida[..., inicio:fim] = potencias * (decaimento * anterior + alphas * acumulado)
+        anterior = saida[..., fim - 1:fim]
+    return saida
+
+def _alphas(valores: List[float], ndim: int) -> np.ndarray:
+    """Formata uma lista de alphas como (k, 1, ..., 1), para aplicar cada alpha a uma série empilhada"""
+    return np.asarray(valores, dtype=np.float64).reshape((-1,) + (1,) * ndim)
+
+def _desvio_movel(x: np.ndarray, janela: int) -> np.ndarray:
+    """Desvio padrão populacional móvel (ddof=0), via somas acumuladas de x e x²"""
+    n = x.shape[-1]
+    saida = np.full(x.shape, np.nan)
+    if janela > n:
+        return saida
+    centrado = x - x[..., :1]
+    zeros = np.zeros_like(centrado[..., :1])
+    soma = np.concatenate([zeros, np.cumsum(centrado, axis=-1)], axis=-1)
+    soma_q = np.concatenate([zeros, np.cumsum(centrado * centrado, axis=-1)], axis=-1)
+    media = (soma[..., janela:] - soma[..., :-janela]) / janela
+    variancia = (soma_q[..., janela:] - soma_q[..., :-janela]) / janela - media * media
+    saida[..., janela - 1:] = np.sqrt(np.clip(variancia, 0.0, None))
+    return saida
+
+########## Motor de Indicadores ##########
+
+def avk_calcula_indicadores(ohlcv: np.ndarray, config: Optional[dict] = None) -> Dict[str, np.ndarray]:
+    """
+    Calcula um conjunto configurável de indicadores técnicos em uma passagem vetorizada.
+
+    Todas as médias simples saem de uma única soma acumulada, e as médias exponenciais são
+    calculadas em blocos de alphas (EMAs e linhas do MACD juntas; RSI e ATR juntos).
+
+    Args:
+        ohlcv: Array (n_barras, 5) de um ticker ou (n_tickers, n_barras, 5) de vários,
+               com colunas na ordem de COLUNAS_OHLCV
+        config: Indicadores e parâmetros (mesmo formato de INDICADORES_PADRAO). Se None, usa o padrão
+
+    Returns:
+        Dicionário nome -> array com a mesma forma do ohlcv sem a última dimensão
+        (ex: 'SMA_20', 'EMA_20', 'RSI_14', 'MACD', 'MACD_SINAL', 'MACD_HIST',
+        'BB_MEIO', 'BB_SUPERIOR', 'BB_INFERIOR', 'ATR_14', 'VWAP')
+
+    Raises:
+        ValueError: Se a configuração tiver indicadores desconhecidos
+    """
+    config = INDICADORES_PADRAO if config is None else config
+    desconhecidos = set(config) - set(INDICADORES_PADRAO)
+    if desconhecidos:
+        raise ValueError(f"Indicadores desconhecidos: {sorted(desconhecidos)}")
+
+    ohlcv = np.asarray(ohlcv, dtype=np.float64)
+    # Séries com o tempo no último eixo: (..., n_barras)
+    high, low, close, volume = (ohlcv[..., coluna] for coluna in (_H, _L, _C, _V))
+    n = close.shape[-1]
+    resultado = {}
+
+    # Médias simples (incluindo a média central das bandas de Bollinger)
+    janelas_sma = tuple(config.get("sma", ()))
+    if config.get("bollinger"):
+        janela_bb, desvios_bb = config["bollinger"]
+        janelas_sma = janelas_sma + (janela_bb,)
+    if janelas_sma:
+        smas = _sma(close, janelas_sma)
+        for janela, serie in zip(config.get("sma", ()), smas):
+            resultado[f"SMA_{janela}"] = serie
+        if config.get("bollinger"):
+            desvio = _desvio_movel(close, janela_bb)
+            resultado["BB_MEIO"] = smas[-1]
+            resultado["BB_SUPERIOR"] = smas[-1] + desvios_bb * desvio
+            resultado["BB_INFERIOR"] = smas[-1] - desvios_bb * desvio
+
+    # Médias exponenciais do fechamento (EMAs e as duas linhas do MACD) em um único bloco
+    spans = list(config.get("ema", ()))
+    if config.get("macd"):
+        rapida, lenta, sinal = config["macd"]
+        spans += [rapida, lenta]
+    if spans:
+        emas = _ema(close, _alphas([2.0 / (span + 1.0) for span in spans], close.ndim))
+        for span, serie in zip(config.get("ema", ()), emas):
+            resultado[f"EMA_{span}"] = serie
+        if config.get("macd"):
+            macd = emas[-2] - emas[-1]
+            linha_sinal = _ema(macd, 2.0 / (sinal + 1.0))
+            resultado["MACD"] = macd
+            resultado["MACD_SINAL"] = linha_sinal
+            resultado["MACD_HIST"] = macd - linha_sinal
+
+    # RSI e ATR usam a suavização de Wilder (alpha = 1/período); as três séries vão em um único bloco
+    periodo_rsi = config.get("rsi")
+    periodo_atr = config.get("atr")
+    if (periodo_rsi or periodo_atr) and n > 1:
+        series, alphas = [], []
+        if periodo_rsi:
+            variacao = np.diff(close, axis=-1)
+            series += [np.clip(variacao, 0.0, None), np.clip(-variacao, 0.0, None)]
+            alphas += [1.0 / periodo_rsi] * 2
+        if periodo_atr:
+            fechamento_anterior = close[..., :-1]
+            true_range = np.maximum.reduce([
+                high[..., 1:] - low[..., 1:],
+                np.abs(high[..., 1:] - fechamento_anterior),
+                np.abs(low[..., 1:] - fechamento_anterior),
+            ])
+            series.append(true_range)
+            alphas.append(1.0 / periodo_atr)
+
+        # Cada série empilhada recebe o seu próprio alpha
+        suavizadas = _ema(np.stack(series), _alphas(alphas, close.ndim))
+
+        if periodo_rsi:
+            ganho, perda = suavizadas[0], suavizadas[1]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rsi = np.where(perda == 0.0, 100.0, 100.0 - 100.0 / (1.0 + ganho / perda))
+            rsi = np.where((ganho == 0.0) & (perda == 0.0), 50.0, rsi)
+            saida = np.full(close.shape, np.nan)
+            # As primeiras barras (sem período completo) ficam como NaN
+            saida[..., periodo_rsi:] = rsi[..., periodo_rsi - 1:]
+            resultado[f"RSI_{periodo_rsi}"] = saida
+        if periodo_atr:
+            saida = np.full(close.shape, np.nan)
+            saida[..., periodo_atr:] = suavizadas[-1][..., periodo_atr - 1:]
+            resultado[f"ATR_{periodo_atr}"] = saida
+    else:
+        if periodo_rsi:
+            resultado[f"RSI_{periodo_rsi}"] = np.full(close.shape, np.nan)
+        if periodo_atr:
+            resultado[f"ATR_{periodo_atr}"] = np.full(close.shape, np.nan)
+
+    # VWAP acumulado a partir da primeira barra
+    if config.get("vwap"):
+        preco_tipico = (high + low + close) / 3.0
+        volume_acumulado = np.cumsum(volume, axis=-1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            resultado["VWAP"] = np.where(
+                volume_acumulado > 0,
+                np.cumsum(preco_tipico * volume, axis=-1) / volume_acumulado,
+                np.nan
+            )
+
+    return resultado
+
+def avk_indicadores_frame(hist: pd.DataFrame, config: Optional[dict] = None) -> pd.DataFrame:
+    """
+    Calcula os indicadores de um ticker e retorna um DataFrame novo (Date + indicadores).
+
+    O DataFrame de entrada não é modificado.
+    """
+    indicadores = avk_calcula_indicadores(avk_ohlcv_array(hist), config)
+    return pd.DataFrame({'Date': hist['Date'].to_numpy(), **indicadores})
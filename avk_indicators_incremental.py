@@ -0,0 +1,515 @@
+# Módulo de Indicadores Incrementais
+# Indicadores com estado, atualizados em O(1) a cada nova barra (uso em tempo real)
+
+# Imports
+import os
+import re
+import json
+import math
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Dict, List, MutableMapping, Optional
+import numpy as np
+import pandas as pd
+from avk_indicators import COLUNAS_OHLCV
+from avk_data_store import AVK_CACHE_DIR, avk_arquivo_temporario, avk_datas_epoch
+
+########## Indicadores Incrementais ##########
+
+class IndicadorIncremental(ABC):
+    """
+    Interface dos indicadores incrementais.
+
+    atualiza() recebe uma barra (open, high, low, close, volume) e retorna os valores
+    do indicador após a barra. estado()/de_estado() convertem o estado para um
+    dicionário serializável em JSON.
+    """
+
+    tipo = ""
+
+    @abstractmethod
+    def atualiza(self, open_: float, high: float, low: float, close: float, volume: float) -> Dict[str, float]:
+        ...
+
+    @abstractmethod
+    def estado(self) -> dict:
+        ...
+
+    @classmethod
+    @abstractmethod
+    def de_estado(cls, estado: dict) -> "IndicadorIncremental":
+        ...
+
+class SMAIncremental(IndicadorIncremental):
+    """Média móvel simples com soma móvel (O(1) por barra)"""
+
+    tipo = "sma"
+
+    def __init__(self, janela: int):
+        self.janela = janela
+        self._valores = deque(maxlen=janela)
+        self._soma = 0.0
+        self._atualizacoes = 0
+
+    def atualiza(self, open_, high, low, close, volume):
+        if len(self._valores) == self.janela:
+            self._soma -= self._valores[0]
+        self._valores.append(close)
+        self._soma += close
+
+        # Recalcula a soma a cada janela barras para não acumular erro de arredondamento (O(1) amortizado)
+        self._atualizacoes += 1
+        if self._atualizacoes % self.janela == 0:
+            self._soma = math.fsum(self._valores)
+
+        valor = self._soma / self.janela if len(self._valores) == self.janela else math.nan
+        return {f"SMA_{self.janela}": valor}
+
+    def estado(self):
+        return {"tipo": self.tipo, "janela": self.janela, "valores": list(self._valores),
+                "atualizacoes": self._atualizacoes}
+
+    @classmethod
+    def de_estado(cls, estado):
+        indicador = cls(estado["janela"])
+        indicador._valores.extend(estado["valores"])
+        indicador._soma = math.fsum(indicador._valores)
+        indicador._atualizacoes = estado["atualizacoes"]
+        return indicador
+
+class EMAIncremental(IndicadorIncremental):
+    """Média móvel exponencial (mesma definição de pandas ewm(adjust=False))"""
+
+    tipo = "ema"
+
+    def __init__(self, span: int):
+        self.span = span
+        self.alpha = 2.0 / (span + 1.0)
+        self.valor: Optional[float] = None
+
+    def proximo(self, x: float) -> float:
+        """Atualiza a média com um valor qualquer (usado também pelo MACD)"""
+        self.valor = x if self.valor is None else self.valor + self.alpha * (x - self.valor)
+        return self.valor
+
+    def atualiza(self, open_, high, low, close, volume):
+        return {f"EMA_{self.span}": self.proximo(close)}
+
+    def estado(self):
+        return {"tipo": self.tipo, "span": self.span, "valor": self.valor}
+
+    @classmethod
+    def de_estado(cls, estado):
+        indicador = cls(estado["span"])
+        indicador.valor = estado["valor"]
+        return indicador
+
+class RSIIncremental(IndicadorIncremental):
+    """Índice de força relativa com suavização de Wilder (alpha = 1/período)"""
+
+    tipo = "rsi"
+
+    def __init__(self, periodo: int = 14):
+        self.periodo = periodo
+        self.ultimo_close: Optional[float] = None
+        self.ganho_medio: Optional[float] = None
+        self.perda_medio: Optional[float] = None
+        self.variacoes = 0
+
+    def atualiza(self, open_, high, low, close, volume):
+        nome = f"RSI_{self.periodo}"
+        if self.ultimo_close is None:
+            self.ultimo_close = close
+            return {nome: math.nan}
+
+        variacao = close - self.ultimo_close
+        self.ultimo_close = close
+        ganho, perda = max(variacao, 0.0), max(-variacao, 0.0)
+        alpha = 1.0 / self.periodo
+        if self.ganho_medio is None:
+            self.ganho_medio, self.perda_medio = ganho, perda
+        else:
+            self.ganho_medio += alpha * (ganho - self.ganho_medio)
+            self.perda_medio += alpha * (perda - self.perda_medio)
+        self.variacoes += 1
+
+        if self.variacoes < self.periodo:
+            return {nome: math.nan}
+        if self.perda_medio == 0.0:
+            return {nome: 50.0 if self.ganho_medio == 0.0 else 100.0}
+        return {nome: 100.0 - 100.0 / (1.0 + self.ganho_medio / self.perda_medio)}
+
+    def estado(self):
+        return {"tipo": self.tipo, "periodo": self.periodo, "ultimo_close": self.ultimo_close,
+                "ganho_medio": self.ganho_medio, "perda_medio": self.perda_medio, "variacoes": self.variacoes}
+
+    @classmethod
+    def de_estado(cls, estado):
+        indicador = cls(estado["periodo"])
+        indicador.ultimo_close = estado["ultimo_close"]
+        indicador.ganho_medio = estado["ganho_medio"]
+        indicador.perda_medio = estado["perda_medio"]
+        indicador.variacoes = estado["variacoes"]
+        return indicador
+
+class MACDIncremental(IndicadorIncremental):
+    """MACD (diferença entre EMAs rápida e lenta), linha de sinal e histograma"""
+
+    tipo = "macd"
+
+    def __init__(self, rapida: int = 12, lenta: int = 26, sinal: int = 9):
+        self.rapida = EMAIncremental(rapida)
+        self.lenta = EMAIncremental(lenta)
+        self.sinal = EMAIncremental(sinal)
+
+    def atualiza(self, open_, high, low, close, volume):
+        macd = self.rapida.proximo(close) - self.lenta.proximo(close)
+        linha_sinal = self.sinal.proximo(macd)
+        return {"MACD": macd, "MACD_SINAL": linha_sinal, "MACD_HIST": macd - linha_sinal}
+
+    def estado(self):
+        return {"tipo": self.tipo, "rapida": self.rapida.estado(), "lenta": self.lenta.estado(),
+                "sinal": self.sinal.estado()}
+
+    @classmethod
+    def de_estado(cls, estado):
+        indicador = cls(estado["rapida"]["span"], estado["lenta"]["span"], estado["sinal"]["span"])
+        indicador.rapida = EMAIncremental.de_estado(estado["rapida"])
+        indicador.lenta = EMAIncremental.de_estado(estado["lenta"])
+        indicador.sinal = EMAIncremental.de_estado(estado["sinal"])
+        return indicador
+
+class VWAPIncremental(IndicadorIncremental):
+    """Preço médio ponderado por volume, acumulado desde a primeira barra"""
+
+    tipo = "vwap"
+
+    def __init__(self):
+        self.soma_pv = 0.0
+        self.soma_v = 0.0
+
+    def atualiza(self, open_, high, low, close, volume):
+        self.soma_pv += (high + low + close) / 3.0 * volume
+        self.soma_v += volume
+        return {"VWAP": self.soma_pv / self.soma_v if self.soma_v > 0 else math.nan}
+
+    def estado(self):
+        return {"tipo": self.tipo, "soma_pv": self.soma_pv, "soma_v": self.soma_v}
+
+    @classmethod
+    def de_estado(cls, estado):
+        indicador = cls()
+        indicador.soma_pv = estado["soma_pv"]
+        indicador.soma_v = estado["soma_v"]
+        return indicador
+
+_TIPOS = {classe.tipo: classe for classe in
+          (SMAIncremental, EMAIncremental, RSIIncremental, MACDIncremental, VWAPIncremental)}
+
+def _cria_indicadores(config: dict) -> List[IndicadorIncremental]:
+    """Cria os indicadores a partir de uma configuração no formato de INDICADORES_PADRAO"""
+    desconhecidos = set(config) - set(_TIPOS)
+    if desconhecidos:
+        raise ValueError(f"Indicadores sem versão incremental: {sorted(desconhecidos)}")
+
+    indicadores = []
+    indicadores += [SMAIncremental(janela) for janela in config.get("sma", ())]
+    indicadores += [EMAIncremental(span) for span in config.get("ema", ())]
+    if config.get("rsi"):
+        indicadores.append(RSIIncremental(config["rsi"]))
+    if config.get("macd"):
+        indicadores.append(MACDIncremental(*config["macd"]))
+    if config.get("vwap"):
+        indicadores.append(VWAPIncremental())
+    return indicadores
+
+########## Acompanhamento de uma Série ##########
+
+# Configuração padrão: os indicadores com versão incremental
+INDICADORES_INCREMENTAIS_PADRAO = {
+    "sma": (20, 50),
+    "ema": (20, 50),
+    "rsi": 14,
+    "macd": (12, 26, 9),
+    "vwap": True,
+}
+
+class AcompanhadorIndicadores:
+    """
+    Mantém os indicadores incrementais de um ticker e as séries já calculadas.
+
+    A cada atualização, apenas as barras posteriores à última processada são aplicadas.
+    A última barra pode ser revisada (ex: barra do dia em andamento): o estado anterior a ela
+    é guardado, e se ela vier com valores novos é reaplicada em O(1). Barras anteriores não são
+    revisadas: se o provedor reescrever a penúltima (ex: ajuste retroativo), tudo é recalculado.
+
+    As séries ficam em arrays NumPy pré-alocados (a capacidade dobra quando acaba) e apenas as
+    barras do período do último histórico recebido são mantidas. frame() é uma visão dos arrays,
+    montada sem copiar as séries e reaproveitada enquanto nenhuma barra for aplicada.
+    """
+
+    def __init__(self, config: Optional[dict] = None):
+        self.config = dict(INDICADORES_INCREMENTAIS_PADRAO if config is None else config)
+        self.indicadores = _cria_indicadores(self.config)
+        self._estado_antes_ultima: Optional[List[dict]] = None
+        # OHLCV das duas últimas barras processadas (a penúltima detecta barras reescritas)
+        self._ultimas_barras = deque(maxlen=2)
+        # Barras mantidas: posições [_inicio, _fim) de _datas (nanossegundos desde a época, UTC)
+        # e de _valores (uma coluna por série, na ordem de _nomes)
+        self._nomes: List[str] = []
+        self._datas = np.empty(0, dtype=np.int64)
+        self._valores = np.empty((0, 0))
+        self._inicio = self._fim = 0
+        self._fuso = None
+        self._frame: Optional[pd.DataFrame] = None
+
+    def __len__(self) -> int:
+        return self._fim - self._inicio
+
+    @property
+    def ultima_data(self) -> Optional[pd.Timestamp]:
+        """Data da última barra processada"""
+        if not len(self):
+            return None
+        data = pd.Timestamp(int(self._datas[self._fim - 1]))
+        return data.tz_localize("UTC").tz_convert(self._fuso) if self._fuso is not None else data
+
+    def _reinicia(self) -> None:
+        """Descarta as barras e o estado dos indicadores (o próximo histórico é processado inteiro)"""
+        self.indicadores = _cria_indicadores(self.config)
+        self._estado_antes_ultima = None
+        self._ultimas_barras.clear()
+        self._inicio = self._fim = 0
+        self._frame = None
+
+    def _reserva(self, barras: int) -> None:
+        """Garante espaço para mais barras; realoca (dobrando a capacidade) apenas quando ela acaba"""
+        if self._fim + barras <= len(self._datas):
+            return
+        mantidas = len(self)
+        capacidade = max(64, 2 * (mantidas + barras))
+        datas = np.empty(capacidade, dtype=np.int64)
+        valores = np.full((capacidade, len(self._nomes)), np.nan)
+        datas[:mantidas] = self._datas[self._inicio:self._fim]
+        valores[:mantidas] = self._valores[self._inicio:self._fim]
+        self._datas, self._valores = datas, valores
+        self._inicio, self._fim = 0, mantidas
+
+    def _recorta(self, inicio: int) -> None:
+        """Deixa de manter as barras anteriores ao início do histórico recebido (busca binária)"""
+        self._inicio += int(np.searchsorted(self._datas[self._inicio:self._fim], inicio, side='left'))
+
+    def _aplica(self, data: int, barra) -> None:
+        """Aplica uma barra (Open, High, Low, Close, Volume) a todos os indicadores"""
+        valores = {}
+        for indicador in self.indicadores:
+            valores.update(indicador.atualiza(*barra))
+        if not self._nomes:
+            self._nomes = list(valores)
+            self._valores = np.full((len(self._datas), len(self._nomes)), np.nan)
+        self._valores[self._fim] = [valores[nome] for nome in self._nomes]
+        self._datas[self._fim] = data
+        self._fim += 1
+
+    def atualiza_frame(self, hist: pd.DataFrame) -> int:
+        """
+        Aplica as barras novas de um DataFrame no formato padrão.
+
+        As barras anteriores ao início do histórico deixam de ser mantidas; se o histórico começar
+        antes das barras mantidas (ex: período maior), tudo é recalculado.
+
+        Args:
+            hist: Histórico ordenado por data (pode conter barras já processadas)
+
+        Returns:
+            Número de barras aplicadas
+        """
+        if hist is None or hist.empty:
+            return 0
+
+        datas = avk_datas_epoch(hist)
+        fuso = hist['Date'].dt.tz
+        if len(self):
+            self._recorta(datas[0])
+            if not len(self) or self._datas[self._inicio] != datas[0] or str(fuso) != str(self._fuso):
+                self._reinicia()
+        if not len(self):
+            self._fuso = fuso
+
+        inicio = 0
+        if len(self):
+            # Posição da última barra processada (busca binária, o histórico está ordenado)
+            ultima = self._datas[self._fim - 1]
+            inicio = int(np.searchsorted(datas, ultima, side='left'))
+            if not self._penultima_confere(hist, datas, inicio):
+                self._reinicia()
+                inicio = 0
+            elif inicio < len(datas) and datas[inicio] == ultima:
+                # A última barra é reaplicada a partir do estado anterior a ela (se disponível)
+                if not self._restaura_antes_ultima():
+                    inicio += 1
+            if inicio >= len(datas):
+                return 0
+
+        barras = hist.iloc[inicio:][COLUNAS_OHLCV].to_numpy(dtype=float)
+        self._reserva(len(barras))
+        for posicao, (data, barra) in enumerate(zip(datas[inicio:], barras)):
+            if posicao == len(barras) - 1:
+                self._estado_antes_ultima = [indicador.estado() for indicador in self.indicadores]
+            self._aplica(data, barra)
+        self._ultimas_barras.extend(np.array(barras[-2:]))
+        self._frame = None
+        return len(barras)
+
+    def _penultima_confere(self, hist: pd.DataFrame, datas: np.ndarray, posicao_ultima: int) -> bool:
+        """Verifica se a penúltima barra processada continua igual no histórico (mesma data e OHLCV)"""
+        if len(self) < 2 or len(self._ultimas_barras) < 2:
+            return len(self) < 2
+        posicao = posicao_ultima - 1
+        if posicao < 0 or datas[posicao] != self._datas[self._fim - 2]:
+            return False
+        barra = np.array([hist[coluna].iat[posicao] for coluna in COLUNAS_OHLCV], dtype=float)
+        return bool(np.array_equal(barra, self._ultimas_barras[0], equal_nan=True))
+
+    def _restaura_antes_ultima(self) -> bool:
+        """Desfaz a última barra processada. Retorna False se o estado anterior não estiver disponível"""
+        if self._estado_antes_ultima is None:
+            return False
+        self.indicadores = [_TIPOS[estado["tipo"]].de_estado(estado) for estado in self._estado_antes_ultima]
+        self._fim -= 1
+        self._ultimas_barras.pop()
+        self._estado_antes_ultima = None
+        self._frame = None
+        return True
+
+    def frame(self) -> pd.DataFrame:
+        """
+        Séries calculadas como DataFrame (Date + uma coluna por indicador).
+
+        As colunas dos indicadores são uma visão dos arrays internos (somente leitura): apenas as
+        datas são convertidas. O mesmo DataFrame é retornado até a próxima barra aplicada
+        (uma revisão da última barra também aparece nos DataFrames já retornados).
+        """
+        if self._frame is None:
+            datas = pd.DatetimeIndex(self._datas[self._inicio:self._fim].view("M8[ns]"))
+            if self._fuso is not None:
+                datas = datas.tz_localize("UTC").tz_convert(self._fuso)
+            frame = pd.DataFrame(self._valores[self._inicio:self._fim], columns=self._nomes, copy=False)
+            frame.insert(0, 'Date', datas)
+            self._frame = frame
+        return self._frame
+
+    def para_dict(self) -> dict:
+        """Estado completo serializável em JSON (apenas as barras mantidas)"""
+        mantidas = slice(self._inicio, self._fim)
+        return {
+            "config": _config_serializavel(self.config),
+            "indicadores": [indicador.estado() for indicador in self.indicadores],
+            "estado_antes_ultima": self._estado_antes_ultima,
+            "ultimas_barras": [barra.tolist() for barra in self._ultimas_barras],
+            # Datas em nanossegundos desde a época (UTC), mais o fuso (ex: America/New_York nos intradiários)
+            "datas_ns": self._datas[mantidas].tolist(),
+            "fuso": str(self._fuso) if self._fuso is not None else None,
+            "series": {nome: self._valores[mantidas, coluna].tolist() for coluna, nome in enumerate(self._nomes)},
+        }
+
+    @classmethod
+    def de_dict(cls, dados: dict) -> "AcompanhadorIndicadores":
+        """Reconstrói o acompanhador a partir de para_dict()"""
+        acompanhador = cls(dados["config"])
+        acompanhador.indicadores = [_TIPOS[estado["tipo"]].de_estado(estado) for estado in dados["indicadores"]]
+        acompanhador._estado_antes_ultima = dados["estado_antes_ultima"]
+        acompanhador._ultimas_barras.extend(np.array(barra, dtype=float) for barra in dados["ultimas_barras"])
+        acompanhador._fuso = dados["fuso"]
+        acompanhador._nomes = list(dados["series"])
+        acompanhador._datas = np.array(dados["datas_ns"], dtype=np.int64)
+        acompanhador._valores = np.empty((len(acompanhador._datas), len(acompanhador._nomes)))
+        for coluna, nome in enumerate(acompanhador._nomes):
+            acompanhador._valores[:, coluna] = dados["series"][nome]
+        acompanhador._fim = len(acompanhador._datas)
+        return acompanhador
+
+def _config_serializavel(config: dict) -> dict:
+    """Configuração como fica em JSON (tuplas viram listas), para comparar com estados gravados"""
+    return {chave: list(valor) if isinstance(valor, tuple) else valor for chave, valor in config.items()}
+
+########## Estado em Disco ##########
+
+# Acompanhadores gravados fora da app (ex: avk_cli.py prefetch antes da abertura do mercado)
+# A primeira atualização de uma série na sessão parte do estado gravado e aplica só as barras novas
+_CAMINHO_INDICADORES = os.path.join(AVK_CACHE_DIR, "indicadores")
+
+def _arquivo_indicadores(chave: str) -> str:
+    """Caminho do estado gravado de uma série (chave sanitizada como nome de arquivo)"""
+    return os.path.join(_CAMINHO_INDICADORES, re.sub(r"[^A-Za-z0-9._-]", "_", chave.upper()) + ".json")
+
+def avk_salva_indicadores(chave: str, acompanhador: AcompanhadorIndicadores) -> str:
+    """
+    Grava o estado de um acompanhador em disco.
+
+    Args:
+        chave: Identificador da série (o mesmo usado em avk_atualiza_indicadores)
+        acompanhador: Acompanhador já atualizado
+
+    Returns:
+        Caminho do arquivo gravado
+    """
+    caminho = _arquivo_indicadores(chave)
+    os.makedirs(_CAMINHO_INDICADORES, exist_ok=True)
+    # Grava em um arquivo temporário e renomeia: a app nunca lê um estado pela metade
+    with avk_arquivo_temporario(caminho) as temporario, open(temporario, "w", encoding="utf-8") as arquivo:
+        json.dump(acompanhador.para_dict(), arquivo)
+    return caminho
+
+def avk_carrega_indicadores(chave: str, config: Optional[dict] = None) -> Optional[AcompanhadorIndicadores]:
+    """
+    Carrega o estado gravado de uma série.
+
+    Returns:
+        O acompanhador, ou None se não houver estado gravado, se ele estiver corrompido
+        ou se tiver sido calculado com outra configuração
+    """
+    caminho = _arquivo_indicadores(chave)
+    if not os.path.exists(caminho):
+        return None
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            acompanhador = AcompanhadorIndicadores.de_dict(json.load(arquivo))
+    except (OSError, ValueError, KeyError):
+        return None
+    esperada = _config_serializavel(INDICADORES_INCREMENTAIS_PADRAO if config is None else config)
+    if _config_serializavel(acompanhador.config) != esperada:
+        return None
+    return acompanhador
+
+def avk_atualiza_indicadores(chave: str, hist: pd.DataFrame, armazenamento: MutableMapping,
+                             config: Optional[dict] = None) -> pd.DataFrame:
+    """
+    Atualiza os indicadores incrementais de uma série logo após avk_extrai_dados.
+
+    Na primeira chamada, parte do estado gravado em disco (se houver um que alcance o início
+    do histórico) ou processa o histórico inteiro; nas seguintes, apenas as barras novas.
+    Apenas as barras do período do histórico são mantidas na sessão.
+
+    Args:
+        chave: Identificador da série (ex: ticker)
+        hist: Histórico retornado por avk_extrai_dados
+        armazenamento: Onde os acompanhadores são mantidos entre execuções (ex: st.session_state)
+        config: Indicadores a calcular (formato de INDICADORES_INCREMENTAIS_PADRAO)
+
+    Returns:
+        DataFrame com Date e as séries de indicadores (somente leitura, ver AcompanhadorIndicadores.frame)
+    """
+    chave_armazenamento = f"avk_indicadores_{chave}"
+    acompanhador = armazenamento.get(chave_armazenamento)
+    if acompanhador is None and hist is not None and not hist.empty:
+        # Um estado que não alcança o início do histórico é recalculado por atualiza_frame
+        acompanhador = avk_carrega_indicadores(chave, config)
+        if acompanhador is not None:
+            armazenamento[chave_armazenamento] = acompanhador
+    if acompanhador is None or (config is not None
+                                and _config_serializavel(acompanhador.config) != _config_serializavel(config)):
+        acompanhador = AcompanhadorIndicadores(config)
+        armazenamento[chave_armazenamento] = acompanhador
+    acompanhador.atualiza_frame(hist)
+    return acompanhador.frame()
@@ -0,0 +1,252 @@
+# Módulo de Registro de Provedores de Dados
+# Interface comum, monitoramento de saúde e circuit breaker para os provedores de dados
+
+# Imports
+import os
+import time
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+import pandas as pd
+
+########## Configuração ##########
+
+# Número de chamadas recentes consideradas no cálculo de saúde, e idade máxima (segundos) de cada uma
+# A idade máxima permite que um provedor rebaixado volte à frente depois que as falhas expiram
+JANELA_SAUDE = int(os.getenv("AVK_JANELA_SAUDE", "20"))
+IDADE_MAXIMA_SAUDE = float(os.getenv("AVK_IDADE_MAXIMA_SAUDE", "600"))
+
+# Falhas consecutivas que abrem o circuito e tempo (segundos) que ele fica aberto
+LIMITE_FALHAS = int(os.getenv("AVK_LIMITE_FALHAS", "3"))
+TEMPO_ESPERA_CIRCUITO = float(os.getenv("AVK_TEMPO_ESPERA_CIRCUITO", "120"))
+
+########## Circuit Breaker ##########
+
+class CircuitBreaker:
+    """
+    Circuit breaker de três estados para um provedor.
+
+    - fechado: chamadas liberadas
+    - aberto: após LIMITE_FALHAS falhas consecutivas, o provedor é ignorado durante o tempo de espera
+    - semiaberto: passado o tempo de espera, uma única chamada de teste é liberada (reserva());
+      um sucesso fecha o circuito, uma falha o abre novamente
+    """
+
+    FECHADO = "fechado"
+    ABERTO = "aberto"
+    SEMIABERTO = "semiaberto"
+
+    def __init__(self, limite_falhas: int = LIMITE_FALHAS, tempo_espera: float = TEMPO_ESPERA_CIRCUITO):
+        self.limite_falhas = limite_falhas
+        self.tempo_espera = tempo_espera
+        self._falhas_consecutivas = 0
+        self._aberto_em: Optional[float] = None
+        # Início da chamada de teste em andamento no semiaberto (uma que não registrou resultado
+        # é considerada perdida depois do tempo de espera, e outra é liberada)
+        self._teste_em: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self) -> str:
+        """Estado atual do circuito"""
+        with self._lock:
+            return self._estado()
+
+    def _estado(self) -> str:
+        if self._aberto_em is None:
+            return self.FECHADO
+        if time.monotonic() - self._aberto_em >= self.tempo_espera:
+            return self.SEMIABERTO
+        return self.ABERTO
+
+    def _em_teste(self) -> bool:
+        return self._teste_em is not None and time.monotonic() - self._teste_em < self.tempo_espera
+
+    def permite(self) -> bool:
+        """Indica se uma chamada pode ser feita agora (sem reservá-la)"""
+        with self._lock:
+            estado = self._estado()
+            return estado == self.FECHADO or (estado == self.SEMIABERTO and not self._em_teste())
+
+    def reserva(self) -> bool:
+        """
+        Reserva uma chamada imediatamente antes de fazê-la.
+
+        No semiaberto, apenas a primeira reserva é liberada até que o resultado dela seja registrado;
+        nos demais estados, a decisão fica com quem chamou (ver RegistroProvedores.candidatos).
+        """
+        with self._lock:
+            if self._estado() != self.SEMIABERTO:
+                return True
+            if self._em_teste():
+                return False
+            self._teste_em = time.monotonic()
+            return True
+
+    def registra_sucesso(self) -> None:
+        """Fecha o circuito e zera a contagem de falhas"""
+        with self._lock:
+            self._falhas_consecutivas = 0
+            self._aberto_em = None
+            self._teste_em = None
+
+    def registra_falha(self) -> None:
+        """Conta uma falha e abre o circuito se o limite for atingido (ou se a chamada de teste falhou)"""
+        with self._lock:
+            self._falhas_consecutivas += 1
+            self._teste_em = None
+            if self._aberto_em is not None or self._falhas_consecutivas >= self.limite_falhas:
+                self._aberto_em = time.monotonic()
+
+########## Saúde dos Provedores ##########
+
+class SaudeProvedor:
+    """Estatísticas móveis (latência e taxa de erro) das últimas chamadas de um provedor"""
+
+    def __init__(self, janela: int = JANELA_SAUDE, idade_maxima: float = IDADE_MAXIMA_SAUDE):
+        self.idade_maxima = idade_maxima
+        self._chamadas = deque(maxlen=janela)
+        self._lock = threading.Lock()
+
+    def registra(self, latencia: float, sucesso: bool) -> None:
+        """Registra o resultado de uma chamada"""
+        with self._lock:
+            self._chamadas.append((time.monotonic(), latencia, sucesso))
+
+    def _recentes(self) -> list:
+        """Descarta as chamadas mais antigas que a idade máxima e retorna as restantes"""
+        limite = time.monotonic() - self.idade_maxima
+        while self._chamadas and self._chamadas[0][0] < limite:
+            self._chamadas.popleft()
+        return list(self._chamadas)
+
+    @property
+    def taxa_erro(self) -> float:
+        """Fração de chamadas com falha na janela (0 se não houver chamadas)"""
+        with self._lock:
+            chamadas = self._recentes()
+            if not chamadas:
+                return 0.0
+            return sum(1 for _, _, sucesso in chamadas if not sucesso) / len(chamadas)
+
+    @property
+    def latencia_media(self) -> float:
+        """Latência média (segundos) das chamadas bem-sucedidas na janela (0 se não houver)"""
+        with self._lock:
+            latencias = [latencia for _, latencia, sucesso in self._recentes() if sucesso]
+            return sum(latencias) / len(latencias) if latencias else 0.0
+
+########## Interface dos Provedores ##########
+
+class ProvedorDados(ABC):
+    """
+    Interface comum dos provedores de dados.
+
+    Subclasses definem nome, descricao e extrai() (e disponivel(), se dependerem de configuração).
+    O registro usa a saúde e o circuit breaker de cada instância para escolher a ordem de tentativa.
+    """
+
+    nome = ""
+    descricao = ""
+
+    def __init__(self):
+        self.saude = SaudeProvedor()
+        self.circuito = CircuitBreaker()
+
+    def disponivel(self, api_key: Optional[str] = None) -> bool:
+        """Indica se o provedor está instalado e configurado"""
+        return True
+
+    @abstractmethod
+    def extrai(self, ticker: str, period: str, start: Optional[datetime] = None, max_retries: int = 3,
+               retry_delay: int = 5, api_key: Optional[str] = None, interval: str = "1d") -> pd.DataFrame:
+        """
+        Extrai o histórico de um ticker.
+
+        Args:
+            ticker: Símbolo da ação
+            period: Período dos dados
+            start: Se informado, busca apenas as barras a partir desta data
+            max_retries: Número máximo de tentativas (se o provedor suportar)
+            retry_delay: Tempo de espera entre tentativas (se o provedor suportar)
+            api_key: Chave da API (se o provedor exigir)
+            interval: Intervalo das barras ('1d', '60m', '1m', ...)
+
+        Returns:
+            DataFrame no formato padrão (Date, Open, High, Low, Close, Volume)
+        """
+
+    def registra_sucesso(self, latencia: float) -> None:
+        """Registra uma chamada bem-sucedida"""
+        self.saude.registra(latencia, True)
+        self.circuito.registra_sucesso()
+
+    def registra_falha(self, latencia: float) -> None:
+        """Registra uma chamada com falha"""
+        self.saude.registra(latencia, False)
+        self.circuito.registra_falha()
+
+    def chave_ordenacao(self, preferido: bool) -> tuple:
+        """
+        Chave de ordenação (menor = tentado antes).
+
+        Circuito fechado vem antes de semiaberto; depois, menor taxa de erro
+        (em faixas de 10%, para que pequenas variações não troquem a ordem);
+        depois, o provedor preferido; por fim, a menor latência.
+        """
+        return (
+            self.circuito.estado != CircuitBreaker.FECHADO,
+            round(self.saude.taxa_erro, 1),
+            not preferido,
+            self.saude.latencia_media,
+        )
+
+########## Registro ##########
+
+class RegistroProvedores:
+    """Registro dos provedores disponíveis, ordenados por saúde a cada requisição"""
+
+    def __init__(self):
+        self._provedores: Dict[str, ProvedorDados] = {}
+
+    def registra(self, provedor: ProvedorDados) -> None:
+        """Adiciona (ou substitui) um provedor no registro"""
+        self._provedores[provedor.nome] = provedor
+
+    def obtem(self, nome: str) -> Optional[ProvedorDados]:
+        """Retorna o provedor com o nome informado, se registrado"""
+        return self._provedores.get(nome)
+
+    def candidatos(self, preferido: Optional[str] = None, api_key: Optional[str] = None) -> List[ProvedorDados]:
+        """
+        Lista os provedores a tentar, do mais saudável ao menos saudável.
+
+        Provedores não configurados, com circuito aberto ou com a chamada de teste do semiaberto
+        em andamento são ignorados. Quem chama deve reservar a chamada (circuito.reserva()) logo antes de fazê-la.
+        Se todos os circuitos estiverem abertos, o mais saudável é tentado mesmo assim,
+        para que a requisição não falhe sem nenhuma tentativa.
+
+        Args:
+            preferido: Nome do provedor configurado como padrão (desempate)
+            api_key: Chave da API, repassada a disponivel()
+        """
+        disponiveis = [p for p in self._provedores.values() if p.disponivel(api_key)]
+        ordenados = sorted(disponiveis, key=lambda p: p.chave_ordenacao(p.nome == preferido))
+
+        liberados = [p for p in ordenados if p.circuito.permite()]
+        if not liberados and ordenados:
+            return ordenados[:1]
+        return liberados
+
+    def resumo(self) -> Dict[str, dict]:
+        """Estado de saúde de cada provedor (para diagnóstico)"""
+        return {
+            nome: {
+                "circuito": p.circuito.estado,
+                "taxa_erro": p.saude.taxa_erro,
+                "latencia_media": p.saude.latencia_media,
+            }
+            for nome, p in self._provedores.items()
+        }
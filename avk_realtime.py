@@ -0,0 +1,263 @@
+# Módulo de Cotações em Tempo Real
+# Serviço em segundo plano que consulta as últimas barras dos tickers em exibição, uma vez por
+# cadência para todas as sessões, e acrescenta as barras novas às séries mantidas em memória
+
+# Imports
+import os
+import time
+import threading
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Set, Tuple
+from avk_data_store import avk_store_mescla, avk_compacta_ohlcv
+from avk_indicators import COLUNAS_OHLCV
+from avk_validacao import avk_valida_ohlcv, avk_calendario_ticker
+from avk_data_provider import (_download_yf_lote, _alinha_tz, _get_config, avk_registro_provedores,
+                               DATA_PROVIDER, ALPHA_VANTAGE_API_KEY)
+
+########## Configuração do Serviço ##########
+
+# Cadência da consulta (segundos) e tempo sem renovação após o qual uma sessão deixa de
+# ser considerada (o Streamlit não avisa quando uma sessão é fechada)
+INTERVALO_COTACOES = float(os.getenv("AVK_INTERVALO_COTACOES", "15"))
+TEMPO_INSCRICAO = float(os.getenv("AVK_TEMPO_INSCRICAO", "120"))
+
+# Período consultado a cada ciclo: só o suficiente para cobrir a barra em andamento e a anterior
+_PERIODO_CONSULTA = {"1d": "5d"}
+_PERIODO_CONSULTA_INTRADAY = "1d"
+
+# Últimas barras da série validadas junto com as consultadas: a detecção de picos isolados estima a
+# dispersão dos retornos (ao menos 20 barras), e a última da série é vizinha da primeira barra nova
+_BARRAS_CONTEXTO = 30
+
+# Chave de uma série acompanhada: (ticker, intervalo, provedor)
+Chave = Tuple[str, str, str]
+
+def _chave(ticker: str, interval: str, provider: Optional[str]) -> Chave:
+    """Chave da série; sem provedor, usa o configurado (o mesmo da extração feita pela página)"""
+    if provider is None:
+        provider = _get_config("DATA_PROVIDER", DATA_PROVIDER)
+    return ticker.upper(), interval, provider
+
+def _no_fuso(novos: pd.DataFrame, datas: pd.Series) -> pd.DataFrame:
+    """
+    Barras novas com a coluna Date no fuso horário da série (ou sem fuso, como a série).
+
+    O Yahoo Finance retorna datas com fuso e o Alpha Vantage sem fuso; a série da sessão pode vir
+    de qualquer um deles (inclusive do provedor alternativo), e pandas não compara os dois tipos.
+    """
+    tz, tz_novos = getattr(datas.dt, 'tz', None), getattr(novos['Date'].dt, 'tz', None)
+    if tz is None and tz_novos is not None:
+        return novos.assign(Date=novos['Date'].dt.tz_localize(None))
+    if tz is not None and tz_novos is None:
+        return novos.assign(Date=novos['Date'].dt.tz_localize(tz, ambiguous=False, nonexistent="shift_forward"))
+    return novos
+
+def _consulta_provedor(provider: str, tickers: List[str], periodo: str,
+                       interval: str) -> Tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+    """
+    Últimas barras dos tickers no provedor da série.
+
+    O Yahoo Finance é consultado com um único download em lote; os demais provedores do registro,
+    um ticker por vez (respeitando o limite de requisições de cada um). Um provedor não configurado
+    é substituído pelo Yahoo Finance, como na extração.
+
+    Returns:
+        Tupla (ticker -> barras, ticker -> mensagem de erro)
+    """
+    api_key = _get_config("ALPHA_VANTAGE_API_KEY", ALPHA_VANTAGE_API_KEY)
+    provedor = avk_registro_provedores.obtem(provider)
+    if provedor is None or provedor.nome == "yfinance" or not provedor.disponivel(api_key):
+        try:
+            return _download_yf_lote(tickers, period=periodo, interval=interval), {}
+        except Exception as e:
+            return {}, {ticker: str(e) for ticker in tickers}
+
+    baixados, erros = {}, {}
+    for ticker in tickers:
+        try:
+            baixados[ticker] = provedor.extrai(ticker, periodo, None, 1, 0, api_key, interval)
+        except Exception as e:
+            erros[ticker] = str(e)
+    return baixados, erros
+
+########## Serviço de Cotações ##########
+
+class ServicoCotacoes:
+    """
+    Consulta periódica das cotações dos tickers acompanhados, compartilhada entre sessões.
+
+    Cada sessão renova a sua inscrição em (ticker, intervalo, provedor) ao exibir o gráfico; a thread
+    do serviço consulta, por intervalo e provedor, todos os tickers inscritos (um único download em
+    lote no Yahoo Finance) e acrescenta as barras novas à série em memória, incrementando a versão da série. As sessões
+    comparam a versão para saber se há algo a redesenhar, ou aguardam a próxima (aguarda).
+
+    A thread é iniciada na primeira inscrição e termina quando não resta nenhuma inscrição ativa.
+    """
+
+    def __init__(self, intervalo: float = INTERVALO_COTACOES, tempo_inscricao: float = TEMPO_INSCRICAO):
+        self.intervalo = intervalo
+        self.tempo_inscricao = tempo_inscricao
+        self._inscricoes: Dict[Chave, Dict[str, float]] = {}
+        self._series: Dict[Chave, pd.DataFrame] = {}
+        self._versoes: Dict[Chave, int] = {}
+        self._erros: Dict[Chave, str] = {}
+        self._condicao = threading.Condition()
+        self._parada = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def acompanha(self, ticker: str, interval: str, sessao: str, hist: Optional[pd.DataFrame] = None,
+                  provider: Optional[str] = None) -> Tuple[int, Optional[pd.DataFrame]]:
+        """
+        Inscreve (ou renova) a sessão no ticker e retorna a série atual.
+
+        Args:
+            ticker: Símbolo da ação
+            interval: Intervalo das barras
+            sessao: Identificador da sessão
+            hist: Histórico já extraído pela sessão, usado como base da série em memória
+                  quando ela ainda não existe ou é mais antiga
+            provider: Provedor consultado pelo serviço. Se None, usa DATA_PROVIDER
+
+        Returns:
+            Tupla (versão da série, DataFrame com o histórico mais as barras novas)
+        """
+        chave = _chave(ticker, interval, provider)
+        with self._condicao:
+            self._inscricoes.setdefault(chave, {})[sessao] = time.monotonic() + self.tempo_inscricao
+            serie = self._series.get(chave)
+            if hist is not None and not hist.empty and (
+                    serie is None or _alinha_tz(hist['Date'].iloc[-1], serie['Date']) > serie['Date'].iloc[-1]):
+                self._series[chave] = hist
+                self._versoes[chave] = self._versoes.get(chave, 0) + 1
+            versao, serie = self._versoes.get(chave, 0), self._series.get(chave)
+        self._inicia()
+        return versao, serie
+
+    def cancela(self, ticker: str, interval: str, sessao: str, provider: Optional[str] = None) -> None:
+        """Remove a inscrição da sessão (a série é descartada quando não resta nenhuma sessão)"""
+        chave = _chave(ticker, interval, provider)
+        with self._condicao:
+            sessoes = self._inscricoes.get(chave, {})
+            sessoes.pop(sessao, None)
+            if not sessoes:
+                self._descarta(chave)
+
+    def aguarda(self, ticker: str, interval: str, versao: int, timeout: float, provider: Optional[str] = None) -> int:
+        """
+        Bloqueia até a série passar da versão informada ou o timeout expirar.
+
+        Returns:
+            Versão atual da série
+        """
+        chave = _chave(ticker, interval, provider)
+        with self._condicao:
+            self._condicao.wait_for(lambda: self._versoes.get(chave, 0) != versao, timeout)
+            return self._versoes.get(chave, 0)
+
+    def erro(self, ticker: str, interval: str, provider: Optional[str] = None) -> Optional[str]:
+        """Mensagem do último ciclo que falhou para o ticker (None se o último ciclo teve sucesso)"""
+        with self._condicao:
+            return self._erros.get(_chave(ticker, interval, provider))
+
+    def ativos(self) -> Set[Chave]:
+        """Séries com ao menos uma inscrição válida"""
+        agora = time.monotonic()
+        with self._condicao:
+            return {chave for chave, sessoes in self._inscricoes.items()
+                    if any(expira > agora for expira in sessoes.values())}
+
+    def para(self) -> None:
+        """Encerra a thread do serviço (uma nova inscrição a inicia novamente)"""
+        self._parada.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _descarta(self, chave: Chave) -> None:
+        """Remove a série e seus dados (chamado com a condição adquirida)"""
+        self._inscricoes.pop(chave, None)
+        self._series.pop(chave, None)
+        self._versoes.pop(chave, None)
+        self._erros.pop(chave, None)
+
+    def _inicia(self) -> None:
+        with self._condicao:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._parada.clear()
+            self._thread = threading.Thread(target=self._executa, name="avk-cotacoes", daemon=True)
+            self._thread.start()
+
+    def _executa(self) -> None:
+        """Laço da thread: um ciclo de consulta a cada intervalo, enquanto houver inscrições"""
+        while not self._parada.wait(self.intervalo):
+            if not self._remove_expiradas():
+                with self._condicao:
+                    # Confere de novo sob a condição: uma inscrição pode ter chegado agora
+                    if not self._inscricoes:
+                        self._thread = None
+                        return
+            self.consulta()
+
+    def _remove_expiradas(self) -> bool:
+        """Descarta as inscrições vencidas. Retorna False se não restou nenhuma"""
+        agora = time.monotonic()
+        with self._condicao:
+            for chave in list(self._inscricoes):
+                sessoes = self._inscricoes[chave]
+                for sessao in [s for s, expira in sessoes.items() if expira <= agora]:
+                    del sessoes[sessao]
+                if not sessoes:
+                    self._descarta(chave)
+            return bool(self._inscricoes)
+
+    def consulta(self) -> None:
+        """
+        Executa um ciclo: uma consulta por intervalo e provedor com todos os tickers acompanhados.
+
+        Apenas as últimas barras são baixadas, validadas (avk_valida_ohlcv, como na extração) e
+        mescladas às séries em memória; a versão só muda (e as sessões só são acordadas) quando
+        alguma barra é nova ou foi revisada.
+        Uma falha ao mesclar um ticker fica registrada no seu erro, sem interromper o ciclo.
+        """
+        por_consulta: Dict[Tuple[str, str], list] = {}
+        for ticker, interval, provider in sorted(self.ativos()):
+            por_consulta.setdefault((interval, provider), []).append(ticker)
+
+        for (interval, provider), tickers in por_consulta.items():
+            periodo = _PERIODO_CONSULTA.get(interval, _PERIODO_CONSULTA_INTRADAY)
+            baixados, erros = _consulta_provedor(provider, tickers, periodo, interval)
+
+            with self._condicao:
+                for ticker in tickers:
+                    chave = (ticker, interval, provider)
+                    if chave not in self._inscricoes:
+                        continue
+                    novos = baixados.get(ticker)
+                    self._erros[chave] = erros.get(ticker) or (None if novos is not None else "Sem cotações recentes")
+                    serie = self._series.get(chave)
+                    if novos is None or novos.empty or serie is None:
+                        continue
+                    try:
+                        # Apenas as barras a partir da última da série (a última pode ter sido revisada),
+                        # no esquema compacto da série para que a comparação abaixo seja exata
+                        novos = _no_fuso(avk_compacta_ohlcv(novos), serie['Date'])
+                        novos = novos[novos['Date'] >= serie['Date'].iloc[-1]]
+                        if not novos.empty:
+                            # Desdobramentos não são procurados: a janela é curta demais para confirmá-los
+                            # pelo volume, e um evento novo é tratado pela extração (novo download completo)
+                            contexto = avk_store_mescla(serie.iloc[-_BARRAS_CONTEXTO:], novos, deduplica=False)
+                            novos, _ = avk_valida_ohlcv(contexto, interval, avk_calendario_ticker(ticker),
+                                                        ajusta_desdobramentos=False)
+                            novos = novos[novos['Date'] >= serie['Date'].iloc[-1]]
+                        if novos.empty or (len(novos) == 1 and np.array_equal(
+                                novos[COLUNAS_OHLCV].to_numpy(), serie[COLUNAS_OHLCV].iloc[-1:].to_numpy())):
+                            continue
+                        self._series[chave] = avk_store_mescla(serie, novos)
+                        self._versoes[chave] += 1
+                    except Exception as e:
+                        self._erros[chave] = str(e)
+                self._condicao.notify_all()
+
+# Instância do processo, compartilhada por todas as sessões do Streamlit
+avk_servico_cotacoes = ServicoCotacoes()
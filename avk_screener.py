@@ -0,0 +1,154 @@
+# Módulo de Screener
+# Ranking de uma lista de ações (retornos, volatilidade, picos de volume e cruzamentos de médias)
+# calculado em uma única passagem vetorizada sobre o histórico empilhado de todos os tickers
+
+# Imports
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+from avk_indicators import avk_empilha_ohlcv, avk_calcula_indicadores
+from avk_data_provider import avk_extrai_dados_batch
+
+# Tente importar Streamlit (opcional, para uso em scripts não-Streamlit)
+try:
+    import streamlit as st
+    STREAMLIT_AVAILABLE = True
+except ImportError:
+    STREAMLIT_AVAILABLE = False
+    st = None
+
+########## Configuração do Screener ##########
+
+# Lista padrão de ações (Nasdaq)
+WATCHLIST_PADRAO = [
+    "AAPL", "MSFT", "NVDA", "AMZN", "GOOG", "META", "TSLA", "AVGO", "COST", "NFLX",
+    "AMD", "ADBE", "PEP", "CSCO", "INTC", "QCOM", "TXN", "AMGN", "INTU", "ISRG",
+    "BKNG", "SBUX", "GILD", "MDLZ", "ADP", "REGN", "VRTX", "PYPL", "MU", "PANW",
+]
+
+# Métricas e parâmetros (em barras)
+CONFIG_SCREENER_PADRAO = {
+    "retornos": (1, 5, 21),          # Horizontes dos retornos
+    "janela_volatilidade": 21,       # Barras usadas na volatilidade
+    "janela_volume": 20,             # Barras da média de volume usada no pico de volume
+    "medias": (20, 50),              # Médias simples (rápida, lenta) do cruzamento
+    "barras_cruzamento": 5,          # Cruzamentos considerados recentes
+    "rsi": 14,                       # Período do RSI
+}
+
+# Fator de anualização da volatilidade (pregões por ano, barras diárias)
+BARRAS_POR_ANO = 252
+
+########## Cálculo Vetorizado ##########
+
+def _barras_necessarias(config: dict) -> int:
+    """Menor histórico (em barras) com o qual todas as métricas podem ser calculadas"""
+    return max(
+        max(config["retornos"]) + 1,
+        config["janela_volatilidade"] + 1,
+        config["janela_volume"] + 1,
+        max(config["medias"]) + config["barras_cruzamento"],
+        config["rsi"] + 1,
+    )
+
+def avk_screener_metricas(frames: Dict[str, pd.DataFrame],
+                          config: Optional[dict] = None) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Calcula as métricas do screener para todos os tickers de uma vez.
+
+    Os históricos são empilhados em um array (n_tickers, n_barras, 5) alinhado pelas
+    barras mais recentes, e cada métrica é uma operação NumPy sobre o eixo do tempo.
+
+    Args:
+        frames: Dicionário ticker -> DataFrame no formato padrão
+        config: Parâmetros das métricas (mesmo formato de CONFIG_SCREENER_PADRAO). Se None, usa o padrão
+
+    Returns:
+        Tupla (DataFrame com uma linha por ticker, lista de tickers sem histórico suficiente)
+    """
+    config = CONFIG_SCREENER_PADRAO if config is None else config
+    minimo = _barras_necessarias(config)
+
+    # Alinha pelo menor histórico entre os tickers que têm barras suficientes
+    tamanhos = {ticker: len(hist) for ticker, hist in frames.items() if hist is not None}
+    suficientes = [tamanho for tamanho in tamanhos.values() if tamanho >= minimo]
+    if not suficientes:
+        return pd.DataFrame(), sorted(frames)
+    tickers, ohlcv = avk_empilha_ohlcv(frames, min(suficientes))
+    excluidos = sorted(set(frames) - set(tickers))
+
+    close, volume = ohlcv[..., 3], ohlcv[..., 4]
+    metricas = {"Ticker": tickers, "Preço": close[:, -1]}
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Retornos (%) em cada horizonte
+        for horizonte in config["retornos"]:
+            metricas[f"Retorno {horizonte}b (%)"] = (close[:, -1] / close[:, -1 - horizonte] - 1) * 100
+
+        # Volatilidade anualizada (%) dos retornos logarítmicos
+        janela = config["janela_volatilidade"]
+        log_retornos = np.diff(np.log(close[:, -(janela + 1):]), axis=1)
+        metricas["Volatilidade (%)"] = np.std(log_retornos, axis=1, ddof=1) * np.sqrt(BARRAS_POR_ANO) * 100
+
+        # Pico de volume: volume da última barra sobre a média das barras anteriores
+        janela = config["janela_volume"]
+        metricas["Pico de Volume (x)"] = volume[:, -1] / np.nanmean(volume[:, -(janela + 1):-1], axis=1)
+
+    # Médias do cruzamento e RSI em uma única chamada do motor de indicadores
+    rapida, lenta = config["medias"]
+    indicadores = avk_calcula_indicadores(ohlcv, {"sma": (rapida, lenta), "rsi": config["rsi"]})
+    metricas[f"RSI {config['rsi']}"] = indicadores[f"RSI_{config['rsi']}"][:, -1]
+
+    # Cruzamento recente: mudança de sinal de (rápida - lenta) nas últimas barras
+    # +1 = rápida cruzou para cima (alta), -1 = cruzou para baixo (baixa), 0 = sem cruzamento
+    barras = config["barras_cruzamento"]
+    sinal = np.sign(indicadores[f"SMA_{rapida}"][:, -(barras + 1):] - indicadores[f"SMA_{lenta}"][:, -(barras + 1):])
+    mudancas = np.diff(sinal, axis=1)
+    tem_mudanca = mudancas != 0
+    # Última mudança de cada linha (argmax na ordem invertida)
+    ultima = mudancas.shape[1] - 1 - np.argmax(tem_mudanca[:, ::-1], axis=1)
+    cruzamento = np.where(tem_mudanca.any(axis=1),
+                          np.sign(mudancas[np.arange(len(tickers)), ultima]), 0).astype(int)
+    metricas["Cruzamento"] = np.select([cruzamento > 0, cruzamento < 0], ["Alta", "Baixa"], "")
+    metricas["Tendência"] = np.where(sinal[:, -1] > 0, "Alta", "Baixa")
+
+    return pd.DataFrame(metricas), excluidos
+
+def _executa_screener_impl(tickers: Tuple[str, ...], period: str) -> Tuple[pd.DataFrame, Dict[str, str], List[str]]:
+    """Extrai os históricos em lote e calcula as métricas"""
+    dados, erros = avk_extrai_dados_batch(list(tickers), period)
+    ranking, excluidos = avk_screener_metricas(dados)
+    return ranking, erros, excluidos
+
+# Cache das execuções: reordenar ou filtrar o ranking não extrai nem recalcula nada
+if STREAMLIT_AVAILABLE:
+    @st.cache_data(ttl=300, show_spinner=False)
+    def avk_executa_screener(tickers: Tuple[str, ...], period: str = "1y") -> Tuple[pd.DataFrame, Dict[str, str], List[str]]:
+        """Wrapper com cache para uso no Streamlit"""
+        return _executa_screener_impl(tickers, period)
+else:
+    def avk_executa_screener(tickers: Tuple[str, ...], period: str = "1y") -> Tuple[pd.DataFrame, Dict[str, str], List[str]]:
+        """Wrapper sem cache para uso fora do Streamlit"""
+        return _executa_screener_impl(tickers, period)
+
+def avk_filtra_ranking(ranking: pd.DataFrame, ordenar_por: str, crescente: bool = False,
+                       pico_volume_minimo: float = 0.0, cruzamentos: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Filtra e ordena o ranking (operações leves sobre o resultado já calculado).
+
+    Args:
+        ranking: DataFrame retornado por avk_executa_screener
+        ordenar_por: Coluna usada na ordenação
+        crescente: Ordem crescente (padrão: decrescente)
+        pico_volume_minimo: Mantém apenas tickers com pico de volume a partir deste valor
+        cruzamentos: Mantém apenas estes tipos de cruzamento ('Alta', 'Baixa'); None = todos
+
+    Returns:
+        DataFrame filtrado e ordenado, com a posição no ranking
+    """
+    filtrado = ranking[ranking["Pico de Volume (x)"].fillna(0) >= pico_volume_minimo]
+    if cruzamentos:
+        filtrado = filtrado[filtrado["Cruzamento"].isin(cruzamentos)]
+    filtrado = filtrado.sort_values(ordenar_por, ascending=crescente, na_position="last")
+    filtrado.insert(0, "Posição", np.arange(1, len(filtrado) + 1))
+    return filtrado.reset_index(drop=True)
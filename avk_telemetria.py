@@ -0,0 +1,344 @@
+# Módulo de Telemetria
+# Spans e contadores leves nos pontos críticos (extração, provedores, caches, agente de IA, gráficos),
+# com exportação em formato Prometheus, log JSON e um painel de depuração na barra lateral
+
+# Imports
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+########## Configuração da Telemetria ##########
+
+# Arquivo de log (uma linha JSON por execução, ex: clique em "Analisar"); vazio = desativado
+ARQUIVO_LOG_TELEMETRIA = os.getenv("AVK_TELEMETRIA_LOG", "")
+
+# Porta do endpoint local de métricas (http://127.0.0.1:<porta>/metrics); 0 = desativado
+PORTA_METRICAS = int(os.getenv("AVK_TELEMETRIA_PORTA", "0"))
+
+# Limites (segundos) dos buckets do histograma de duração dos spans
+BUCKETS_DURACAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Rótulos de uma métrica, em ordem fixa: (('cache', 'dados'), ('resultado', 'acerto'))
+Rotulos = Tuple[Tuple[str, str], ...]
+
+########## Execuções e Spans ##########
+
+class Span:
+    """Trecho medido de uma execução (nome, início relativo, duração e atributos)"""
+
+    __slots__ = ("nome", "atributos", "inicio", "duracao", "profundidade", "thread")
+
+    def __init__(self, nome: str, atributos: dict, profundidade: int):
+        self.nome = nome
+        self.atributos = atributos
+        self.inicio = time.perf_counter()
+        self.duracao: Optional[float] = None
+        self.profundidade = profundidade
+        self.thread = threading.current_thread().name
+
+    def anota(self, **atributos) -> None:
+        """Acrescenta atributos ao span (ex: provedor usado, número de barras)"""
+        self.atributos.update(atributos)
+
+class Execucao:
+    """
+    Conjunto dos spans de uma execução (ex: um clique em "Analisar").
+
+    Os spans de threads iniciadas com avk_contexto_atual().run(...) também são registrados aqui.
+    """
+
+    def __init__(self, nome: str, atributos: dict):
+        self.nome = nome
+        self.atributos = atributos
+        self.inicio = time.perf_counter()
+        self.inicio_utc = datetime.now(timezone.utc)
+        self.duracao: Optional[float] = None
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def adiciona(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def resumo(self) -> dict:
+        """Execução serializável: spans em ordem de início, com tempos em milissegundos"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.inicio)
+        return {
+            "execucao": self.nome,
+            "inicio": self.inicio_utc.isoformat(),
+            "duracao_ms": round((self.duracao or 0.0) * 1000, 3),
+            "atributos": self.atributos,
+            "spans": [{
+                "nome": span.nome,
+                "inicio_ms": round((span.inicio - self.inicio) * 1000, 3),
+                "duracao_ms": round(span.duracao * 1000, 3) if span.duracao is not None else None,
+                "profundidade": span.profundidade,
+                "thread": span.thread,
+                "atributos": span.atributos,
+            } for span in spans],
+        }
+
+# Execução e span atuais (por thread / contexto)
+_EXECUCAO_ATUAL: contextvars.ContextVar[Optional[Execucao]] = contextvars.ContextVar("avk_execucao", default=None)
+_SPAN_ATUAL: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("avk_span", default=None)
+
+@contextmanager
+def avk_execucao(nome: str, **atributos) -> Iterator[Execucao]:
+    """
+    Agrupa os spans de uma execução; ao final, grava a execução no log JSON (se configurado).
+
+    Args:
+        nome: Nome da execução (ex: 'analisar')
+        **atributos: Atributos da execução (ex: ticker, intervalo)
+
+    Yields:
+        A execução, cujo resumo() traz a divisão do tempo entre os spans
+    """
+    execucao = Execucao(nome, atributos)
+    token_execucao = _EXECUCAO_ATUAL.set(execucao)
+    token_span = _SPAN_ATUAL.set(None)
+    try:
+        yield execucao
+    finally:
+        execucao.duracao = time.perf_counter() - execucao.inicio
+        _SPAN_ATUAL.reset(token_span)
+        _EXECUCAO_ATUAL.reset(token_execucao)
+        _grava_log(execucao)
+
+@contextmanager
+def avk_span(nome: str, **atributos) -> Iterator[Span]:
+    """
+    Mede um trecho de código.
+
+    A duração entra no histograma do span (exportado para o Prometheus) e, dentro de
+    uma execução, o span também é registrado nela para o painel e o log JSON.
+
+    Args:
+        nome: Nome do span (ex: 'extracao', 'yfinance.history')
+        **atributos: Atributos do span (ex: ticker)
+
+    Yields:
+        O span, que pode receber atributos durante o trecho (span.anota)
+    """
+    pai = _SPAN_ATUAL.get()
+    span = Span(nome, atributos, pai.profundidade + 1 if pai is not None else 0)
+    token = _SPAN_ATUAL.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.atributos.setdefault("erro", type(e).__name__)
+        raise
+    finally:
+        span.duracao = time.perf_counter() - span.inicio
+        _SPAN_ATUAL.reset(token)
+        _registra_duracao(nome, span.duracao)
+        execucao = _EXECUCAO_ATUAL.get()
+        if execucao is not None:
+            execucao.adiciona(span)
+
+def avk_anota(**atributos) -> None:
+    """Acrescenta atributos ao span atual (sem efeito fora de um span)"""
+    span = _SPAN_ATUAL.get()
+    if span is not None:
+        span.anota(**atributos)
+
+def avk_contexto_atual() -> contextvars.Context:
+    """
+    Cópia do contexto atual, para threads que devem registrar seus spans na execução atual.
+
+    Ex: threading.Thread(target=avk_contexto_atual().run, args=(funcao, ...))
+    """
+    return contextvars.copy_context()
+
+########## Contadores e Histogramas ##########
+
+_lock_metricas = threading.Lock()
+_CONTADORES: Dict[str, Dict[Rotulos, float]] = {}
+_HISTOGRAMAS: Dict[str, Dict[str, list]] = {}
+
+def avk_incrementa(nome: str, valor: float = 1, **rotulos) -> None:
+    """
+    Incrementa um contador (ex: avk_incrementa('avk_retentativas_total', provedor='yfinance')).
+
+    Args:
+        nome: Nome do contador no formato Prometheus (terminado em _total)
+        valor: Incremento
+        **rotulos: Rótulos da série
+    """
+    chave = tuple(sorted((k, str(v)) for k, v in rotulos.items()))
+    with _lock_metricas:
+        serie = _CONTADORES.setdefault(nome, {})
+        serie[chave] = serie.get(chave, 0) + valor
+
+def avk_registra_cache(cache: str, acerto: bool) -> None:
+    """Registra uma consulta a um cache (acerto ou falta)"""
+    avk_incrementa("avk_cache_total", cache=cache, resultado="acerto" if acerto else "falta")
+
+def avk_taxas_acerto() -> Dict[str, Tuple[float, int]]:
+    """Taxa de acerto de cada cache desde o início do processo: nome -> (taxa, consultas)"""
+    with _lock_metricas:
+        serie = dict(_CONTADORES.get("avk_cache_total", {}))
+    totais: Dict[str, List[float]] = {}
+    for rotulos, valor in serie.items():
+        rotulos = dict(rotulos)
+        acertos, consultas = totais.setdefault(rotulos["cache"], [0, 0])
+        totais[rotulos["cache"]] = [acertos + (valor if rotulos["resultado"] == "acerto" else 0), consultas + valor]
+    return {cache: (acertos / consultas if consultas else 0.0, int(consultas))
+            for cache, (acertos, consultas) in totais.items()}
+
+def _registra_duracao(nome: str, duracao: float) -> None:
+    """Acrescenta uma duração ao histograma do span: [contagens por bucket, soma, total]"""
+    with _lock_metricas:
+        histograma = _HISTOGRAMAS.get(nome)
+        if histograma is None:
+            histograma = _HISTOGRAMAS[nome] = [[0] * len(BUCKETS_DURACAO), 0.0, 0]
+        for i, limite in enumerate(BUCKETS_DURACAO):
+            if duracao <= limite:
+                histograma[0][i] += 1
+                break
+        histograma[1] += duracao
+        histograma[2] += 1
+
+########## Exportação ##########
+
+def _escapa_rotulo(valor: str) -> str:
+    """Escapa barra invertida, aspas e quebra de linha no valor de um rótulo"""
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _formata_rotulos(rotulos: Rotulos) -> str:
+    """Rótulos no formato {nome="valor",...}"""
+    if not rotulos:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapa_rotulo(valor)}"' for nome, valor in rotulos) + "}"
+
+def avk_metricas_prometheus() -> str:
+    """Contadores e histogramas no formato de texto do Prometheus"""
+    with _lock_metricas:
+        contadores = {nome: dict(serie) for nome, serie in _CONTADORES.items()}
+        histogramas = {nome: (list(h[0]), h[1], h[2]) for nome, h in _HISTOGRAMAS.items()}
+
+    linhas = []
+    for nome in sorted(contadores):
+        linhas.append(f"# TYPE {nome} counter")
+        for rotulos, valor in sorted(contadores[nome].items()):
+            linhas.append(f"{nome}{_formata_rotulos(rotulos)} {valor:g}")
+
+    if histogramas:
+        linhas.append("# TYPE avk_span_duracao_segundos histogram")
+    for span in sorted(histogramas):
+        contagens, soma, total = histogramas[span]
+        acumulado = 0
+        for limite, contagem in zip(BUCKETS_DURACAO, contagens):
+            acumulado += contagem
+            linhas.append(f'avk_span_duracao_segundos_bucket{{span="{span}",le="{limite:g}"}} {acumulado}')
+        linhas.append(f'avk_span_duracao_segundos_bucket{{span="{span}",le="+Inf"}} {total}')
+        linhas.append(f'avk_span_duracao_segundos_sum{{span="{span}"}} {soma:.6f}')
+        linhas.append(f'avk_span_duracao_segundos_count{{span="{span}"}} {total}')
+    return "\n".join(linhas) + "\n"
+
+def avk_metricas_json() -> dict:
+    """Contadores, duração média dos spans e taxas de acerto dos caches, em um dicionário serializável"""
+    with _lock_metricas:
+        contadores = {nome: [{"rotulos": dict(rotulos), "valor": valor} for rotulos, valor in serie.items()]
+                      for nome, serie in _CONTADORES.items()}
+        spans = {nome: {"total": h[2], "media_ms": round(h[1] / h[2] * 1000, 3) if h[2] else 0.0}
+                 for nome, h in _HISTOGRAMAS.items()}
+    caches = {cache: {"taxa_acerto": round(taxa, 4), "consultas": consultas}
+              for cache, (taxa, consultas) in avk_taxas_acerto().items()}
+    return {"contadores": contadores, "spans": spans, "caches": caches}
+
+_lock_log = threading.Lock()
+
+def _grava_log(execucao: Execucao) -> None:
+    """Acrescenta a execução ao log JSON (uma linha por execução); falhas de escrita são ignoradas"""
+    if not ARQUIVO_LOG_TELEMETRIA:
+        return
+    try:
+        linha = json.dumps(execucao.resumo(), ensure_ascii=False, default=str)
+        with _lock_log, open(ARQUIVO_LOG_TELEMETRIA, "a", encoding="utf-8") as arquivo:
+            arquivo.write(linha + "\n")
+    except OSError:
+        pass
+
+_servidor = None
+_lock_servidor = threading.Lock()
+
+def avk_inicia_servidor_metricas(porta: int = PORTA_METRICAS) -> bool:
+    """
+    Inicia (uma vez por processo) o endpoint local de métricas em uma thread.
+
+    Rotas: /metrics (Prometheus) e /metrics.json. Chamadas repetidas (ex: a cada
+    reexecução do script do Streamlit) não fazem nada.
+
+    Returns:
+        True se o endpoint estiver ativo
+    """
+    global _servidor
+    if not porta:
+        return False
+    with _lock_servidor:
+        if _servidor is not None:
+            return True
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    corpo, tipo = avk_metricas_prometheus().encode(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    corpo, tipo = json.dumps(avk_metricas_json()).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", tipo)
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            _servidor = ThreadingHTTPServer(("127.0.0.1", porta), _Handler)
+        except OSError:
+            # Porta em uso (ex: outro processo da app): segue sem o endpoint
+            return False
+        threading.Thread(target=_servidor.serve_forever, name="avk-metricas", daemon=True).start()
+        return True
+
+########## Painel de Depuração ##########
+
+def avk_painel_telemetria(resumo: Optional[dict]) -> None:
+    """
+    Exibe na barra lateral a divisão do tempo da última execução e as taxas de acerto dos caches.
+
+    Args:
+        resumo: Execucao.resumo() da última execução (None se ainda não houve)
+    """
+    import streamlit as st
+
+    with st.sidebar.expander("⏱️ Desempenho", expanded=True):
+        if not resumo:
+            st.caption("Nenhuma execução registrada nesta sessão.")
+        else:
+            st.markdown(f"**{resumo['execucao']}**: {resumo['duracao_ms']:.0f} ms")
+            st.dataframe(
+                [{"Etapa": " " * span["profundidade"] + span["nome"],
+                  "Início (ms)": span["inicio_ms"],
+                  "Duração (ms)": span["duracao_ms"],
+                  "Detalhes": ", ".join(f"{k}={v}" for k, v in span["atributos"].items())}
+                 for span in resumo["spans"]],
+                hide_index=True, use_container_width=True
+            )
+        taxas = avk_taxas_acerto()
+        if taxas:
+            st.markdown("**Caches (processo)**")
+            for cache, (taxa, consultas) in sorted(taxas.items()):
+                st.caption(f"{cache}: {taxa:.0%} de acerto em {consultas} consultas")
@@ -0,0 +1,370 @@
+# Módulo de Validação de Dados
+# Etapa única e vetorizada de limpeza do histórico OHLCV de todos os provedores: ordena, remove
+# duplicatas e barras inválidas, ajusta desdobramentos, corrige outliers e preenche lacunas do pregão
+
+# Imports
+import re
+import time
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from pandas.tseries.holiday import (AbstractHolidayCalendar, Holiday, GoodFriday, USMartinLutherKingJr,
+                                    USPresidentsDay, USMemorialDay, USLaborDay, USThanksgivingDay,
+                                    nearest_workday, sunday_to_monday)
+from avk_data_store import COLUNAS_PRECO, avk_compacta_ohlcv
+
+########## Configuração da Validação ##########
+
+# Desdobramento: a razão entre o fechamento anterior e a abertura seguinte fica a até 3% de n ou 1/n
+# (n inteiro entre 2 e FATOR_MAXIMO_DESDOBRAMENTO), folga que absorve a variação normal entre pregões
+FOLGA_DESDOBRAMENTO = 0.03
+FATOR_MAXIMO_DESDOBRAMENTO = 50
+
+# Confirmação do desdobramento pelo volume: a mediana do volume nas JANELA_VOLUME_DESDOBRAMENTO barras
+# após o salto, dividida pela das barras anteriores, deve acompanhar o fator (ao menos a raiz dele, no
+# sentido inverso ao do preço). Uma queda real (ex: resultado ruim) com volume estável não é ajustada
+JANELA_VOLUME_DESDOBRAMENTO = 10
+
+# Outlier: barra cujos retornos de entrada e de saída passam deste número de desvios robustos (MAD)
+# com sinais opostos, ou seja, um pico isolado que volta ao nível anterior na barra seguinte
+LIMITE_OUTLIER = 10.0
+
+# Duração das barras intradiárias em segundos, usada no preenchimento de lacunas
+_SEGUNDOS_INTERVALO = {"1m": 60, "2m": 120, "5m": 300, "15m": 900, "30m": 1800, "60m": 3600, "90m": 5400, "1h": 3600}
+
+_NS_DIA = 86_400 * 10**9
+
+# Contadores do resumo que representam correções aplicadas ao histórico
+_CORRECOES = ("invalidas", "duplicadas", "maxima_minima", "outliers", "lacunas")
+
+########## Calendário de Pregões ##########
+
+class CalendarioNYSE(AbstractHolidayCalendar):
+    """Feriados regulares da NYSE (fechamentos extraordinários, como dias de luto oficial, não estão incluídos)"""
+    rules = [
+        # Ano Novo em um sábado não é compensado na sexta-feira anterior
+        Holiday("Ano Novo", month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday("Juneteenth", month=6, day=19, start_date="2022-01-01", observance=nearest_workday),
+        Holiday("Independência", month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday("Natal", month=12, day=25, observance=nearest_workday),
+    ]
+
+_CALENDARIOS = {"nyse": CalendarioNYSE}
+
+@lru_cache(maxsize=None)
+def _dias_pregao(calendario: str) -> np.busdaycalendar:
+    """Dias de pregão de um calendário, para as funções vetorizadas do NumPy (feriados calculados uma única vez)"""
+    feriados = _CALENDARIOS[calendario]().holidays(start="1970-01-01", end="2100-12-31")
+    return np.busdaycalendar(holidays=feriados.values.astype("datetime64[D]"))
+
+def avk_calendario_ticker(ticker: str) -> Optional[str]:
+    """
+    Calendário de pregões de um ticker, para o preenchimento de lacunas das barras diárias.
+
+    Ações americanas no formato do Yahoo (ex: MSFT, BRK-B) usam o calendário da NYSE. Tickers com
+    sufixo de bolsa estrangeira (ex: PETR4.SA), índices (^...), câmbio (=X), futuros (=F) e
+    criptomoedas (BTC-USD) não têm calendário, e suas lacunas diárias não são preenchidas.
+    """
+    return "nyse" if re.fullmatch(r"[A-Z0-9]+(-[A-Z])?", ticker.upper()) else None
+
+########## Validação ##########
+
+def avk_houve_correcoes(qualidade: Optional[dict]) -> bool:
+    """Se a validação alterou o histórico (o resumo de avk_valida_ohlcv tem alguma correção)"""
+    return bool(qualidade) and (
+        qualidade.get("fora_de_ordem", False) or bool(qualidade.get("desdobramentos"))
+        or any(qualidade.get(chave, 0) for chave in _CORRECOES)
+    )
+
+def avk_resumo_qualidade(qualidade: Optional[dict]) -> str:
+    """
+    Descreve em uma linha as correções e alertas de um resumo de qualidade.
+
+    Returns:
+        Texto como "2 duplicadas removidas, desdobramento 4:1 em 2024-06-10", ou "" sem ocorrências
+    """
+    if not qualidade:
+        return ""
+    partes = []
+    if qualidade.get("invalidas"):
+        partes.append(f"{qualidade['invalidas']} barras inválidas removidas")
+    if qualidade.get("duplicadas"):
+        partes.append(f"{qualidade['duplicadas']} duplicadas removidas")
+    if qualidade.get("fora_de_ordem"):
+        partes.append("datas reordenadas")
+    if qualidade.get("maxima_minima"):
+        partes.append(f"{qualidade['maxima_minima']} máximas/mínimas corrigidas")
+    for desdobramento in qualidade.get("desdobramentos", []):
+        fator = desdobramento["fator"]
+        proporcao = f"{fator:g}:1" if fator >= 1 else f"1:{1 / fator:g}"
+        partes.append(f"desdobramento {proporcao} em {desdobramento['data']}")
+    if qualidade.get("outliers"):
+        partes.append(f"{qualidade['outliers']} outliers corrigidos")
+    if qualidade.get("lacunas"):
+        partes.append(f"{qualidade['lacunas']} lacunas preenchidas")
+    if qualidade.get("volume_zero"):
+        partes.append(f"{qualidade['volume_zero']} barras sem volume")
+    return ", ".join(partes)
+
+def _ordena_sem_duplicatas(datas: np.ndarray) -> Tuple[Optional[np.ndarray], int, bool, int]:
+    """
+    Índices que deixam as datas válidas em ordem e sem duplicatas (a última ocorrência de cada data é mantida).
+
+    Args:
+        datas: Datas em nanossegundos desde a época (NaT como o menor int64)
+
+    Returns:
+        Tupla (índices, ou None se nada mudar; barras sem data; se foi preciso ordenar; duplicatas removidas)
+    """
+    indices = None
+    validas = datas != np.iinfo(np.int64).min
+    invalidas = len(datas) - int(validas.sum())
+    if invalidas:
+        indices = np.flatnonzero(validas)
+        datas = datas[indices]
+
+    # Ordena apenas se necessário; a ordenação estável mantém a ordem de chegada das datas repetidas
+    fora_de_ordem = len(datas) > 1 and not bool(np.all(datas[1:] >= datas[:-1]))
+    if fora_de_ordem:
+        ordem = np.argsort(datas, kind="stable")
+        indices = ordem if indices is None else indices[ordem]
+        datas = datas[ordem]
+
+    unicas = np.ones(len(datas), dtype=bool)
+    unicas[:-1] = datas[1:] != datas[:-1]
+    duplicadas = len(datas) - int(unicas.sum())
+    if duplicadas:
+        indices = np.flatnonzero(unicas) if indices is None else indices[unicas]
+    return indices, invalidas, fora_de_ordem, duplicadas
+
+def _volume_confirma(volume: Optional[np.ndarray], posicoes: np.ndarray, fatores: np.ndarray) -> np.ndarray:
+    """
+    Quais saltos de preço candidatos a desdobramento são acompanhados pelo volume.
+
+    Após um desdobramento n:1 o volume negociado passa a ser ~n vezes maior (1/n no grupamento).
+    Compara a mediana do volume (barras com negociação) em janelas antes e depois de cada salto.
+
+    Returns:
+        Máscara booleana sobre as posições (tudo False sem volume)
+    """
+    confirmados = np.zeros(len(posicoes), dtype=bool)
+    if volume is None:
+        return confirmados
+    for i, (posicao, fator) in enumerate(zip(posicoes, fatores)):
+        antes = volume[max(0, posicao - JANELA_VOLUME_DESDOBRAMENTO):posicao]
+        depois = volume[posicao:posicao + JANELA_VOLUME_DESDOBRAMENTO]
+        antes, depois = antes[antes > 0], depois[depois > 0]
+        if antes.size and depois.size:
+            variacao = np.log(np.median(depois) / np.median(antes))
+            # Mesmo sentido do fator e ao menos metade da sua magnitude, em escala logarítmica
+            confirmados[i] = variacao / np.log(fator) >= 0.5
+    return confirmados
+
+def avk_valida_ohlcv(dados: pd.DataFrame, interval: str = "1d", calendario: Optional[str] = None,
+                     ajusta_desdobramentos: bool = True) -> Tuple[pd.DataFrame, dict]:
+    """
+    Valida e limpa um histórico OHLCV em uma única passagem vetorizada.
+
+    As colunas são lidas uma vez como arrays NumPy; cada etapa opera sobre os arrays (copiando apenas
+    as colunas que corrige) e o DataFrame de saída é montado uma única vez. Sem correções, o próprio
+    histórico recebido é devolvido. Etapas, em ordem:
+    1. Remove barras sem data ou com preço ausente ou não positivo
+    2. Ordena (apenas se necessário) e remove datas duplicadas, mantendo a última ocorrência
+    3. Corrige máximas abaixo e mínimas acima da abertura/fechamento
+    4. Ajusta desdobramentos confirmados pelo volume: as barras anteriores têm os preços divididos e o
+       volume multiplicado pelo fator (sem volume não há confirmação, e o histórico não é ajustado)
+    5. Substitui picos isolados de fechamento (outliers) pela média dos fechamentos vizinhos
+    6. Preenche lacunas com barras sem negociação (preços no último fechamento, volume 0): dias de pregão
+       do calendário nas barras diárias; barras faltantes dentro de cada pregão nas intradiárias
+    Barras com volume zero são mantidas (índices não têm volume) e apenas contadas no resumo.
+
+    A validação é idempotente: um histórico já validado passa sem alterações.
+
+    Args:
+        dados: Histórico com Date e colunas OHLCV (Close obrigatório), de preferência no esquema compacto
+        interval: Intervalo das barras ('1d', '60m', '15m', '5m', '1m', ...)
+        calendario: Calendário de pregões das barras diárias (ver avk_calendario_ticker); None não preenche
+        ajusta_desdobramentos: Se False, não procura desdobramentos; use True apenas para preços não
+            ajustados pelo provedor (ex: Alpha Vantage get_daily)
+
+    Returns:
+        Tupla (histórico validado, resumo de qualidade com os contadores de cada etapa)
+    """
+    inicio = time.perf_counter()
+    qualidade = {"barras": 0 if dados is None else len(dados), "invalidas": 0, "duplicadas": 0,
+                 "fora_de_ordem": False, "maxima_minima": 0, "desdobramentos": [], "outliers": 0,
+                 "lacunas": 0, "volume_zero": 0}
+    if dados is None or dados.empty or 'Close' not in dados:
+        return dados, qualidade
+
+    datas = dados['Date']
+    if not pd.api.types.is_datetime64_any_dtype(datas):
+        datas = pd.to_datetime(datas)
+    fuso = datas.dt.tz
+    t = pd.DatetimeIndex(datas).as_unit("ns").asi8
+    precos = {coluna: dados[coluna].to_numpy() for coluna in COLUNAS_PRECO if coluna in dados}
+    volume = dados['Volume'].to_numpy() if 'Volume' in dados else None
+    alterado = False
+
+    # 1 e 2. Barras inválidas, ordem e duplicatas, combinadas em um único vetor de índices
+    validas = np.ones(len(t), dtype=bool)
+    for valores in precos.values():
+        validas &= valores > 0  # NaN também é descartado
+    sem_preco = len(t) - int(validas.sum())
+    if sem_preco:
+        t = np.where(validas, t, np.iinfo(np.int64).min)
+    indices, invalidas, fora_de_ordem, duplicadas = _ordena_sem_duplicatas(t)
+    qualidade.update(invalidas=invalidas, fora_de_ordem=fora_de_ordem, duplicadas=duplicadas)
+    if indices is not None:
+        t = t[indices]
+        precos = {coluna: valores[indices] for coluna, valores in precos.items()}
+        volume = volume[indices] if volume is not None else None
+        alterado = True
+    n = len(t)
+    if n == 0:
+        qualidade["barras"] = 0
+        return dados.iloc[:0], qualidade
+
+    # Dia local de cada barra (pregões intradiários e calendário das diárias)
+    intradiario = interval in _SEGUNDOS_INTERVALO
+    dias = local = None
+    if intradiario or (interval == "1d" and calendario):
+        local = t if fuso is None else pd.DatetimeIndex(t, tz="UTC").tz_convert(fuso).tz_localize(None).asi8
+        dias = local // _NS_DIA
+
+    # 3. Máxima e mínima coerentes com abertura e fechamento
+    corpo = [precos[coluna] for coluna in ("Open", "Close") if coluna in precos]
+    if "High" in precos:
+        topo = np.maximum.reduce(corpo)
+        erradas = precos["High"] < topo
+        if erradas.any():
+            precos["High"] = np.where(erradas, topo, precos["High"])
+            qualidade["maxima_minima"] += int(erradas.sum())
+    if "Low" in precos:
+        fundo = np.minimum.reduce(corpo)
+        erradas = precos["Low"] > fundo
+        if erradas.any():
+            precos["Low"] = np.where(erradas, fundo, precos["Low"])
+            qualidade["maxima_minima"] += int(erradas.sum())
+    alterado |= qualidade["maxima_minima"] > 0
+
+    # 4. Desdobramentos: salto entre o fechamento anterior e a abertura próximo de uma proporção inteira
+    # (nas barras intradiárias, apenas na virada do pregão)
+    if ajusta_desdobramentos and n > 1:
+        fechamento = precos["Close"]
+        abertura = precos.get("Open", fechamento)
+        # Barra em que cada salto seria observado (a primeira depois da virada)
+        posicoes = np.flatnonzero(dias[1:] != dias[:-1]) + 1 if intradiario else np.arange(1, n)
+        razao = fechamento[posicoes - 1].astype(np.float64) / abertura[posicoes]
+        proporcao = np.where(razao >= 1, razao, 1 / razao)
+        inteiro = np.rint(proporcao)
+        candidatas = ((inteiro >= 2) & (inteiro <= FATOR_MAXIMO_DESDOBRAMENTO)
+                      & (np.abs(proporcao / inteiro - 1) <= FOLGA_DESDOBRAMENTO))
+        posicoes = posicoes[candidatas]
+        fatores = np.where(razao[candidatas] >= 1, inteiro[candidatas], 1 / inteiro[candidatas])
+        # Saltos opostos em barras seguidas são um pico isolado (tratado como outlier), não dois desdobramentos
+        pico = (posicoes[1:] == posicoes[:-1] + 1) & (np.abs(fatores[1:] * fatores[:-1] - 1) < 1e-9)
+        if pico.any():
+            mantidos = np.ones(len(posicoes), dtype=bool)
+            mantidos[:-1] &= ~pico
+            mantidos[1:] &= ~pico
+            posicoes, fatores = posicoes[mantidos], fatores[mantidos]
+        if posicoes.size:
+            confirmados = _volume_confirma(volume, posicoes, fatores)
+            posicoes, fatores = posicoes[confirmados], fatores[confirmados]
+        if posicoes.size:
+            fator = np.ones(n)
+            fator[posicoes] = fatores
+            # Divisor de cada barra: produto dos fatores dos desdobramentos posteriores a ela
+            divisor = np.ones(n)
+            divisor[:-1] = np.cumprod(fator[::-1])[::-1][1:]
+            precos = {coluna: (valores / divisor).astype(valores.dtype) for coluna, valores in precos.items()}
+            if volume is not None:
+                volume = np.rint(volume * divisor).astype(volume.dtype)
+            datas_desdobramento = pd.DatetimeIndex(t[posicoes], tz="UTC" if fuso is not None else None)
+            if fuso is not None:
+                datas_desdobramento = datas_desdobramento.tz_convert(fuso)
+            qualidade["desdobramentos"] = [
+                {"data": data.strftime("%Y-%m-%d"), "fator": float(valor)}
+                for data, valor in zip(datas_desdobramento, fatores)
+            ]
+            alterado = True
+
+    # 5. Outliers: picos isolados do fechamento, medidos em desvios robustos dos retornos logarítmicos
+    if n >= 20:
+        retornos = np.diff(np.log(precos["Close"].astype(np.float64)))
+        mediana = np.median(retornos)
+        desvio = 1.4826 * np.median(np.abs(retornos - mediana))
+        if desvio > 0:
+            z = (retornos - mediana) / desvio
+            entrada, saida = z[:-1], z[1:]
+            picos = ((np.abs(entrada) > LIMITE_OUTLIER) & (np.abs(saida) > LIMITE_OUTLIER)
+                     & (np.sign(entrada) != np.sign(saida))
+                     & (np.abs(retornos[:-1] + retornos[1:]) < 0.5 * np.abs(retornos[:-1])))
+            posicoes = np.flatnonzero(picos) + 1
+            if posicoes.size:
+                fechamento = precos["Close"]
+                substituto = (fechamento[posicoes - 1] + fechamento[posicoes + 1]) / 2
+                for coluna, valores in precos.items():
+                    valores = valores.copy()
+                    valores[posicoes] = substituto
+                    precos[coluna] = valores
+                qualidade["outliers"] = int(posicoes.size)
+                alterado = True
+
+    if volume is not None and volume.any():
+        qualidade["volume_zero"] = int((volume == 0).sum())
+
+    # 6. Lacunas: novas datas e, para cada uma, a barra anterior (origem do fechamento repetido)
+    origem = novas = None
+    if intradiario and n > 1:
+        passo = _SEGUNDOS_INTERVALO[interval] * 10**9
+        distancia = np.diff(t)
+        faltantes = np.where((dias[1:] == dias[:-1]) & (distancia > passo) & (distancia % passo == 0),
+                             distancia // passo - 1, 0)
+        total = int(faltantes.sum())
+        if total:
+            origem = np.repeat(np.arange(n - 1), faltantes)
+            ordem_na_lacuna = np.arange(total) - np.repeat(np.cumsum(faltantes) - faltantes, faltantes) + 1
+            novas = t[origem] + ordem_na_lacuna * passo
+    elif not intradiario and dias is not None and n > 1:
+        periodo = np.arange(dias[0], dias[-1] + 1)
+        esperados = periodo[np.is_busday(periodo.astype("datetime64[D]"), busdaycal=_dias_pregao(calendario))]
+        faltantes = np.setdiff1d(esperados, dias)
+        if faltantes.size:
+            origem = np.searchsorted(dias, faltantes) - 1
+            # Mesmo horário da barra anterior (meia-noite no Yahoo Finance), no fuso do histórico
+            novas = faltantes * _NS_DIA + (local[origem] - dias[origem] * _NS_DIA)
+            if fuso is not None:
+                novas = pd.DatetimeIndex(novas).tz_localize(fuso, ambiguous=False,
+                                                            nonexistent="shift_forward").asi8
+    if origem is not None:
+        posicoes = origem + 1
+        fechamento = precos["Close"]
+        t = np.insert(t, posicoes, novas)
+        precos = {coluna: np.insert(valores, posicoes, fechamento[origem]) for coluna, valores in precos.items()}
+        if volume is not None:
+            volume = np.insert(volume, posicoes, 0)
+        qualidade["lacunas"] = int(origem.size)
+        alterado = True
+
+    qualidade["barras"] = len(t)
+    qualidade["tempo_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+    if not alterado:
+        return dados, qualidade
+
+    # Monta o resultado uma única vez, na ordem de colunas da entrada e no esquema compacto
+    datas = pd.DatetimeIndex(t) if fuso is None else pd.DatetimeIndex(t, tz="UTC").tz_convert(fuso)
+    colunas: Dict[str, object] = {'Date': datas}
+    colunas.update(precos)
+    if volume is not None:
+        colunas['Volume'] = volume
+    ordem = [coluna for coluna in dados.columns if coluna in colunas]
+    return avk_compacta_ohlcv(pd.DataFrame({coluna: colunas[coluna] for coluna in ordem}, copy=False)), qualidade
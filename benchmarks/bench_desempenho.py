@@ -0,0 +1,311 @@
+# Benchmark de Desempenho
+# Mede extração e validação de dados, indicadores, montagem dos gráficos e o caminho da análise de IA com
+# dados OHLCV sintéticos e provedor/agente simulados, sem acesso à rede
+#
+# Uso (a partir da raiz do projeto):
+#   python benchmarks/bench_desempenho.py
+#   python benchmarks/bench_desempenho.py --rapido --json desempenho.json
+#   python benchmarks/bench_desempenho.py --compara desempenho_base.json --tolerancia 0.25 --folga-ms 1
+#   python benchmarks/bench_desempenho.py --filtro indicadores
+
+# Imports
+import os
+import sys
+import copy
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# Armazenamento e cache de IA em um diretório temporário (lido pelos módulos na importação)
+_DIRETORIO_TEMPORARIO = tempfile.mkdtemp(prefix="avk_bench_")
+os.environ["AVK_CACHE_DIR"] = _DIRETORIO_TEMPORARIO
+
+import numpy as np
+import pandas as pd
+import avk_data_provider
+from avk_data_store import _caminho_store
+from avk_providers import ProvedorDados, RegistroProvedores
+from avk_indicators import avk_calcula_indicadores, avk_ohlcv_array
+from avk_validacao import avk_valida_ohlcv
+from avk_indicators_incremental import AcompanhadorIndicadores, avk_atualiza_indicadores
+from avk_analytics import avk_monta_dashboard, avk_plot_media_movel
+import avk_agents
+
+# Sem avisos de "missing ScriptRunContext" ao chamar funções do Streamlit fora da app
+# (o Streamlit redefine o nível dos seus loggers ao ler a configuração, então eles são desativados)
+for _nome in list(logging.root.manager.loggerDict):
+    if _nome.startswith("streamlit"):
+        logging.getLogger(_nome).disabled = True
+
+########## Fixtures Sintéticas ##########
+
+# Tamanhos medidos: nome -> (período pedido, intervalo, número de barras)
+# Pregões de 390 barras de 1 minuto
+TAMANHOS = {
+    "6mo_1d": ("6mo", "1d", 126),
+    "5y_1d": ("5y", "1d", 1260),
+    "1mo_1m": ("1mo", "1m", 21 * 390),
+    "1y_1m": ("1y", "1m", 252 * 390),
+    "2y_1m": ("2y", "1m", 2 * 252 * 390),
+}
+
+# Tamanhos omitidos com --rapido
+TAMANHOS_GRANDES = {"1y_1m", "2y_1m"}
+
+# Acima deste número de barras, o acompanhamento incremental barra a barra (laço em Python) não é medido
+MAX_BARRAS_INCREMENTAL = 20_000
+
+def gera_ohlcv(n_barras: int, interval: str, semente: int = 0) -> pd.DataFrame:
+    """
+    Gera um histórico OHLCV reproduzível (passeio aleatório geométrico) terminando hoje.
+
+    Barras diárias ocupam os dias úteis; barras de 1 minuto, 390 minutos por pregão a partir
+    das 9h30 (horário de Nova York), como as do Yahoo Finance. O esquema é o compacto da app.
+    """
+    rng = np.random.default_rng(semente)
+    hoje = pd.Timestamp.now().normalize()
+    if interval == "1d":
+        datas = pd.bdate_range(end=hoje, periods=n_barras).tz_localize("America/New_York")
+        volatilidade = 0.015
+    else:
+        dias = pd.bdate_range(end=hoje, periods=-(-n_barras // 390)) + pd.Timedelta(hours=9, minutes=30)
+        minutos = np.arange(390) * np.timedelta64(1, "m")
+        datas = pd.DatetimeIndex((dias.values[:, None] + minutos[None, :]).ravel()[-n_barras:])
+        datas = datas.tz_localize("America/New_York")
+        volatilidade = 0.0008
+
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0, volatilidade, n_barras)))
+    abertura = close * np.exp(rng.normal(0.0, volatilidade / 3, n_barras))
+    amplitude = np.abs(rng.normal(0.0, volatilidade, n_barras)) * close
+    return pd.DataFrame({
+        "Date": datas,
+        "Open": abertura.astype(np.float32),
+        "High": (np.maximum(abertura, close) + amplitude).astype(np.float32),
+        "Low": (np.minimum(abertura, close) - amplitude).astype(np.float32),
+        "Close": close.astype(np.float32),
+        "Volume": rng.integers(1_000, 1_000_000, n_barras, dtype=np.int64),
+    })
+
+def gera_resposta_ia(n_paragrafos: int = 60, semente: int = 0) -> str:
+    """Resposta típica do agente: texto em markdown intercalado com blocos de chamadas de ferramentas"""
+    rng = np.random.default_rng(semente)
+    linhas = []
+    for i in range(n_paragrafos):
+        if rng.random() < 0.3:
+            linhas += ["Running:", f"  - get_current_stock_price(symbol=AAPL{i})",
+                       f"  - get_company_news(symbol=AAPL{i}, num_stories=3)", ""]
+        if rng.random() < 0.1:
+            linhas.append("Transferring task to Financial Agent")
+        linhas += [f"## Seção {i}", "O preço atual está acima da média de 20 períodos, " * 4, ""]
+    return "\n".join(linhas)
+
+class ProvedorSintetico(ProvedorDados):
+    """Provedor simulado: responde com os históricos sintéticos, sem rede"""
+
+    nome = "sintetico"
+    descricao = "Dados sintéticos"
+
+    def __init__(self, historicos: Dict[str, pd.DataFrame]):
+        super().__init__()
+        self.historicos = historicos
+
+    def extrai(self, ticker, period, start=None, max_retries=3, retry_delay=5, api_key=None, interval="1d"):
+        hist = self.historicos[ticker]
+        if start is not None:
+            # Atualização incremental: só as barras a partir de start
+            hist = hist.iloc[int(hist["Date"].searchsorted(pd.Timestamp(start))):]
+        return hist.reset_index(drop=True)
+
+class AgenteSimulado:
+    """Agente de IA simulado: devolve a resposta sintética em trechos, como run(stream=True)"""
+
+    def __init__(self, resposta: str, tamanho_trecho: int = 24):
+        self.trechos = [resposta[i:i + tamanho_trecho] for i in range(0, len(resposta), tamanho_trecho)]
+
+    def run(self, prompt, stream=False):
+        return (SimpleNamespace(content=trecho) for trecho in self.trechos)
+
+########## Medição ##########
+
+def mede(funcao: Callable[[], object], repeticoes: int, preparo: Callable[[], None] = None) -> dict:
+    """
+    Executa a função várias vezes (após uma execução de aquecimento) e resume os tempos.
+
+    Args:
+        funcao: Função medida
+        repeticoes: Número de execuções medidas
+        preparo: Executada antes de cada execução, fora da medição (ex: limpar o armazenamento)
+
+    Returns:
+        Dicionário com mediana_ms, min_ms e repeticoes
+    """
+    tempos = []
+    for i in range(repeticoes + 1):
+        if preparo is not None:
+            preparo()
+        inicio = time.perf_counter()
+        funcao()
+        if i > 0:
+            tempos.append((time.perf_counter() - inicio) * 1000)
+    return {"mediana_ms": round(statistics.median(tempos), 3), "min_ms": round(min(tempos), 3),
+            "repeticoes": repeticoes}
+
+def casos(tamanhos: List[str]) -> Dict[str, Callable[[int], dict]]:
+    """
+    Monta os casos medidos: nome -> função que recebe o número de repetições e retorna o resultado.
+
+    Os nomes seguem "grupo/caso/tamanho", para filtrar e comparar entre execuções.
+    """
+    historicos = {nome: gera_ohlcv(TAMANHOS[nome][2], TAMANHOS[nome][1]) for nome in tamanhos}
+
+    # O registro de provedores da app é substituído por um com o provedor sintético apenas
+    tickers = {nome: f"BENCH{i}" for i, nome in enumerate(tamanhos)}
+    registro = RegistroProvedores()
+    registro.registra(ProvedorSintetico({tickers[nome]: historicos[nome] for nome in tamanhos}))
+    avk_data_provider.avk_registro_provedores = registro
+
+    resposta = gera_resposta_ia()
+    avk_agents.avk_obtem_multi_agente = lambda: AgenteSimulado(resposta)
+
+    resultado = {}
+    for nome in tamanhos:
+        period, interval, _ = TAMANHOS[nome]
+        hist, ticker = historicos[nome], tickers[nome]
+        ohlcv = avk_ohlcv_array(hist)
+        indicadores = avk_calcula_indicadores(ohlcv)
+
+        def extrai(ticker=ticker, period=period, interval=interval):
+            return avk_data_provider._avk_extrai_dados_impl(ticker, period, provider="sintetico", interval=interval)
+
+        def limpa_store(ticker=ticker, interval=interval):
+            caminho = _caminho_store(ticker, avk_data_provider._chave_store("sintetico", interval))
+            if os.path.exists(caminho):
+                os.remove(caminho)
+
+        # Extração: download completo (armazenamento vazio) e atualização incremental (armazenamento pronto)
+        resultado[f"extracao/completa/{nome}"] = lambda r, f=extrai, p=limpa_store: mede(f, r, p)
+        resultado[f"extracao/incremental/{nome}"] = lambda r, f=extrai: mede(f, r)
+
+        # Validação: histórico já limpo (caminho comum) e fora de ordem, com 1% de duplicatas e 1% de lacunas
+        sujo = hist.drop(index=hist.index[1::97])
+        sujo = pd.concat([sujo, sujo.iloc[::101]]).sample(frac=1, random_state=0)
+        resultado[f"validacao/limpo/{nome}"] = lambda r, h=hist, i=interval: mede(lambda: avk_valida_ohlcv(h, i, "nyse"), r)
+        resultado[f"validacao/sujo/{nome}"] = lambda r, h=sujo, i=interval: mede(lambda: avk_valida_ohlcv(h, i, "nyse"), r)
+
+        # Indicadores: motor vetorizado completo e acompanhamento incremental
+        resultado[f"indicadores/vetorizado/{nome}"] = lambda r, o=ohlcv: mede(lambda: avk_calcula_indicadores(o), r)
+        if len(hist) <= MAX_BARRAS_INCREMENTAL:
+            def incremental(h=hist):
+                AcompanhadorIndicadores().atualiza_frame(h)
+            resultado[f"indicadores/incremental_inicial/{nome}"] = lambda r, f=incremental: mede(f, r)
+
+        def ultima_barra(r, h=hist, t=ticker):
+            # Nova barra no histórico completo, como a app recebe a cada atualização (custo por barra em
+            # tempo real): cada execução parte de uma cópia do acompanhador atualizado até a barra anterior
+            armazenamento = {}
+            avk_atualiza_indicadores(t, h.iloc[:-1], armazenamento)
+            atualizado = armazenamento[f"avk_indicadores_{t}"]
+            def preparo():
+                armazenamento[f"avk_indicadores_{t}"] = copy.deepcopy(atualizado)
+            return mede(lambda: avk_atualiza_indicadores(t, h, armazenamento), r, preparo)
+        resultado[f"indicadores/nova_barra/{nome}"] = ultima_barra
+
+        # Gráficos: figura do dashboard (redução de pontos incluída), sua serialização e o gráfico de médias
+        def dashboard(h=hist, i=indicadores, t=ticker):
+            return avk_monta_dashboard(h, t, pd.DataFrame({"Date": h["Date"], **i}))
+        resultado[f"graficos/dashboard/{nome}"] = lambda r, f=dashboard: mede(f, r)
+        resultado[f"graficos/dashboard_json/{nome}"] = lambda r, f=dashboard: mede(lambda fig=f(): fig.to_json(), r)
+        resultado[f"graficos/media_movel/{nome}"] = lambda r, h=hist, t=ticker: mede(lambda: avk_plot_media_movel(h, t), r)
+
+    # IA: limpeza da resposta completa, filtro em streaming e o caminho completo com o agente simulado
+    trechos = AgenteSimulado(resposta).trechos
+    resultado["ia/limpar_resposta"] = lambda r: mede(lambda: avk_agents.limpar_resposta_ia(resposta), r)
+    resultado["ia/filtro_stream"] = lambda r: mede(lambda: "".join(avk_agents.avk_filtra_stream(trechos)), r)
+
+    contador = iter(range(10 ** 9))
+    def analise_nova():
+        # Ticker novo a cada execução: sempre passa pelo agente e grava no cache
+        return avk_agents.avk_executa_analise(f"IA{next(contador)}")
+    resultado["ia/analise_sem_cache"] = lambda r: mede(analise_nova, r)
+    resultado["ia/analise_em_cache"] = lambda r: mede(lambda: avk_agents.avk_executa_analise("IA0"), r)
+    return resultado
+
+########## Comparação ##########
+
+def compara(resultados: dict, base: dict, tolerancia: float, folga_ms: float = 0.0) -> List[str]:
+    """
+    Compara as medianas com uma execução anterior.
+
+    Aumentos de até folga_ms são ignorados mesmo acima da tolerância (casos de frações de
+    milissegundo oscilam muito em termos relativos).
+
+    Returns:
+        Lista de descrições dos casos que ficaram mais lentos que a base além da tolerância
+    """
+    regressoes = []
+    for nome, atual in resultados.items():
+        anterior = base.get("resultados", {}).get(nome)
+        if not anterior or anterior["mediana_ms"] <= 0:
+            continue
+        variacao = atual["mediana_ms"] / anterior["mediana_ms"] - 1
+        if variacao > tolerancia and atual["mediana_ms"] - anterior["mediana_ms"] > folga_ms:
+            regressoes.append(f"{nome}: {anterior['mediana_ms']:.2f} -> {atual['mediana_ms']:.2f} ms (+{variacao:.0%})")
+    return regressoes
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de desempenho da app (offline, dados sintéticos)")
+    parser.add_argument("--repeticoes", type=int, default=5, help="Execuções medidas por caso (usa a mediana)")
+    parser.add_argument("--rapido", action="store_true", help=f"Omite os maiores tamanhos ({', '.join(sorted(TAMANHOS_GRANDES))})")
+    parser.add_argument("--filtro", help="Mede apenas os casos cujo nome contém este texto")
+    parser.add_argument("--json", help="Arquivo para gravar os resultados")
+    parser.add_argument("--compara", help="Resultados anteriores (--json) usados como base")
+    parser.add_argument("--tolerancia", type=float, default=0.25,
+                        help="Aumento relativo da mediana aceito na comparação (padrão: 0.25)")
+    parser.add_argument("--folga-ms", type=float, default=0.0,
+                        help="Aumento absoluto da mediana sempre aceito na comparação, em ms (padrão: 0)")
+    args = parser.parse_args()
+
+    tamanhos = [nome for nome in TAMANHOS if not (args.rapido and nome in TAMANHOS_GRANDES)]
+    resultados = {}
+    try:
+        for nome, executa in casos(tamanhos).items():
+            if args.filtro and args.filtro not in nome:
+                continue
+            resultados[nome] = executa(args.repeticoes)
+            print(f"{nome:<45} {resultados[nome]['mediana_ms']:10.2f} ms   (mín. {resultados[nome]['min_ms']:.2f})")
+    finally:
+        shutil.rmtree(_DIRETORIO_TEMPORARIO, ignore_errors=True)
+
+    if args.json:
+        ambiente = {
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "plataforma": platform.platform(),
+            "processador": platform.processor() or platform.machine(),
+        }
+        with open(args.json, "w", encoding="utf-8") as arquivo:
+            json.dump({"ambiente": ambiente, "resultados": resultados}, arquivo, indent=2)
+
+    if args.compara:
+        with open(args.compara, encoding="utf-8") as arquivo:
+            regressoes = compara(resultados, json.load(arquivo), args.tolerancia, args.folga_ms)
+        if regressoes:
+            print(f"Regressões acima de {args.tolerancia:.0%}:")
+            for regressao in regressoes:
+                print(f"  {regressao}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
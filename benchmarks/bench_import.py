@@ -0,0 +1,107 @@
+# Benchmark do Tempo de Importação
+# Mede, em processos Python novos, o custo de importar cada módulo da app (python -X importtime)
+#
+# Uso (a partir da raiz do projeto):
+#   python benchmarks/bench_import.py
+#   python benchmarks/bench_import.py --json import_time.json --limite-ms 3000
+
+# Imports
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+
+########## Configuração ##########
+
+# Módulos medidos (cada um em um processo novo, sem nada importado antes)
+MODULOS = [
+    "avk_agents",
+    "avk_analytics",
+    "avk_data_provider",
+    "avk_indicators",
+    "avk_indicators_incremental",
+    "avk_downsampling",
+    "avk_ai_cache",
+    "avk_cache_compartilhado",
+    "avk_screener",
+    "avk_backtest",
+    "avk_realtime",
+    "avk_telemetria",
+    "avk_validacao",
+]
+
+# Linha do -X importtime: "import time:  self [us] | cumulative | imported package"
+_LINHA_IMPORTTIME = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+########## Medição ##########
+
+def mede_importacao(modulo: str) -> dict:
+    """
+    Importa o módulo em um processo novo e retorna o tempo total e os maiores custos.
+
+    Returns:
+        Dicionário com total_ms (tempo cumulativo do módulo) e maiores (as 5 dependências
+        de primeiro nível mais caras, em ms)
+    """
+    processo = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=RAIZ, capture_output=True, text=True
+    )
+    if processo.returncode != 0:
+        raise RuntimeError(f"Falha ao importar {modulo}:\n{processo.stderr.strip()[-2000:]}")
+
+    total_us, dependencias, filhos = None, {}, {}
+    for linha in processo.stderr.splitlines():
+        resultado = _LINHA_IMPORTTIME.match(linha)
+        if not resultado:
+            continue
+        _, cumulativo, recuo, nome = resultado.groups()
+        # Os filhos aparecem antes do pai: recuo de 3 espaços = dependência direta do próximo
+        # import de primeiro nível (recuo de 1 espaço), que só interessa se for o módulo medido
+        if len(recuo) == 3:
+            filhos[nome] = int(cumulativo)
+        elif len(recuo) == 1:
+            if nome == modulo:
+                total_us, dependencias = int(cumulativo), filhos
+            filhos = {}
+
+    maiores = sorted(dependencias.items(), key=lambda item: item[1], reverse=True)[:5]
+    return {
+        "total_ms": (total_us or 0) / 1000,
+        "maiores": {nome: us / 1000 for nome, us in maiores},
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark do tempo de importação dos módulos da app")
+    parser.add_argument("--repeticoes", type=int, default=3, help="Execuções por módulo (usa a mediana)")
+    parser.add_argument("--json", help="Arquivo para gravar os resultados")
+    parser.add_argument("--limite-ms", type=float, help="Falha (código 1) se algum módulo passar deste tempo")
+    args = parser.parse_args()
+
+    resultados = {}
+    for modulo in MODULOS:
+        medicoes = [mede_importacao(modulo) for _ in range(args.repeticoes)]
+        mediana = statistics.median(m["total_ms"] for m in medicoes)
+        resultados[modulo] = {"total_ms": round(mediana, 1), "maiores": medicoes[-1]["maiores"]}
+
+        maiores = ", ".join(f"{nome} {ms:.0f}" for nome, ms in resultados[modulo]["maiores"].items())
+        print(f"{modulo:<28} {mediana:8.1f} ms   ({maiores})")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as arquivo:
+            json.dump({"python": sys.version.split()[0], "modulos": resultados}, arquivo, indent=2)
+
+    if args.limite_ms is not None:
+        acima = [m for m, r in resultados.items() if r["total_ms"] > args.limite_ms]
+        if acima:
+            print(f"Acima do limite de {args.limite_ms:.0f} ms: {', '.join(acima)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
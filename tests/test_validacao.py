@@ -0,0 +1,131 @@
+# Testes da Validação de Dados (avk_validacao.avk_valida_ohlcv)
+# Históricos sintéticos, sem acesso à rede
+#
+# Uso (a partir da raiz do projeto):
+#   python -m pytest tests
+
+# Imports
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from avk_validacao import avk_valida_ohlcv
+
+########## Históricos Sintéticos ##########
+
+def _historico(barras: int = 60, inicio: str = "2024-01-02", preco: float = 20.0, volume: int = 1_000_000,
+               semente: int = 0) -> pd.DataFrame:
+    """Barras diárias em dias úteis com pequenas oscilações em torno do preço (sem lacunas nem outliers)"""
+    rng = np.random.default_rng(semente)
+    fechamento = preco * np.exp(np.cumsum(rng.normal(0, 0.005, barras)))
+    abertura = np.r_[preco, fechamento[:-1]]
+    return pd.DataFrame({
+        "Date": pd.bdate_range(inicio, periods=barras),
+        "Open": abertura,
+        "High": np.maximum(abertura, fechamento) * 1.002,
+        "Low": np.minimum(abertura, fechamento) * 0.998,
+        "Close": fechamento,
+        "Volume": rng.integers(int(volume * 0.9), int(volume * 1.1), barras),
+    })
+
+def _salto(dados: pd.DataFrame, posicao: int, fechamento_anterior: float, abertura: float,
+           volume: float = 1.0) -> pd.DataFrame:
+    """Salto de preço entre o fechamento da barra anterior e a abertura da barra 'posicao'"""
+    dados = dados.copy()
+    escala_antes = fechamento_anterior / dados.loc[posicao - 1, "Close"]
+    escala_depois = abertura / dados.loc[posicao, "Open"]
+    for coluna in ("Open", "High", "Low", "Close"):
+        dados.loc[:posicao - 1, coluna] *= escala_antes
+        dados.loc[posicao:, coluna] *= escala_depois
+    dados.loc[posicao:, "Volume"] = (dados.loc[posicao:, "Volume"] * volume).round().astype(np.int64)
+    return dados
+
+########## Testes ##########
+
+def test_remove_duplicatas_mantendo_ultima():
+    dados = _historico(30)
+    repetida = dados.iloc[[10]].assign(Close=dados.loc[10, "Close"] * 1.001)
+    validado, qualidade = avk_valida_ohlcv(pd.concat([dados, repetida], ignore_index=True))
+    assert qualidade["duplicadas"] == 1
+    assert len(validado) == 30
+    assert validado["Close"].iloc[10] == pytest.approx(repetida["Close"].iloc[0], rel=1e-6)
+
+def test_ordena_datas():
+    dados = _historico(30)
+    validado, qualidade = avk_valida_ohlcv(dados.sample(frac=1, random_state=1))
+    assert qualidade["fora_de_ordem"]
+    assert validado["Date"].is_monotonic_increasing
+    np.testing.assert_allclose(validado["Close"], dados["Close"], rtol=1e-6)
+
+def test_preenche_lacunas_pelo_calendario():
+    dados = _historico(30)
+    sem_barra = dados.drop(index=12).reset_index(drop=True)
+    validado, qualidade = avk_valida_ohlcv(sem_barra, "1d", "nyse")
+    assert qualidade["lacunas"] == 1
+    preenchida = validado[validado["Date"] == dados.loc[12, "Date"]].iloc[0]
+    assert preenchida["Volume"] == 0
+    assert preenchida["Close"] == pytest.approx(dados.loc[11, "Close"], rel=1e-6)
+    assert preenchida["Open"] == preenchida["Close"]
+
+def test_nao_preenche_feriado():
+    # 15/01/2024 é feriado (Martin Luther King Jr.) na NYSE
+    dados = _historico(30, inicio="2024-01-08")
+    sem_feriado = dados[dados["Date"] != pd.Timestamp("2024-01-15")].reset_index(drop=True)
+    validado, qualidade = avk_valida_ohlcv(sem_feriado, "1d", "nyse")
+    assert qualidade["lacunas"] == 0
+    assert pd.Timestamp("2024-01-15") not in set(validado["Date"])
+
+def test_corrige_outlier_isolado():
+    dados = _historico(60)
+    dados.loc[30, ["Open", "High", "Low", "Close"]] = dados.loc[30, "Close"] * 10
+    validado, qualidade = avk_valida_ohlcv(dados)
+    assert qualidade["outliers"] == 1
+    esperado = (dados.loc[29, "Close"] + dados.loc[31, "Close"]) / 2
+    assert validado["Close"].iloc[30] == pytest.approx(esperado, rel=1e-5)
+
+def test_ajusta_desdobramento_confirmado_pelo_volume():
+    # Desdobramento 2:1: o preço cai pela metade e o volume dobra
+    dados = _salto(_historico(60), 30, 20.0, 10.0, volume=2.0)
+    validado, qualidade = avk_valida_ohlcv(dados)
+    assert qualidade["desdobramentos"] == [{"data": dados.loc[30, "Date"].strftime("%Y-%m-%d"), "fator": 2.0}]
+    np.testing.assert_allclose(validado["Close"].iloc[:30], dados["Close"].iloc[:30] / 2, rtol=1e-6)
+    np.testing.assert_allclose(validado["Close"].iloc[30:], dados["Close"].iloc[30:], rtol=1e-6)
+    np.testing.assert_array_equal(validado["Volume"].iloc[:30], dados["Volume"].iloc[:30] * 2)
+
+def test_ajusta_grupamento_confirmado_pelo_volume():
+    # Grupamento 1:5: o preço quintuplica e o volume cai para um quinto
+    dados = _salto(_historico(60), 30, 4.0, 20.0, volume=0.2)
+    validado, qualidade = avk_valida_ohlcv(dados)
+    assert [d["fator"] for d in qualidade["desdobramentos"]] == [pytest.approx(0.2)]
+    np.testing.assert_allclose(validado["Close"].iloc[:30], dados["Close"].iloc[:30] * 5, rtol=1e-6)
+
+def test_queda_real_nao_e_desdobramento():
+    # Queda após resultado (20.0 -> 10.1), próxima de 2:1, mas sem mudança no volume
+    dados = _salto(_historico(60), 30, 20.0, 10.1)
+    validado, qualidade = avk_valida_ohlcv(dados)
+    assert qualidade["desdobramentos"] == []
+    np.testing.assert_allclose(validado["Close"], dados["Close"], rtol=1e-6)
+    np.testing.assert_array_equal(validado["Volume"], dados["Volume"])
+
+def test_sem_volume_nao_ajusta_desdobramento():
+    dados = _salto(_historico(60), 30, 20.0, 10.0, volume=2.0).drop(columns="Volume")
+    _, qualidade = avk_valida_ohlcv(dados)
+    assert qualidade["desdobramentos"] == []
+
+def test_fonte_ajustada_nao_procura_desdobramentos():
+    dados = _salto(_historico(60), 30, 20.0, 10.0, volume=2.0)
+    validado, qualidade = avk_valida_ohlcv(dados, ajusta_desdobramentos=False)
+    assert qualidade["desdobramentos"] == []
+    np.testing.assert_allclose(validado["Close"], dados["Close"], rtol=1e-6)
+
+def test_idempotente():
+    dados = _salto(_historico(60), 30, 20.0, 10.0, volume=2.0).drop(index=12).reset_index(drop=True)
+    validado, _ = avk_valida_ohlcv(dados, "1d", "nyse")
+    revalidado, qualidade = avk_valida_ohlcv(validado, "1d", "nyse")
+    assert revalidado is validado
+    assert qualidade["lacunas"] == 0 and qualidade["desdobramentos"] == []